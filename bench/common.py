@@ -0,0 +1,169 @@
+"""
+Shared helpers for the benchmark scripts in this folder.
+
+The scripts import the real application from ./src, pointed at a throwaway
+SQLite database, so they measure the same code paths gunicorn serves.
+"""
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def load_app(db_path="/tmp/bench.db", reset=True):
+    """Import src/app.py against `db_path` and create the schema."""
+    if reset and os.path.exists(db_path):
+        os.remove(db_path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    # Los benchmarks lanzan todas las peticiones desde un mismo cliente
+    os.environ.setdefault("RATELIMIT_ENABLED", "false")
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+    from wsgi import application as app
+    from models import db
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@contextmanager
+def count_queries(engine):
+    """Count the statements sent to `engine` inside the block."""
+    from sqlalchemy import event
+    counter = {"queries": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["queries"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def timeit(fn, repeat=200):
+    """Return the mean wall time of `fn()` in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+async def _http_client(host, port, next_request, deadline, samples):
+    # Cliente HTTP/1.1 minimo: reutiliza la conexion salvo que el servidor la cierre
+    # (los workers sync de gunicorn responden siempre con Connection: close)
+    import asyncio
+    writer = None
+    while time.perf_counter() < deadline:
+        item = next_request()
+        if item is None:
+            break
+        method, path, body = item
+        payload = b"" if body is None else json.dumps(body).encode()
+        head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(head.encode() + b"\r\n" + payload)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length, keep_alive, queries = 0, True, None
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                name = name.lower()
+                if name == "content-length":
+                    length = int(value)
+                elif name == "connection" and value.strip().lower() == "close":
+                    keep_alive = False
+                elif name == "server-timing":
+                    match = SERVER_TIMING_QUERIES.search(value)
+                    queries = int(match.group(1)) if match else None
+            await reader.readexactly(length)
+        except (ConnectionError, IndexError, asyncio.IncompleteReadError):
+            # Estado 0: la conexion fallo
+            samples.append(((time.perf_counter() - start) * 1000, 0, None))
+            writer = None
+            continue
+        samples.append(((time.perf_counter() - start) * 1000, status, queries))
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+def http_run(host, port, requests, concurrency=64, duration=None):
+    """
+    Send `requests` - (method, path, json body or None) tuples - over
+    `concurrency` connections. Without `duration` every request is sent once;
+    with it the list is cycled until the time runs out. Returns the samples
+    (latency ms, status, queries from Server-Timing) and the elapsed seconds.
+    """
+    import asyncio
+    samples = []
+    position = iter(range(10 ** 12))
+
+    def next_request():
+        i = next(position)
+        if duration is None:
+            return requests[i] if i < len(requests) else None
+        return requests[i % len(requests)]
+
+    async def run():
+        deadline = time.perf_counter() + (duration if duration is not None else 10 ** 9)
+        await asyncio.gather(*[_http_client(host, port, next_request, deadline, samples) for _ in range(concurrency)])
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    """Throughput, latency percentiles and queries per request of a run."""
+    latencies = [latency for latency, _, _ in samples]
+    queries = [count for _, _, count in samples if count is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, status, _ in samples if status == 0 or status >= 500),
+        "rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def http_load(host, port, paths, concurrency=64, duration=10):
+    """
+    Keep `concurrency` connections busy for `duration` seconds cycling over
+    the GET `paths`; return requests/sec and latency percentiles in milliseconds.
+    """
+    samples, elapsed = http_run(host, port, [("GET", path, None) for path in paths], concurrency, duration)
+    return summarize(samples, elapsed)
+
+
+def wait_for_port(host, port, timeout=20):
+    import socket
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on {host}:{port} after {timeout}s")
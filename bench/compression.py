@@ -0,0 +1,80 @@
+"""
+Bandwidth / CPU trade-off of the response compression stage.
+
+For a full page of each list endpoint it reports, per encoding and level,
+the compressed size and the time to compress it, and then the cost of a
+whole request through the test client:
+
+    identity  no Accept-Encoding
+    miss      compressed on every request (cache disabled)
+    hit       compressed body reused from the ETag-keyed cache
+
+Encodings whose module is not installed (brotli, zstandard) are skipped.
+
+    $ python bench/compression.py [rows]
+"""
+import datetime
+import sys
+from common import load_app, timeit
+
+app = load_app()
+
+from sqlalchemy import insert
+from models import db, User, Planets, Characters
+from compression import CODECS, available_encodings, response_compressor
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 5, 11), "zstd": (1, 3, 19)}
+ROUTES = ("/users", "/people", "/planets")
+
+
+def seed(rows):
+    now = datetime.datetime.now()
+    db.session.execute(insert(User), [
+        {"firstname": f"First {i}", "lastname": f"Last {i}", "email": f"user{i}@rebels.org",
+         "password": "x", "created_date": now} for i in range(rows)])
+    db.session.execute(insert(Planets), [{"name": f"Planet {i}", "size": i, "gravity": i % 2 == 0} for i in range(rows)])
+    db.session.execute(insert(Characters), [{"name": f"Character {i}", "age": i % 900} for i in range(rows)])
+    db.session.commit()
+
+
+def payload(client, route, limit):
+    return client.get(f"{route}?limit={limit}").get_data()
+
+
+def request_ms(client, route, limit, encoding, repeat=200):
+    headers = {"Accept-Encoding": encoding} if encoding else {}
+    return timeit(lambda: client.get(f"{route}?limit={limit}", headers=headers).get_data(), repeat=repeat)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    limit = app.config['MAX_PAGE_SIZE']
+    encodings = available_encodings()
+    with app.app_context():
+        seed(rows)
+    client = app.test_client()
+
+    print(f"rows={rows} limit={limit} encodings={','.join(encodings)}")
+    print(f"{'route':>9} {'encoding':>8} {'level':>5} {'bytes':>8} {'ratio':>6} {'ms':>7}")
+    for route in ROUTES:
+        data = payload(client, route, limit)
+        print(f"{route:>9} {'identity':>8} {'-':>5} {len(data):>8} {1:>6.2f} {0:>7.3f}")
+        for encoding in encodings:
+            compress = CODECS[encoding][0]
+            for level in LEVELS[encoding]:
+                size = len(compress(data, level))
+                ms = timeit(lambda: compress(data, level), repeat=50)
+                print(f"{route:>9} {encoding:>8} {level:>5} {size:>8} {len(data) / size:>6.2f} {ms:>7.3f}")
+
+    print()
+    print(f"{'route':>9} {'encoding':>8} {'identity ms':>12} {'miss ms':>8} {'hit ms':>7}")
+    max_bytes = response_compressor.max_bytes
+    for route in ROUTES:
+        for encoding in encodings:
+            identity_ms = request_ms(client, route, limit, None)
+            response_compressor.max_bytes = 0
+            miss_ms = request_ms(client, route, limit, encoding)
+            response_compressor.max_bytes = max_bytes
+            hit_ms = request_ms(client, route, limit, encoding)
+            print(f"{route:>9} {encoding:>8} {identity_ms:>12.3f} {miss_ms:>8.3f} {hit_ms:>7.3f}")
+    print(response_compressor.stats())
@@ -0,0 +1,58 @@
+"""
+Round trips per GET /users/<id>/favorites.
+
+Compares the previous implementation (load the User, then lazy-load
+favourites_planet and favourites_character) with the single joined query
+served by the endpoint today.
+
+    $ python bench/favorites_roundtrips.py
+"""
+import datetime
+from common import load_app, count_queries, timeit
+
+app = load_app()
+
+from sqlalchemy import select
+from models import db, User, Planets, Characters, favoritos
+
+
+def legacy_favorites(user_id):
+    user = db.session.execute(select(User).where(User.id == user_id)).scalar_one_or_none()
+    planets = [p.serialize() for p in user.favourites_planet]
+    characters = [c.serialize() for c in user.favourites_character]
+    return planets, characters
+
+
+def seed(favorites):
+    db.session.execute(favoritos.delete())
+    db.session.execute(User.__table__.delete())
+    db.session.execute(Planets.__table__.delete())
+    db.session.execute(Characters.__table__.delete())
+    db.session.add(User(id=1, firstname="Luke", lastname="Skywalker", email="luke@rebels.org",
+                        password="x", created_date=datetime.datetime.now()))
+    for i in range(1, favorites + 1):
+        db.session.add(Planets(id=i, name=f"Planet {i}", size=i, gravity=True))
+        db.session.add(Characters(id=i, name=f"Character {i}", age=i))
+    db.session.flush()
+    if favorites:
+        db.session.execute(favoritos.insert(), [{"user_id": 1, "planet_id": i} for i in range(1, favorites + 1)])
+        db.session.execute(favoritos.insert(), [{"user_id": 1, "character_id": i} for i in range(1, favorites + 1)])
+    db.session.commit()
+
+
+if __name__ == "__main__":
+    view = app.view_functions["api.get_favorites_by_id"]
+    print(f"{'favorites':>10} {'legacy q':>9} {'legacy ms':>10} {'joined q':>9} {'joined ms':>10}")
+    with app.test_request_context():
+        engine = db.engine
+        for favorites in (0, 10, 100, 1000):
+            seed(favorites)
+            results = []
+            for fn in (legacy_favorites, view):
+                def run():
+                    db.session.expunge_all()
+                    fn(1)
+                with count_queries(engine) as counter:
+                    run()
+                results += [counter["queries"], timeit(run, repeat=50)]
+            print(f"{favorites:>10} {results[0]:>9} {results[1]:>10.2f} {results[2]:>9} {results[3]:>10.2f}")
@@ -0,0 +1,105 @@
+"""
+Cold-start cost of the app: `python -X importtime -c "import wsgi"`.
+
+Imports the WSGI entry point in fresh processes, keeps the best of a few
+trials and reports the cumulative import time of the heaviest top-level
+packages. Fails (exit 1) when:
+    - a module that must load lazily (Flask-Admin, WTForms, Flask-Migrate,
+      Alembic, flask_swagger) is imported by `import wsgi`, or
+    - with --baseline, the import got more than --max-regression slower
+      than the recorded run.
+It also times the first /admin request, which is where the admin is built.
+The lazy imports are also checked by tests/test_lazy.py on every test run.
+
+    $ python bench/import_time.py --save bench/import_time.json
+    $ python bench/import_time.py --baseline bench/import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from common import SRC_DIR
+
+TRIALS = 5
+LAZY_MODULES = ("flask_admin", "wtforms", "flask_migrate", "alembic", "flask_swagger")
+
+
+def child_env():
+    return {**os.environ, "DATABASE_URL": "sqlite:////tmp/bench-import.db", "PYTHONPATH": SRC_DIR}
+
+
+def import_profile():
+    """{module: (self_us, cumulative_us)} and the order they were imported in, for one `import wsgi`."""
+    stderr = subprocess.run([sys.executable, "-W", "ignore", "-X", "importtime", "-c", "import wsgi"],
+                            env=child_env(), cwd=SRC_DIR, capture_output=True, text=True, check=True).stderr
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # La sangria indica el nivel de anidamiento; el nombre va sin espacios
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def first_admin_request_ms():
+    code = (
+        "import time, wsgi\n"
+        "client = wsgi.application.test_client()\n"
+        "start = time.perf_counter()\n"
+        "client.get('/admin/')\n"
+        "print((time.perf_counter() - start) * 1000)\n"
+    )
+    output = subprocess.run([sys.executable, "-W", "ignore", "-c", code], env=child_env(), cwd=SRC_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare with")
+    parser.add_argument("--save", help="write this run's report to this file")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed slowdown vs the baseline")
+    args = parser.parse_args()
+
+    # Primera importacion: compila los .pyc, no cuenta
+    import_profile()
+    best = None
+    for _ in range(TRIALS):
+        modules = import_profile()
+        if best is None or modules["wsgi"][1] < best["wsgi"][1]:
+            best = modules
+    total_ms = best["wsgi"][1] / 1000
+    top = sorted(((cumulative, name) for name, (_, cumulative) in best.items() if "." not in name and name != "wsgi"),
+                 reverse=True)[:12]
+    print(f"import wsgi: {total_ms:.1f} ms ({len(best)} modules)")
+    for cumulative, name in top:
+        print(f"  {name:<24} {cumulative / 1000:>8.1f} ms")
+    admin_ms = first_admin_request_ms()
+    print(f"first /admin/ request: {admin_ms:.1f} ms")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in best]
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        limit = baseline["import_ms"] * (1 + args.max_regression)
+        print(f"baseline: {baseline['import_ms']:.1f} ms, limit {limit:.1f} ms")
+        if total_ms > limit:
+            print(f"FAIL: import time regressed by {total_ms / baseline['import_ms'] - 1:.0%}")
+            failed = True
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"import_ms": round(total_ms, 1), "first_admin_ms": round(admin_ms, 1),
+                       "modules": len(best), "python": sys.version.split()[0],
+                       "recorded": time.strftime("%Y-%m-%d")}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
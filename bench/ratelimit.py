@@ -0,0 +1,81 @@
+"""
+Cost and effect of the rate limiter.
+
+    take      mean time of one token-bucket check, per backend (memory,
+              shared SQLite file on /dev/shm)
+    flood     for a few seconds some clients send requests in a tight loop
+              while a well-behaved client sends ten per second; reports the
+              status codes each one got. Fails (exit 1) if the well-behaved
+              client was rejected or the flooders were not.
+
+    $ python bench/ratelimit.py [seconds]
+"""
+import os
+import sys
+import time
+from collections import Counter
+
+os.environ["RATELIMIT_ENABLED"] = "true"
+os.environ.setdefault("RATELIMIT_SHARED_PATH", "/dev/shm/bench-ratelimit.sqlite")
+
+from common import load_app, timeit
+
+app = load_app()
+
+from models import db, Planets
+from ratelimit import MemoryBuckets, SharedBuckets, rate_limiter
+
+FLOODERS = ("10.0.0.1", "10.0.0.2", "10.0.0.3")
+CLIENT = "10.0.1.1"
+CLIENT_INTERVAL = 0.1
+
+
+def take_us(buckets, keys=1000, repeat=20000):
+    counter = iter(range(10 ** 9))
+    return timeit(lambda: buckets.take(f"ip:{next(counter) % keys}", 1), repeat=repeat) * 1000
+
+
+def flood(client, seconds):
+    statuses = {address: Counter() for address in FLOODERS + (CLIENT,)}
+    deadline = time.monotonic() + seconds
+    next_client = time.monotonic()
+    while time.monotonic() < deadline:
+        for address in FLOODERS:
+            statuses[address][client.get("/planets/1", environ_base={"REMOTE_ADDR": address}).status_code] += 1
+        if time.monotonic() >= next_client:
+            next_client += CLIENT_INTERVAL
+            statuses[CLIENT][client.get("/planets/1", environ_base={"REMOTE_ADDR": CLIENT}).status_code] += 1
+    return statuses
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    rate, burst = app.config['RATELIMIT_RATE'], app.config['RATELIMIT_BURST']
+    with app.app_context():
+        db.session.add(Planets(name="Tatooine", size=10465, gravity=True))
+        db.session.commit()
+
+    path = app.config['RATELIMIT_SHARED_PATH']
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    print(f"{'backend':>8} {'us/take':>8}")
+    for name, buckets in (("memory", MemoryBuckets(rate, burst)), ("shared", SharedBuckets(path, rate, burst))):
+        print(f"{name:>8} {take_us(buckets):>8.2f}")
+
+    print()
+    print(f"flood for {seconds:.0f}s, rate={rate}/s burst={burst}, backend={app.config['RATELIMIT_BACKEND']}")
+    statuses = flood(app.test_client(), seconds)
+    print(f"{'client':>10} {'sent':>6} {'200':>6} {'429':>6} {'503':>6}")
+    for address, counts in statuses.items():
+        print(f"{address:>10} {sum(counts.values()):>6} {counts[200]:>6} {counts[429]:>6} {counts[503]:>6}")
+    print(rate_limiter.stats())
+
+    failed = False
+    if set(statuses[CLIENT]) != {200}:
+        print(f"FAIL: the well-behaved client was rejected: {dict(statuses[CLIENT])}")
+        failed = True
+    if not all(statuses[address][429] for address in FLOODERS):
+        print("FAIL: some flooding client was never rate limited")
+        failed = True
+    sys.exit(1 if failed else 0)
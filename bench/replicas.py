@@ -0,0 +1,86 @@
+"""
+Read-replica routing with two SQLite files standing in for the primary and
+a replica (the replica gets the same schema but rows with other names, so
+every response shows where it was read from).
+
+Checks, failing (exit 1) on any mismatch, that:
+    - GETs read from the replica once its health check has passed,
+    - a client that wrote reads from the primary for REPLICA_STICKY_SECONDS,
+      and from the replica again afterwards,
+    - another client keeps reading from the replica meanwhile,
+    - a replica that cannot be opened never gets a read.
+Then reports the per-request cost of the routing.
+
+    $ python bench/replicas.py
+"""
+import os
+import sys
+import time
+
+REPLICA_DB = "/tmp/bench-replica.db"
+STICKY_SECONDS = 0.5
+
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(REPLICA_DB + suffix):
+        os.remove(REPLICA_DB + suffix)
+os.environ["DATABASE_REPLICA_URLS"] = f"sqlite:///{REPLICA_DB},sqlite:////nonexistent/bench-replica.db"
+os.environ["REPLICA_HEALTH_INTERVAL"] = "0.1"
+os.environ["REPLICA_STICKY_SECONDS"] = str(STICKY_SECONDS)
+# Sin cache de entidades: cada GET llega a la base de datos
+os.environ["CACHE_BACKEND"] = "null"
+
+from common import load_app, timeit
+
+app = load_app()
+
+from models import db, Planets
+from replicas import replica_router
+
+WRITER = {"REMOTE_ADDR": "10.0.0.1"}
+READER = {"REMOTE_ADDR": "10.0.0.2"}
+
+
+def seed():
+    with app.app_context():
+        db.session.add(Planets(name="Primary", size=1, gravity=True))
+        db.session.commit()
+    replica = replica_router.replicas[0]
+    db.metadata.create_all(replica.engine)
+    with replica.engine.begin() as connection:
+        connection.execute(Planets.__table__.insert(), [{"name": "Replica", "size": 1, "gravity": True}])
+
+
+def read(client, environ):
+    return client.get("/planets/1", environ_base=environ).json["name"]
+
+
+if __name__ == "__main__":
+    seed()
+    client, writer = app.test_client(), app.test_client()
+    # La primera peticion arranca la comprobacion de salud
+    read(client, READER)
+    time.sleep(0.3)
+
+    checks = [("reader before any write", read(client, READER), "Replica")]
+    writer.patch("/planet/1", json={"name": "Edited"}, environ_base=WRITER)
+    checks.append(("writer right after writing", read(writer, WRITER), "Edited"))
+    checks.append(("writer without the cookie", read(app.test_client(), WRITER), "Edited"))
+    checks.append(("other client meanwhile", read(client, READER), "Replica"))
+    time.sleep(STICKY_SECONDS + 0.1)
+    checks.append(("writer after the window", read(app.test_client(), WRITER), "Replica"))
+    checks.append(("reads on the broken replica", replica_router.replicas[1].reads, 0))
+
+    failed = False
+    for name, got, expected in checks:
+        status = "ok" if got == expected else "FAIL"
+        failed |= got != expected
+        print(f"{status:>4}  {name:<28} {got!r} (expected {expected!r})")
+
+    replica_ms = timeit(lambda: read(client, READER), repeat=500)
+    replicas = replica_router.replicas
+    replica_router.replicas = []
+    primary_ms = timeit(lambda: read(client, READER), repeat=500)
+    replica_router.replicas = replicas
+    print(f"GET /planets/1: {replica_ms:.3f} ms on the replica, {primary_ms:.3f} ms on the primary (no replicas)")
+    print(replica_router.stats())
+    sys.exit(1 if failed else 0)
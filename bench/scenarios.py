@@ -0,0 +1,315 @@
+"""
+Scenario runner: drives every route of src/app.py and reports throughput,
+p50/p95/p99 latency, queries per request and peak RSS as JSON.
+
+    $ python bench/scenarios.py --mode client                  # Flask test client, in process
+    $ python bench/scenarios.py --mode gunicorn --workers 4     # real gunicorn on localhost
+    $ python bench/scenarios.py --output run.json --baseline previous.json
+
+Without --database-url a SQLite database is seeded with bench/seed.py
+(volumes set with --users/--planets/--characters/--favorites). Queries per
+request come from the Server-Timing header, so METRICS_ENABLED must be on.
+
+With --baseline, every scenario is compared with the previous report and the
+run fails (exit 1) when p95 grows or throughput drops by more than
+--max-regression, or when a scenario needs more queries per request.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from common import SERVER_TIMING_QUERIES, SRC_DIR, http_run, summarize, wait_for_port
+
+ROOT_DIR = os.path.dirname(SRC_DIR)
+DEFAULT_DB = "/tmp/bench-scenarios.db"
+
+
+class Scenario:
+    """A route (as declared in app.py) and the requests that exercise it."""
+
+    def __init__(self, name, method, route, build):
+        self.name = name
+        self.method = method
+        self.route = route
+        # build(ctx, rng, n) -> [(path, body)]
+        self.build = build
+
+    def requests(self, ctx, n, seed):
+        rng = random.Random(f"{seed}:{self.name}")
+        return [(self.method, path, body) for path, body in self.build(ctx, rng, n)]
+
+
+def _ids(rng, top, n):
+    return [rng.randint(1, top) for _ in range(n)]
+
+
+def _favorite_pairs(ctx, kind, n):
+    # Los mismos pares para anadir y luego borrar, asi los DELETE encuentran el favorito
+    rng = random.Random(f"pairs:{kind}")
+    return [(rng.randint(1, ctx["users"]), rng.randint(1, ctx[kind])) for _ in range(n)]
+
+
+SCENARIOS = [
+    Scenario("sitemap", "GET", "/", lambda ctx, rng, n: [("/", None)] * n),
+    Scenario("users_list", "GET", "/users", lambda ctx, rng, n: [
+        (f"/users?limit=50&after_id={i}", None) for i in _ids(rng, ctx["users"], n)]),
+    Scenario("user_detail", "GET", "/users/<int:user_id>", lambda ctx, rng, n: [
+        (f"/users/{i}", None) for i in _ids(rng, ctx["users"], n)]),
+    Scenario("people_list", "GET", "/people", lambda ctx, rng, n: [
+        (f"/people?limit=50&after_id={i}", None) for i in _ids(rng, ctx["characters"], n)]),
+    Scenario("people_filtered", "GET", "/people", lambda ctx, rng, n: [
+        (f"/people?age__gte={rng.randint(1, 900)}&order=age&limit=20", None) for _ in range(n)]),
+    Scenario("people_detail", "GET", "/people/<int:people_id>", lambda ctx, rng, n: [
+        (f"/people/{i}", None) for i in _ids(rng, ctx["characters"], n)]),
+    Scenario("planets_list", "GET", "/planets", lambda ctx, rng, n: [
+        ("/planets?order=-size&limit=20", None)] * n),
+    Scenario("planet_detail", "GET", "/planets/<int:planets_id>", lambda ctx, rng, n: [
+        (f"/planets/{i}", None) for i in _ids(rng, ctx["planets"], n)]),
+    Scenario("favorites_get", "GET", "/users/<int:id_user>/favorites", lambda ctx, rng, n: [
+        (f"/users/{i}/favorites", None) for i in _ids(rng, ctx["users"], n)]),
+    Scenario("search", "GET", "/search", lambda ctx, rng, n: [
+        (f"/search?q={rng.choice(['lu', 'sky', 'han so', 'tat', 'hoth', 'leia org'])}", None) for _ in range(n)]),
+    Scenario("leaderboard_planets", "GET", "/leaderboard/planets", lambda ctx, rng, n: [
+        ("/leaderboard/planets?limit=20", None)] * n),
+    Scenario("leaderboard_people", "GET", "/leaderboard/people", lambda ctx, rng, n: [
+        ("/leaderboard/people?limit=20", None)] * n),
+    Scenario("cache_stats", "GET", "/cache/stats", lambda ctx, rng, n: [("/cache/stats", None)] * n),
+    Scenario("pool_stats", "GET", "/pool/stats", lambda ctx, rng, n: [("/pool/stats", None)] * n),
+    Scenario("metrics", "GET", "/metrics", lambda ctx, rng, n: [("/metrics", None)] * n),
+    Scenario("favorite_planet_add", "POST", "/favorite/planet/<int:planet_id>", lambda ctx, rng, n: [
+        (f"/favorite/planet/{p}", {"user_id": u}) for u, p in _favorite_pairs(ctx, "planets", n)]),
+    Scenario("favorite_planet_remove", "DELETE", "/favorite/user/<int:user_id>/planet/<int:planet_id>", lambda ctx, rng, n: [
+        (f"/favorite/user/{u}/planet/{p}", None) for u, p in _favorite_pairs(ctx, "planets", n)]),
+    Scenario("favorite_people_add", "POST", "/favorite/people/<int:people_id>", lambda ctx, rng, n: [
+        (f"/favorite/people/{c}", {"user_id": u}) for u, c in _favorite_pairs(ctx, "characters", n)]),
+    Scenario("favorite_people_remove", "DELETE", "/favorite/user/<int:user_id>/people/<int:people_id>", lambda ctx, rng, n: [
+        (f"/favorite/user/{u}/people/{c}", None) for u, c in _favorite_pairs(ctx, "characters", n)]),
+    Scenario("favorites_patch", "PATCH", "/users/<int:id_user>/favorites", lambda ctx, rng, n: [
+        (f"/users/{rng.randint(1, ctx['users'])}/favorites",
+         {"add": {"planets": _ids(rng, ctx["planets"], 3), "people": _ids(rng, ctx["characters"], 3)}})
+        for _ in range(n)]),
+    Scenario("people_put", "PUT", "/people/<int:people_id>", lambda ctx, rng, n: [
+        (f"/people/{i}", {"name": f"Renamed {i}", "age": rng.randint(1, 900)}) for i in _ids(rng, ctx["characters"], n)]),
+    Scenario("planet_put", "PUT", "/planet/<int:planet_id>", lambda ctx, rng, n: [
+        (f"/planet/{i}", {"name": f"Renamed {i}", "size": rng.randint(1, 200000), "gravity": True})
+        for i in _ids(rng, ctx["planets"], n)]),
+    Scenario("people_patch", "PATCH", "/people/<int:people_id>", lambda ctx, rng, n: [
+        (f"/people/{i}", {"age": rng.randint(1, 900)}) for i in _ids(rng, ctx["characters"], n)]),
+    Scenario("planet_patch", "PATCH", "/planet/<int:planet_id>", lambda ctx, rng, n: [
+        (f"/planet/{i}", {"size": rng.randint(1, 200000)}) for i in _ids(rng, ctx["planets"], n)]),
+    Scenario("people_bulk", "POST", "/people/bulk", lambda ctx, rng, n: [
+        ("/people/bulk", [{"name": f"Bulk {rng.random():.6f}", "age": rng.randint(1, 900)} for _ in range(20)])
+        for _ in range(n)]),
+    Scenario("planets_bulk", "POST", "/planets/bulk", lambda ctx, rng, n: [
+        ("/planets/bulk", [{"name": f"Bulk {rng.random():.6f}", "size": rng.randint(1, 200000), "gravity": False}
+                           for _ in range(20)]) for _ in range(n)]),
+    # Los borrados van al final y empiezan por los ids mas altos
+    Scenario("people_delete", "DELETE", "/people/<int:people_id>", lambda ctx, rng, n: [
+        (f"/people/{ctx['characters'] - i}", None) for i in range(n)]),
+    Scenario("planet_delete", "DELETE", "/planet/<int:planet_id>", lambda ctx, rng, n: [
+        (f"/planet/{ctx['planets'] - i}", None) for i in range(n)]),
+    Scenario("people_bulk_delete", "DELETE", "/people", lambda ctx, rng, n: [
+        ("/people?ids=" + ",".join(str(ctx["characters"] - n - i * 10 - j) for j in range(10)), None) for i in range(n)]),
+    Scenario("planets_bulk_delete", "DELETE", "/planets", lambda ctx, rng, n: [
+        ("/planets?ids=" + ",".join(str(ctx["planets"] - n - i * 10 - j) for j in range(10)), None) for i in range(n)]),
+]
+
+
+def uncovered_routes(app):
+    """Routes of the app (outside /admin and /static) no scenario exercises."""
+    covered = {(scenario.method, scenario.route) for scenario in SCENARIOS}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.rule.startswith(("/admin", "/static")):
+            continue
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            if (method, rule.rule) not in covered:
+                missing.append(f"{method} {rule.rule}")
+    return missing
+
+
+def _peak_rss_mb(pid):
+    # VmHWM: pico de memoria residente del proceso
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return [int(child) for child in children.read().split()]
+    except OSError:
+        return []
+
+
+def run_client(app, scenarios, ctx, n, seed):
+    client = app.test_client()
+    results = {}
+    for scenario in scenarios:
+        samples = []
+        start = time.perf_counter()
+        for method, path, body in scenario.requests(ctx, n, seed):
+            began = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            match = SERVER_TIMING_QUERIES.search(response.headers.get("Server-Timing", ""))
+            samples.append(((time.perf_counter() - began) * 1000, response.status_code,
+                            int(match.group(1)) if match else None))
+        results[scenario.name] = summarize(samples, time.perf_counter() - start)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results, {"process": round(rss, 1)}
+
+
+def run_gunicorn(database_url, scenarios, ctx, n, seed, workers, threads, concurrency, port):
+    env = {**os.environ, "DATABASE_URL": database_url, "METRICS_ENABLED": "true"}
+    command = [sys.executable, "-m", "gunicorn", "wsgi:application", "--chdir", SRC_DIR,
+               "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--threads", str(threads),
+               "--log-level", "warning"]
+    server = subprocess.Popen(command, cwd=ROOT_DIR, env=env)
+    try:
+        wait_for_port("127.0.0.1", port)
+        # Calentamiento: cada worker importa la app y abre su conexion
+        http_run("127.0.0.1", port, [("GET", "/people?limit=1", None)] * concurrency * 4, concurrency)
+        results = {}
+        for scenario in scenarios:
+            samples, elapsed = http_run("127.0.0.1", port, scenario.requests(ctx, n, seed), concurrency)
+            results[scenario.name] = summarize(samples, elapsed)
+        worker_rss = [_peak_rss_mb(pid) for pid in _children(server.pid)]
+        rss = {"master": _peak_rss_mb(server.pid), "worker_max": max(filter(None, worker_rss), default=None)}
+        return results, rss
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(report, baseline, max_regression):
+    """Return the regressions of `report` against `baseline`."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - max_regression):
+            regressions.append(f"{name}: throughput {previous['rps']} -> {current['rps']} req/s")
+        # El numero de consultas es determinista: cualquier aumento es una regresion
+        if (previous["queries_per_request"] is not None and current["queries_per_request"] is not None
+                and current["queries_per_request"] > previous["queries_per_request"]):
+            regressions.append(f"{name}: queries/request {previous['queries_per_request']} -> "
+                               f"{current['queries_per_request']}")
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=["client", "gunicorn"], default="client")
+    parser.add_argument("--database-url", help="already seeded database (default: seed a SQLite file)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--planets", type=int, default=10000)
+    parser.add_argument("--characters", type=int, default=100000)
+    parser.add_argument("--favorites", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--only", help="comma separated scenario names")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = f"sqlite:///{DEFAULT_DB}"
+        subprocess.run([sys.executable, "-W", "ignore", os.path.join(os.path.dirname(__file__), "seed.py"),
+                        "--database-url", database_url, "--users", str(args.users), "--planets", str(args.planets),
+                        "--characters", str(args.characters), "--favorites", str(args.favorites),
+                        "--seed", str(args.seed)], check=True, stdout=sys.stderr)
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["METRICS_ENABLED"] = "true"
+    # Los presupuestos se comprueban aparte (QUERY_TRACKING=raise en los tests)
+    os.environ.setdefault("QUERY_TRACKING", "off")
+    # Todas las peticiones salen de un mismo cliente: el limitador las rechazaria
+    os.environ.setdefault("RATELIMIT_ENABLED", "false")
+    sys.path.insert(0, SRC_DIR)
+    from sqlalchemy import func, select
+    from wsgi import application as app
+    from models import db, User, Planets, Characters
+
+    with app.app_context():
+        ctx = {
+            "users": db.session.execute(select(func.max(User.id))).scalar() or 1,
+            "planets": db.session.execute(select(func.max(Planets.id))).scalar() or 1,
+            "characters": db.session.execute(select(func.max(Characters.id))).scalar() or 1,
+        }
+    scenarios = SCENARIOS
+    if args.only:
+        names = set(args.only.split(","))
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in names]
+
+    if args.mode == "client":
+        results, rss = run_client(app, scenarios, ctx, args.requests, args.seed)
+    else:
+        results, rss = run_gunicorn(database_url, scenarios, ctx, args.requests, args.seed,
+                                    args.workers, args.threads, args.concurrency, args.port)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "mode": args.mode,
+            "database": database_url.split(":", 1)[0],
+            "rows": ctx,
+            "requests_per_scenario": args.requests,
+            "python": platform.python_version(),
+            **({"workers": args.workers, "threads": args.threads, "concurrency": args.concurrency}
+               if args.mode == "gunicorn" else {}),
+        },
+        "peak_rss_mb": rss,
+        "uncovered_routes": uncovered_routes(app),
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Solo tiene sentido comparar ejecuciones equivalentes
+        for key in ("mode", "database", "rows"):
+            if baseline["meta"].get(key) != report["meta"][key]:
+                sys.exit(f"The baseline was recorded with {key}={baseline['meta'].get(key)}, this run has {report['meta'][key]}")
+        regressions = compare(report, baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
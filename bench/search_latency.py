@@ -0,0 +1,67 @@
+"""
+Typeahead latency of GET /search on SQLite FTS5 and on the in-memory
+trigram fallback.
+
+    $ python bench/search_latency.py [rows]     # default 100000 per table
+"""
+import importlib.util
+import os
+import random
+import statistics
+import sys
+import time
+from common import load_app
+
+app = load_app()
+
+from sqlalchemy import insert
+from models import db, Planets, Characters
+from search import search_index, SqliteFtsSearch
+
+MIGRATION = os.path.join(os.path.dirname(__file__), "..", "migrations", "versions", "7968d180e3af_.py")
+SYLLABLES = ["lu", "ke", "sky", "wal", "ker", "le", "ia", "or", "ga", "na", "han", "so", "lo", "ta", "too", "ine", "ho", "th"]
+
+
+def name(rng):
+    return " ".join("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title() for _ in range(2))
+
+
+def seed(rows):
+    rng = random.Random(42)
+    for start in range(0, rows, 50000):
+        count = min(50000, rows - start)
+        db.session.execute(insert(Planets), [{"name": name(rng), "size": i, "gravity": True} for i in range(count)])
+        db.session.execute(insert(Characters), [{"name": name(rng), "age": i % 900} for i in range(count)])
+    db.session.commit()
+    # Crea la tabla FTS5 y los triggers igual que la migracion
+    spec = importlib.util.spec_from_file_location("search_migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with db.engine.begin() as connection:
+        for statement in migration.SQLITE_UPGRADE:
+            connection.exec_driver_sql(statement)
+
+
+def measure(client, queries):
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        assert client.get(f"/search?q={q}").status_code == 200
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)], timings[int(len(timings) * 0.99)]
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    client = app.test_client()
+    queries = [prefix for syllable in SYLLABLES for prefix in (syllable[:2], syllable)] * 5
+    with app.app_context():
+        seed(rows)
+    print(f"rows per table={rows} queries={len(queries)}")
+    print(f"{'backend':>16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for backend in (SqliteFtsSearch(), search_index.fallback):
+        search_index.backend = backend
+        client.get("/search?q=warmup")
+        p50, p95, p99 = measure(client, queries)
+        print(f"{backend.name:>16} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f}")
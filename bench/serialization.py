@@ -0,0 +1,58 @@
+"""
+Micro-benchmark of the list serialization paths.
+
+    legacy   select(Model) -> ORM entities -> serialize() dicts -> jsonify
+    columns  select(columns) -> Row tuples -> ModelSerializer dicts -> encode_json
+
+encode_json uses orjson when it is installed, so run it with and without
+orjson to see both backends.
+
+    $ python bench/serialization.py [rows]
+"""
+import datetime
+import sys
+from common import load_app, timeit
+
+app = load_app()
+
+from flask import jsonify
+from sqlalchemy import insert, select
+from models import db, User, Planets, Characters
+import serializers
+from serializers import SERIALIZERS
+
+
+def seed(rows):
+    now = datetime.datetime.now()
+    db.session.execute(insert(User), [
+        {"firstname": f"First {i}", "lastname": f"Last {i}", "email": f"user{i}@rebels.org",
+         "password": "x", "created_date": now} for i in range(rows)])
+    db.session.execute(insert(Planets), [{"name": f"Planet {i}", "size": i, "gravity": i % 2 == 0} for i in range(rows)])
+    db.session.execute(insert(Characters), [{"name": f"Character {i}", "age": i % 900} for i in range(rows)])
+    db.session.commit()
+
+
+def legacy(model):
+    db.session.expunge_all()
+    items = db.session.execute(select(model)).scalars().all()
+    return jsonify(list(map(lambda x: x.serialize(), items))).get_data()
+
+
+def columns(model, fields=None):
+    serializer = SERIALIZERS[model]
+    fields = fields or serializer.fields
+    rows = db.session.execute(serializer.select(fields)).all()
+    return serializer.response(rows, fields).get_data()
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(f"rows={rows} encoder={'orjson' if serializers.orjson else 'json'}")
+    print(f"{'model':>12} {'legacy ms':>10} {'columns ms':>11} {'id,name ms':>11} {'speedup':>8}")
+    with app.test_request_context():
+        seed(rows)
+        for model in (User, Planets, Characters):
+            legacy_ms = timeit(lambda: legacy(model), repeat=10)
+            columns_ms = timeit(lambda: columns(model), repeat=10)
+            sparse_ms = timeit(lambda: columns(model, ("id", "name") if model is not User else ("id", "email")), repeat=10)
+            print(f"{model.__name__:>12} {legacy_ms:>10.2f} {columns_ms:>11.2f} {sparse_ms:>11.2f} {legacy_ms / columns_ms:>7.1f}x")
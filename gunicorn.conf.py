@@ -0,0 +1,57 @@
+"""
+Gunicorn settings. Loaded automatically from the directory gunicorn is
+started in (the repo root, see Procfile), so `--chdir ./src/` still finds it.
+
+Every value can be overridden from the environment. With WEB_CONCURRENCY
+workers x GUNICORN_THREADS threads, keep DB_POOL_SIZE + DB_MAX_OVERFLOW >=
+GUNICORN_THREADS so a worker never waits on its own pool.
+
+One worker by default. With WEB_CONCURRENCY > 1, CACHE_BACKEND and
+RATELIMIT_BACKEND default to `shared`: with per-worker (`memory`) stores a
+write only invalidates the cache of the worker that handled it, and a client
+gets a rate-limit bucket in every worker.
+
+GUNICORN_PRELOAD=true builds the app once in the master (create_app does not
+open database connections) and forks the workers from it, which shares its
+memory and cuts worker start-up; post_fork then gives each worker its own
+connection pool.
+"""
+import gc
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+# Los workers heredan el entorno del maestro; un valor explicito se respeta
+if workers > 1:
+    os.environ.setdefault("CACHE_BACKEND", "shared")
+    os.environ.setdefault("RATELIMIT_BACKEND", "shared")
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() in ("1", "true", "yes")
+
+
+def when_ready(server):
+    # Con --preload la app ya esta cargada en el maestro: se congela el heap para que
+    # el GC de los workers no toque (y copie) sus paginas
+    if server.cfg.preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Con --preload el maestro puede haber abierto conexiones antes del fork: el worker
+    # descarta las heredadas (sin cerrarlas, siguen siendo del maestro) y abre las suyas
+    # App de Flask creada por el punto de entrada (wsgi.application o asgi.app)
+    app = getattr(sys.modules.get("asgi"), "app", None) or getattr(sys.modules.get("wsgi"), "application", None)
+    if app is None:
+        return
+    with app.app_context():
+        sys.modules["models"].db.engine.dispose(close=False)
+    sys.modules["replicas"].replica_router.dispose()
+    # Motor async de asgi.py, si es el punto de entrada
+    if "asgi" in sys.modules:
+        sys.modules["asgi"].engine.sync_engine.dispose(close=False)
+    server.log.info("Worker %s: database pool reset after fork", worker.pid)
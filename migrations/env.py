@@ -32,6 +32,19 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# Tabla FTS5 de busqueda (sqlite) y sus tablas internas: las crea la migracion
+# 7968d180e3af con SQL propio, no estan en los modelos
+SEARCH_TABLES = ('search_index', 'search_index_data', 'search_index_idx',
+                 'search_index_docsize', 'search_index_config', 'search_index_content')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate from dropping the search index tables."""
+    if type_ == 'table' and name in SEARCH_TABLES:
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -52,7 +65,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -84,6 +98,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=get_metadata(),
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -0,0 +1,35 @@
+"""table_versions for conditional GETs
+
+Revision ID: 2409b1a817c2
+Revises: 59c57a140c79
+Create Date: 2026-10-18 11:02:17.530214
+
+"""
+import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2409b1a817c2'
+down_revision = '59c57a140c79'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(length=80), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    op.bulk_insert(table_versions, [
+        {'name': name, 'version': 1, 'updated_at': now}
+        for name in ('user', 'planet', 'character', 'favoritos')
+    ])
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -0,0 +1,36 @@
+"""indexes for filtering and ordering planets and characters
+
+Revision ID: 426935cf2f44
+Revises: 2409b1a817c2
+Create Date: 2026-10-18 11:48:51.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '426935cf2f44'
+down_revision = '2409b1a817c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_planet_name'), ['name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_planet_size'), ['size'], unique=False)
+
+    with op.batch_alter_table('character', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_character_name'), ['name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_character_age'), ['age'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('character', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_character_age'))
+        batch_op.drop_index(batch_op.f('ix_character_name'))
+
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_planet_size'))
+        batch_op.drop_index(batch_op.f('ix_planet_name'))
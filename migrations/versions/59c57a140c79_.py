@@ -0,0 +1,35 @@
+"""unique composite indexes on favoritos
+
+Revision ID: 59c57a140c79
+Revises: 475db6acefbb
+Create Date: 2026-10-18 10:12:40.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '59c57a140c79'
+down_revision = '475db6acefbb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Borramos favoritos duplicados antes de crear los indices unicos.
+    # La subconsulta va envuelta en una tabla derivada para que MySQL la acepte
+    op.execute(
+        "DELETE FROM favoritos WHERE id NOT IN ("
+        "SELECT id FROM (SELECT MIN(id) AS id FROM favoritos "
+        "GROUP BY user_id, planet_id, character_id) AS keep_rows)"
+    )
+    with op.batch_alter_table('favoritos', schema=None) as batch_op:
+        batch_op.create_index('ix_favoritos_user_planet', ['user_id', 'planet_id'], unique=True)
+        batch_op.create_index('ix_favoritos_user_character', ['user_id', 'character_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('favoritos', schema=None) as batch_op:
+        batch_op.drop_index('ix_favoritos_user_character')
+        batch_op.drop_index('ix_favoritos_user_planet')
@@ -0,0 +1,68 @@
+"""full-text search index over planet and character names
+
+Revision ID: 7968d180e3af
+Revises: 426935cf2f44
+Create Date: 2026-10-18 12:20:05.662391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7968d180e3af'
+down_revision = '426935cf2f44'
+branch_labels = None
+depends_on = None
+
+# rowid del indice FTS5 = id * 2 para planetas, id * 2 + 1 para personajes
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE search_index USING fts5(name, prefix='2 3')",
+    "INSERT INTO search_index(rowid, name) SELECT id * 2, name FROM planet",
+    "INSERT INTO search_index(rowid, name) SELECT id * 2 + 1, name FROM character",
+    "CREATE TRIGGER planet_search_insert AFTER INSERT ON planet BEGIN "
+    "INSERT INTO search_index(rowid, name) VALUES (new.id * 2, new.name); END",
+    "CREATE TRIGGER planet_search_update AFTER UPDATE OF id, name ON planet BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2; "
+    "INSERT INTO search_index(rowid, name) VALUES (new.id * 2, new.name); END",
+    "CREATE TRIGGER planet_search_delete AFTER DELETE ON planet BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER character_search_insert AFTER INSERT ON character BEGIN "
+    "INSERT INTO search_index(rowid, name) VALUES (new.id * 2 + 1, new.name); END",
+    "CREATE TRIGGER character_search_update AFTER UPDATE OF id, name ON character BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; "
+    "INSERT INTO search_index(rowid, name) VALUES (new.id * 2 + 1, new.name); END",
+    "CREATE TRIGGER character_search_delete AFTER DELETE ON character BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; END",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS character_search_delete",
+    "DROP TRIGGER IF EXISTS character_search_update",
+    "DROP TRIGGER IF EXISTS character_search_insert",
+    "DROP TRIGGER IF EXISTS planet_search_delete",
+    "DROP TRIGGER IF EXISTS planet_search_update",
+    "DROP TRIGGER IF EXISTS planet_search_insert",
+    "DROP TABLE IF EXISTS search_index",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.execute("CREATE INDEX ix_planet_name_tsv ON planet USING GIN (to_tsvector('simple', name))")
+        op.execute("CREATE INDEX ix_character_name_tsv ON character USING GIN (to_tsvector('simple', name))")
+    # Otros motores usan el indice de trigramas en memoria de src/search.py
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_character_name_tsv")
+        op.execute("DROP INDEX IF EXISTS ix_planet_name_tsv")
@@ -0,0 +1,45 @@
+"""ON DELETE CASCADE on the favoritos foreign keys
+
+Revision ID: b3e91c4f7a20
+Revises: 7968d180e3af
+Create Date: 2026-10-18 13:05:41.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e91c4f7a20'
+down_revision = '7968d180e3af'
+branch_labels = None
+depends_on = None
+
+# Columna -> tabla referenciada
+FOREIGN_KEYS = {"user_id": "user", "planet_id": "planet", "character_id": "character"}
+
+# Las foreign keys se crearon sin nombre; en SQLite se reflejan con este
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def _existing_names():
+    # Nombre real de cada foreign key (p. ej. favoritos_user_id_fkey en PostgreSQL)
+    inspector = sa.inspect(op.get_bind())
+    return {fk["constrained_columns"][0]: fk["name"] for fk in inspector.get_foreign_keys("favoritos")}
+
+
+def _replace_foreign_keys(ondelete):
+    existing = _existing_names()
+    with op.batch_alter_table('favoritos', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        for column, referred in FOREIGN_KEYS.items():
+            name = f"fk_favoritos_{column}_{referred}"
+            batch_op.drop_constraint(existing.get(column) or name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
@@ -0,0 +1,28 @@
+"""version column on planet and character for optimistic concurrency
+
+Revision ID: d41c7e9b2f63
+Revises: b3e91c4f7a20
+Create Date: 2026-10-18 13:40:12.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c7e9b2f63'
+down_revision = 'b3e91c4f7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ADD COLUMN con valor por defecto: no hace falta reescribir la tabla (ni tocar los triggers de busqueda)
+    op.add_column('planet', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('character', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    # Sin batch: recrear la tabla en SQLite borraria los triggers de busqueda
+    op.drop_column('character', 'version')
+    op.drop_column('planet', 'version')
@@ -0,0 +1,42 @@
+"""favorite_count counters on planet and character for the leaderboards
+
+Revision ID: e8a2d5c13b97
+Revises: d41c7e9b2f63
+Create Date: 2026-10-18 14:22:05.871346
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a2d5c13b97'
+down_revision = 'd41c7e9b2f63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('planet', sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('character', sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+    # Los indices de favoritos van primero: el backfill cuenta por planet_id / character_id
+    op.create_index('ix_favoritos_planet_id', 'favoritos', ['planet_id'], unique=False)
+    op.create_index('ix_favoritos_character_id', 'favoritos', ['character_id'], unique=False)
+    # Construido con SQLAlchemy para que "character" vaya entre comillas donde es palabra reservada
+    favoritos = sa.table('favoritos', sa.column('planet_id'), sa.column('character_id'))
+    for table_name, column_name in (('planet', 'planet_id'), ('character', 'character_id')):
+        table = sa.table(table_name, sa.column('id'), sa.column('favorite_count'))
+        count = sa.select(sa.func.count()).where(favoritos.c[column_name] == table.c.id).scalar_subquery()
+        op.execute(table.update().values(favorite_count=count))
+    op.create_index('ix_planet_favorite_count', 'planet', ['favorite_count', 'id'], unique=False)
+    op.create_index('ix_character_favorite_count', 'character', ['favorite_count', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_character_favorite_count', table_name='character')
+    op.drop_index('ix_planet_favorite_count', table_name='planet')
+    op.drop_index('ix_favoritos_character_id', table_name='favoritos')
+    op.drop_index('ix_favoritos_planet_id', table_name='favoritos')
+    # Sin batch: recrear la tabla en SQLite borraria los triggers de busqueda
+    op.drop_column('character', 'favorite_count')
+    op.drop_column('planet', 'favorite_count')
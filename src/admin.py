@@ -1,18 +1,209 @@
+"""
+Flask-Admin views tuned for large tables.
+
+The stock ModelView runs an exact COUNT(*) for every list page, pages with
+OFFSET, sorts and searches on any column (ILIKE '%term%') and builds forms
+that load every related row into a select box. FastModelView instead:
+    - shows an estimated row count: pg_class.reltuples on PostgreSQL, a
+      COUNT(*) cached for ADMIN_COUNT_TTL seconds elsewhere. Searched or
+      filtered lists use the previous/next pager and are not counted,
+    - pages with keyset conditions on (sort column, id). The view remembers
+      where each page it served ends, so following the pager never uses
+      OFFSET; only jumping to a page nobody has reached yet falls back to it,
+    - sorts only by indexed columns and searches by indexed prefix
+      (name >= 'Hot' AND name < 'Hou'),
+    - lists and edits plain columns only, never relationships.
+
+Importing this module loads Flask-Admin and WTForms, so app.py only does it
+on the first request under /admin (see lazy.py).
+"""
 import os
+import threading
+import time
+from collections import OrderedDict
+from flask import Flask
 from flask_admin import Admin
-from models import db, User, Planets, Characters
+from sqlalchemy import and_, func, or_, select, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+from models import db, User, Planets, Characters, Favorite
 from flask_admin.contrib.sqla import ModelView
+from pagination import page_statement, sort_clause
+from favorites import adjust_favorite_counts
+
+
+class FastModelView(ModelView):
+    page_size = 50
+    can_set_page_size = True
+    page_size_options = (20, 50, 100)
+    # Contador estimado: segundos que se reutiliza el COUNT(*) fuera de PostgreSQL
+    count_ttl = 60
+    # Fronteras de pagina recordadas por vista
+    max_boundaries = 2048
+
+    def __init__(self, model, session, **kwargs):
+        super().__init__(model, session, **kwargs)
+        self._lock = threading.Lock()
+        self._count = None
+        self._boundaries = OrderedDict()
+
+    def estimate_count(self):
+        """Approximate number of rows in the table, without scanning it."""
+        bind = self.session.get_bind()
+        table = self.model.__table__.name
+        if bind.dialect.name == 'postgresql':
+            # reltuples lo mantienen VACUUM/ANALYZE; -1 si la tabla nunca se ha analizado
+            estimate = self.session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)"),
+                {"name": bind.dialect.identifier_preparer.quote(table)},
+            ).scalar()
+            if estimate is not None and estimate >= 0:
+                return estimate
+        with self._lock:
+            if self._count is not None and self._count[1] > time.monotonic():
+                return self._count[0]
+        count = self.session.execute(select(func.count()).select_from(self.model.__table__)).scalar()
+        with self._lock:
+            self._count = (count, time.monotonic() + self.count_ttl)
+        return count
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        # Prefijo como rango sobre el indice en vez de ILIKE '%term%'
+        # Todo el texto es un prefijo: "Luke Sky" busca nombres que empiecen por "Luke Sky"
+        term = search.strip()
+        if not term:
+            return query, count_query, joins, count_joins
+        columns = [field for field, path in self._search_fields]
+        upper = term[:-1] + chr(ord(term[-1]) + 1)
+        query = query.filter(or_(*[and_(column >= term, column < upper) for column in columns]))
+        return query, count_query, joins, count_joins
+
+    def _boundary(self, key):
+        with self._lock:
+            return self._boundaries.get(key)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._boundaries[key] = value
+            self._boundaries.move_to_end(key)
+            if len(self._boundaries) > self.max_boundaries:
+                self._boundaries.popitem(last=False)
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        page = page or 0
+        page_size = page_size or self.page_size
+        query = self.get_query()
+        joins = {}
+        if self._search_supported and search:
+            query, _, joins, _ = self._apply_search(query, None, joins, {}, search)
+        if filters and self._filters:
+            query, _, joins, _ = self._apply_filters(query, None, joins, {}, filters)
+
+        pk = getattr(self.model, self._primary_key)
+        order = None
+        if sort_column in self._sortable_columns and sort_column != self._primary_key:
+            order = (sort_column, self._sortable_columns[sort_column], bool(sort_desc))
+        elif sort_desc:
+            order = (self._primary_key, pk, True)
+
+        # Misma consulta (orden, busqueda, filtros) -> frontera de cada pagina
+        key = (sort_column, bool(sort_desc), search, tuple(tuple(f) for f in filters or ()), page_size)
+        after = self._boundary(key + (page,)) if page else None
+        if page and after is None:
+            # Salto a una pagina que no se ha recorrido: OFFSET como la vista original
+            query = query.order_by(*sort_clause(pk, order)).offset(page * page_size).limit(page_size + 1)
+        else:
+            if after is None and order is None:
+                after = 0
+            query = page_statement(query, pk, page_size, after, order)
+        if not execute:
+            return None, query
+
+        rows = query.all()
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            last_id = getattr(last, self._primary_key)
+            self._remember(key + (page + 1,), last_id if order is None else (getattr(last, order[0]), last_id))
+        count = None if search or filters else self.estimate_count()
+        return count, rows
+
+
+class UserView(FastModelView):
+    column_list = ("id", "firstname", "lastname", "email", "created_date")
+    column_sortable_list = ("id", "email")
+    column_searchable_list = ("email",)
+    form_excluded_columns = ("favourites_planet", "favourites_character")
+
+
+class PlanetView(FastModelView):
+    column_list = ("id", "name", "size", "gravity", "favorite_count", "version")
+    column_sortable_list = ("id", "name", "size", "favorite_count")
+    column_searchable_list = ("name",)
+    # Los contadores y la version los mantiene la aplicacion
+    form_excluded_columns = ("users", "favorite_count", "version")
+
+
+class CharacterView(FastModelView):
+    column_list = ("id", "name", "age", "favorite_count", "version")
+    column_sortable_list = ("id", "name", "age", "favorite_count")
+    column_searchable_list = ("name",)
+    form_excluded_columns = ("users", "favorite_count", "version")
+
+
+class FavoriteView(FastModelView):
+    column_list = ("id", "user_id", "planet_id", "character_id")
+    column_sortable_list = ("id", "user_id", "planet_id", "character_id")
+    column_filters = ("user_id", "planet_id", "character_id")
+    form_columns = ("user_id", "planet_id", "character_id")
+    # Se crean y se borran; editar uno descuadraria los contadores
+    can_edit = False
+
+    # Los contadores se mueven en la misma transaccion que el INSERT/DELETE
+    def on_model_change(self, form, model, is_created):
+        if is_created:
+            self._adjust_counts(model, 1)
+
+    def on_model_delete(self, model):
+        self._adjust_counts(model, -1)
+
+    def _adjust_counts(self, model, delta):
+        if model.planet_id is not None:
+            adjust_favorite_counts(self.session, Planets, [model.planet_id], delta)
+        if model.character_id is not None:
+            adjust_favorite_counts(self.session, Characters, [model.character_id], delta)
+
 
-def setup_admin(app):
-    app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
-    app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
-    admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
+def create_admin_app(app):
+    """
+    Flask app serving the admin, mounted under /admin by lazy.LazyMount on
+    the first admin request. Its views use their own scoped session on the
+    engine of `app`, so they share its pool and session events, and always
+    read and write on the primary database.
+    """
+    admin_app = Flask(__name__)
+    admin_app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
+    admin_app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
+    with app.app_context():
+        session = scoped_session(sessionmaker(bind=db.engine))
+    admin_app.teardown_appcontext(lambda exception: session.remove())
+    if 'response_compressor' in app.extensions:
+        admin_app.after_request(app.extensions['response_compressor'].compress_response)
+    # Tras editar en el admin, la API lee del primario durante un rato
+    if 'replica_router' in app.extensions:
+        admin_app.after_request(app.extensions['replica_router'].pin_after_write)
+    admin = Admin(admin_app, name='4Geeks Admin', url='/', template_mode='bootstrap3')
 
-    
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(Planets, db.session))
-    admin.add_view(ModelView(Characters, db.session))
+    views = [
+        UserView(User, session),
+        PlanetView(Planets, session),
+        CharacterView(Characters, session),
+        FavoriteView(Favorite, session, name="Favoritos"),
+    ]
+    for view in views:
+        view.count_ttl = app.config['ADMIN_COUNT_TTL']
+        admin.add_view(view)
 
     # You can duplicate that line to add mew models
-    # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
+    # admin.add_view(ModelView(YourModelName, session))
+    return admin_app
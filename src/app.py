@@ -1,209 +1,481 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
+
+The endpoints live on the `api` blueprint; `create_app()` builds the app
+(wsgi.py and asgi.py call it, and `flask` finds it through FLASK_APP).
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+import click
+from flask import Blueprint, Flask, current_app, request, jsonify
 from flask_cors import CORS
-from sqlalchemy import and_, delete, null, select, or_
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
 from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, User, Planets, Characters, favoritos
+from lazy import LazyMount, MigrateCommand
+from pagination import get_page_args, paginate, page_headers, sort_clause
+from filtering import parse_filters, parse_order
+from streaming import get_stream_mode, stream_rows
+from favorites import (add_favorite, apply_favorites_batch, parse_favorites_batch, remove_favorite,
+                       user_favorites_payload, user_favorites_statement)
+from leaderboard import leaderboard_order, leaderboard_statement, reconcile_favorite_counts
+from bulk import bulk_delete, bulk_write, parse_ids, validate_records
+from updates import UpdateConflict, parse_changes, update_entity
+from cache import entity_cache
+from compression import response_compressor
+from versioning import conditional_get, favorites_key
+from serializers import SERIALIZERS
+from search import search_index
+from database import engine_options, pool_gauges, pool_stats
+from metrics import request_metrics
+from querybudget import query_budget, query_tracker
+from ratelimit import rate_limit, rate_limiter
+from replicas import replica_router
+from models import db, User, Planets, Characters
 #from models import Person
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
-
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+api = Blueprint('api', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """
+    Build the application. Settings come from the environment; `config`
+    overrides any of them (e.g. {"ADMIN_ENABLED": False} or another
+    SQLALCHEMY_DATABASE_URI). The *_ENABLED flags turn features off.
+    """
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DATABASE_REPLICA_URLS'] = [url.strip().replace("postgres://", "postgresql://")
+                                           for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    app.config['REPLICA_HEALTH_INTERVAL'] = float(os.getenv("REPLICA_HEALTH_INTERVAL", 5))
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+    app.config['REPLICA_STICKY_SECONDS'] = float(os.getenv("REPLICA_STICKY_SECONDS", 5))
+    app.config['DEFAULT_PAGE_SIZE'] = int(os.getenv("DEFAULT_PAGE_SIZE", 50))
+    app.config['MAX_PAGE_SIZE'] = int(os.getenv("MAX_PAGE_SIZE", 100))
+    app.config['STREAM_BATCH_SIZE'] = int(os.getenv("STREAM_BATCH_SIZE", 1000))
+    app.config['BULK_BATCH_SIZE'] = int(os.getenv("BULK_BATCH_SIZE", 500))
+    app.config['MAX_BULK_BATCH_SIZE'] = int(os.getenv("MAX_BULK_BATCH_SIZE", 5000))
+    app.config['CACHE_BACKEND'] = os.getenv("CACHE_BACKEND", "memory")
+    app.config['CACHE_TTL'] = int(os.getenv("CACHE_TTL", 60))
+    app.config['CACHE_MAX_ENTRIES'] = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+    app.config['CACHE_SHARED_PATH'] = os.getenv("CACHE_SHARED_PATH", "/dev/shm/starwars-cache.sqlite")
+    app.config['CACHE_REDIS_URL'] = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    app.config['SEARCH_MAX_RESULTS'] = int(os.getenv("SEARCH_MAX_RESULTS", 50))
+    app.config['SEARCH_CANDIDATES'] = int(os.getenv("SEARCH_CANDIDATES", 200))
+    app.config['SEARCH_FALLBACK_REFRESH'] = int(os.getenv("SEARCH_FALLBACK_REFRESH", 60))
+    app.config['COMPRESSION_ENABLED'] = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+    app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+    app.config['COMPRESSION_GZIP_LEVEL'] = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+    app.config['COMPRESSION_BROTLI_LEVEL'] = int(os.getenv("COMPRESSION_BROTLI_LEVEL", 5))
+    app.config['COMPRESSION_ZSTD_LEVEL'] = int(os.getenv("COMPRESSION_ZSTD_LEVEL", 3))
+    app.config['COMPRESSION_CACHE_BYTES'] = int(os.getenv("COMPRESSION_CACHE_BYTES", 16 * 1024 * 1024))
+    app.config['ADMIN_ENABLED'] = os.getenv("ADMIN_ENABLED", "true").lower() in ("1", "true", "yes")
+    app.config['ADMIN_COUNT_TTL'] = int(os.getenv("ADMIN_COUNT_TTL", 60))
+    app.config['MIGRATIONS_ENABLED'] = os.getenv("MIGRATIONS_ENABLED", "true").lower() in ("1", "true", "yes")
+    app.config['CORS_ENABLED'] = os.getenv("CORS_ENABLED", "true").lower() in ("1", "true", "yes")
+    app.config['RATELIMIT_ENABLED'] = os.getenv("RATELIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+    app.config['RATELIMIT_BACKEND'] = os.getenv("RATELIMIT_BACKEND", "memory")
+    app.config['RATELIMIT_SHARED_PATH'] = os.getenv("RATELIMIT_SHARED_PATH", "/dev/shm/starwars-ratelimit.sqlite")
+    app.config['RATELIMIT_RATE'] = float(os.getenv("RATELIMIT_RATE", 20))
+    app.config['RATELIMIT_BURST'] = int(os.getenv("RATELIMIT_BURST", 100))
+    app.config['RATELIMIT_TRUSTED_PROXIES'] = int(os.getenv("RATELIMIT_TRUSTED_PROXIES", 0))
+    app.config['RATELIMIT_CONCURRENCY'] = int(os.getenv("RATELIMIT_CONCURRENCY", 0))
+    app.config['RATELIMIT_MAX_QUEUE_MS'] = int(os.getenv("RATELIMIT_MAX_QUEUE_MS", 5000))
+    app.config['METRICS_ENABLED'] = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    app.config['SLOW_QUERY_MS'] = int(os.getenv("SLOW_QUERY_MS", 200))
+    app.config['QUERY_TRACKING'] = os.getenv("QUERY_TRACKING", "warn")
+    app.config['N_PLUS_ONE_THRESHOLD'] = int(os.getenv("N_PLUS_ONE_THRESHOLD", 3))
+
+    app.config.update(config or {})
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    db.init_app(app)
+    # flask db ...: Flask-Migrate y Alembic se importan al ejecutar el comando
+    if app.config['MIGRATIONS_ENABLED']:
+        app.cli.add_command(MigrateCommand(app, db))
+    if app.config['CORS_ENABLED']:
+        CORS(app)
+    # Flask-Admin se carga con la primera peticion a /admin
+    if app.config['ADMIN_ENABLED']:
+        app.wsgi_app = LazyMount(app.wsgi_app, '/admin', lambda: _admin_app(app))
+    entity_cache.init_app(app, [User, Planets, Characters])
+    search_index.init_app(app)
+    query_tracker.init_app(app)
+    if app.config['METRICS_ENABLED']:
+        request_metrics.init_app(app, engine_stats=lambda: {
+            **pool_gauges(db.engine),
+            **(rate_limiter.gauges() if app.config['RATELIMIT_ENABLED'] else {}),
+            **(replica_router.gauges() if app.config['DATABASE_REPLICA_URLS'] else {}),
+        })
+    if app.config['DATABASE_REPLICA_URLS']:
+        replica_router.init_app(app)
+    # Su after_request se ejecuta antes que los demas: el resto ve el cuerpo comprimido
+    if app.config['COMPRESSION_ENABLED']:
+        response_compressor.init_app(app)
+    # La ultima: su before_request rechaza cuando las metricas ya han empezado a medir
+    if app.config['RATELIMIT_ENABLED']:
+        rate_limiter.init_app(app)
+
+    app.register_blueprint(api)
+    return app
+
+
+def _admin_app(app):
+    # Aqui se importan Flask-Admin y WTForms, no al arrancar
+    from admin import create_admin_app
+    return create_admin_app(app)
 
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
 # generate sitemap with all your endpoints
-@app.route('/')
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return generate_sitemap(current_app)
+
+
+# Contadores de la cache de entidades
+@api.route('/cache/stats', methods=['GET'])
+@rate_limit(exempt=True)
+def get_cache_stats():
+    return jsonify({**entity_cache.stats(), "compression": response_compressor.stats()}), 200
+
+
+# Limites por cliente y rechazos de este worker
+@api.route('/ratelimit/stats', methods=['GET'])
+@rate_limit(exempt=True)
+def get_ratelimit_stats():
+    if 'rate_limiter' not in current_app.extensions:
+        return {"message": "Rate limiting is disabled"}, 404
+    return jsonify(rate_limiter.stats()), 200
+
+
+# Estado de las replicas de lectura y reparto de las lecturas en este worker
+@api.route('/replicas/stats', methods=['GET'])
+@rate_limit(exempt=True)
+def get_replica_stats():
+    if 'replica_router' not in current_app.extensions:
+        return {"message": "Read replicas are not configured"}, 404
+    return jsonify(replica_router.stats()), 200
+
+
+# Uso del pool de conexiones de este worker
+@api.route('/pool/stats', methods=['GET'])
+@rate_limit(exempt=True)
+def get_pool_stats():
+    return jsonify(pool_stats(db.engine)), 200
+
+
+# Busqueda de texto sobre nombres de personajes y planetas
+@api.route('/search', methods=['GET'])
+@query_budget(3)
+@rate_limit(cost=2, concurrency=4)
+def search():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return {"message": "Missing query parameter q"}, 400
+    limit = request.args.get('limit', 10, type=int)
+    if limit is None or limit < 1:
+        return {"message": "limit must be a positive integer"}, 400
+    try:
+        backend, results = search_index.search(db.session, q, min(limit, current_app.config['SEARCH_MAX_RESULTS']))
+        return {"q": q, "backend": backend, "results": results}, 200
+    except Exception as e:
+        print("Error:", e)
+        return {"message": "Error searching the catalog"}, 500
 
 
 # GET de USER
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
+@query_budget(2)
+@rate_limit(cost=2, concurrency=8)
 def get_users():
+    serializer = SERIALIZERS[User]
+    fields = serializer.parse_fields()
+    # Exportacion completa en streaming (?stream=ndjson|json)
+    stream_mode = get_stream_mode()
+    if stream_mode is not None:
+        return stream_rows(db.session, serializer.select(fields).order_by(User.id), serializer, fields, stream_mode)
+    limit, after_id = get_page_args()
     try:
-        all_users =  db.session.execute(select(User)).scalars().all()
+        # 304 si el cliente ya tiene esta version de la tabla
+        not_modified, cache_headers = conditional_get(db.session, ["user"])
+        if not_modified:
+            return "", 304, cache_headers
+        # Misma version y misma URL: se reutiliza el cuerpo ya comprimido
+        cached = response_compressor.cached_response(cache_headers["ETag"])
+        if cached is not None:
+            return cached
+        all_users, next_cursor = paginate(db.session, serializer.select(fields), User.id, limit, after_id)
         # Validacion
         if all_users == None:
             return {"message" : "No user can be found"}, 404
         # Respuesta
-        all_users = list(map(lambda x: x.serialize(), all_users))
-        return jsonify(all_users), 200
+        return serializer.response(all_users, fields, 200, {**page_headers(next_cursor, limit), **cache_headers})
     except:
         return {"message":"Error: users cannot be found"}, 404
 
-@app.route('/users/<int:user_id>', methods = ['GET'])
+@api.route('/users/<int:user_id>', methods = ['GET'])
+@query_budget(1)
 def get_users_by_id(user_id):
     try:
+        # Primero buscamos en la cache
+        cached = entity_cache.get(User, user_id)
+        if cached is not None:
+            return jsonify(cached), 200
         user =  db.session.execute(select(User).where(User.id == user_id)).scalar_one_or_none()
         # Validacion
         if user == None:
             return {"message" : f"User ID {user_id} cannot be found"}, 400
         # Respuesta
-        return jsonify(user.serialize()), 200
+        user = user.serialize()
+        # Lo leido de una replica justo tras una escritura puede ser la version ya invalidada
+        if replica_router.cacheable():
+            entity_cache.set(User, user_id, user)
+        return jsonify(user), 200
     except:
         return {"message": f"Error when retrieving information of user {user_id}"}, 400
 
 # GET de CHARACTERS
 
-@app.route('/people', methods= ['GET'])
+@api.route('/people', methods= ['GET'])
+@query_budget(2)
+@rate_limit(cost=2, concurrency=8)
 def get_characters():
+    serializer = SERIALIZERS[Characters]
+    fields = serializer.parse_fields()
+    # Filtros (?name__prefix=, ?age__lt=, ...) y orden (?order=-name) sobre columnas permitidas
+    order = parse_order(Characters)
+    stmt = serializer.select(fields, extra=(order[0],) if order else ()).where(*parse_filters(Characters))
+    # Exportacion completa en streaming (?stream=ndjson|json)
+    stream_mode = get_stream_mode()
+    if stream_mode is not None:
+        return stream_rows(db.session, stmt.order_by(*sort_clause(Characters.id, order)), serializer, fields, stream_mode)
+    limit, after = get_page_args(ordered=order is not None)
     try:
-        all_people =  db.session.execute(select(Characters)).scalars().all()
+        # 304 si el cliente ya tiene esta version de la tabla
+        not_modified, cache_headers = conditional_get(db.session, ["character"])
+        if not_modified:
+            return "", 304, cache_headers
+        # Misma version y misma URL: se reutiliza el cuerpo ya comprimido
+        cached = response_compressor.cached_response(cache_headers["ETag"])
+        if cached is not None:
+            return cached
+        all_people, next_cursor = paginate(db.session, stmt, Characters.id, limit, after, order)
         # Validacion
         if all_people == None:
             return {"message" : "No character can be found"}, 404
         # Respuesta
-        all_people = list(map(lambda x: x.serialize(), all_people))
-        return jsonify(all_people), 200
+        return serializer.response(all_people, fields, 200, {**page_headers(next_cursor, limit), **cache_headers})
     except:
         return {"message":"Error: characters cannot be found"}, 404
 
-@app.route('/people/<int:people_id>', methods = ['GET'])
+@api.route('/people/<int:people_id>', methods = ['GET'])
+@query_budget(1)
 def get_characters_by_id(people_id):
     try:
+        # Primero buscamos en la cache
+        cached = entity_cache.get(Characters, people_id)
+        if cached is not None:
+            return jsonify(cached), 200
         people =  db.session.execute(select(Characters).where(Characters.id == people_id)).scalar_one_or_none()
         # Validacion
         if people == None:
             return {"message" : f"Character ID {people_id} cannot be found"}, 400
         # Respuesta
-        return jsonify(people.serialize()), 200
+        people = people.serialize()
+        if replica_router.cacheable():
+            entity_cache.set(Characters, people_id, people)
+        return jsonify(people), 200
     except:
         return {"message": f"Error when retrieving information of character {people_id}"}, 400
 
 
-# PUT de characters
-@app.route('/people/<int:people_id>', methods = ['PUT'])
-def put_character_by_id(people_id):
+# PUT y PATCH de characters y planets: un UPDATE ... RETURNING
+# Los presupuestos de las escrituras incluyen 3 sentencias de margen (SAVEPOINT, INSERT,
+# RELEASE) para la primera vez que se versiona una tabla o los favoritos de un usuario
+def update_response(model, pk, label):
+    changes, version, error = parse_changes(model, request.get_json(silent = True), partial = request.method == 'PATCH')
+    if error is not None:
+        return {"message": error}, 400
     try:
-        body= request.get_json(silent = True)
-        print(body)
-        people = db.session.execute(select(Characters).where(Characters.id == people_id)).scalar_one_or_none()
-        # Validación de people_id
-        if people == None:
-            return {"message" : f"Character ID {people_id} cannot be found"}, 404  
-        # Validación del body
-        if "name" not in body.keys() or "age" not in body.keys():
-            return {"message" : f"Wrong request"}, 400 
-        # Update de la tabla
-        update_people = db.session.get(Characters, people_id) 
-        update_people.name = body["name"]
-        update_people.age = body["age"]
+        updated = update_entity(db.session, model, pk, changes, version)
+        if updated is None:
+            db.session.rollback()
+            return {"message" : f"{label} ID {pk} cannot be found"}, 404
         db.session.commit()
-        # Retornamos el personaje actualizado
-        people = db.session.execute(select(Characters).where(Characters.id == people_id)).scalar_one_or_none()
-        return people.serialize(),200
-
+        return updated, 200
+    except UpdateConflict as conflict:
+        db.session.rollback()
+        return {"message": f"{label} {pk} was modified by another request", "version": conflict.current_version}, 409
     except Exception as e:
+        db.session.rollback()
         print("Error:", e)
-        return {"message": "Error updating character"}, 500
-    
-# DELETE de characters 
-@app.route('/people/<int:people_id>', methods = ['DELETE'])
+        return {"message": f"Error updating {label.lower()}"}, 500
+
+@api.route('/people/<int:people_id>', methods = ['PUT', 'PATCH'])
+@query_budget(6)
+def put_character_by_id(people_id):
+    return update_response(Characters, people_id, "Character")
+
+# DELETE de characters: un solo DELETE, los favoritos se borran por ON DELETE CASCADE
+@api.route('/people/<int:people_id>', methods = ['DELETE'])
+@query_budget(5)
 def delete_people_by_id(people_id):
     try:
-        #people = db.session.execute(select(Characters).where(Characters.id == people_id)).scalar_one_or_none()
-        character = db.session.get(Characters, people_id)
+        deleted = db.session.execute(delete(Characters).where(Characters.id == people_id)).rowcount
         # Validación de people_id
-        if character == None:
-            return {"message" : f"Character ID {people_id} cannot be found"}, 404   
-        db.session.delete(character)
+        if not deleted:
+            db.session.rollback()
+            return {"message" : f"Character ID {people_id} cannot be found"}, 404
         db.session.commit()
         return {"message": f"Character {people_id} deleted"}
 
     except Exception as e:
+        db.session.rollback()
         print("Error:", e)
         return {"message": "Error deleting character"}, 500
-    
+
+# DELETE masivo: /people?ids=1,2,3
+def bulk_delete_response(model, label):
+    ids, error = parse_ids(request.args.get('ids', ''), current_app.config['MAX_BULK_BATCH_SIZE'])
+    if error is not None:
+        return {"message": error}, 400
+    try:
+        report = bulk_delete(db.session, model, ids, current_app.config['BULK_BATCH_SIZE'])
+        db.session.commit()
+        return report, 200
+    except Exception as e:
+        db.session.rollback()
+        print("Error:", e)
+        return {"message": f"Error deleting {label}"}, 500
+
+@api.route('/people', methods = ['DELETE'])
+@rate_limit(cost=10, concurrency=2)
+def bulk_delete_people():
+    return bulk_delete_response(Characters, "characters")
+
+@api.route('/planets', methods = ['DELETE'])
+@rate_limit(cost=10, concurrency=2)
+def bulk_delete_planets():
+    return bulk_delete_response(Planets, "planets")
+
+# POST bulk de characters y planets
+def bulk_write_response(model, label):
+    body = request.get_json(silent = True)
+    records = body.get("records") if isinstance(body, dict) else body
+    error = validate_records(model, records)
+    if error is not None:
+        return {"message": error}, 400
+    batch_size = request.args.get('batch_size', current_app.config['BULK_BATCH_SIZE'], type=int)
+    if batch_size is None or batch_size < 1:
+        return {"message": "batch_size must be a positive integer"}, 400
+    try:
+        report = bulk_write(db.session, model, records, min(batch_size, current_app.config['MAX_BULK_BATCH_SIZE']))
+        db.session.commit()
+        return report, 200
+    except Exception as e:
+        db.session.rollback()
+        print("Error:", e)
+        return {"message": f"Error writing {label}"}, 500
+
+@api.route('/people/bulk', methods = ['POST'])
+@rate_limit(cost=10, concurrency=2)
+def bulk_people():
+    return bulk_write_response(Characters, "characters")
+
+@api.route('/planets/bulk', methods = ['POST'])
+@rate_limit(cost=10, concurrency=2)
+def bulk_planets():
+    return bulk_write_response(Planets, "planets")
+
 
 # GET de PLANETS
-@app.route('/planets', methods= ['GET'])
+@api.route('/planets', methods= ['GET'])
+@query_budget(2)
+@rate_limit(cost=2, concurrency=8)
 def get_planets():
+    serializer = SERIALIZERS[Planets]
+    fields = serializer.parse_fields()
+    # Filtros (?name__prefix=, ?age__lt=, ...) y orden (?order=-name) sobre columnas permitidas
+    order = parse_order(Planets)
+    stmt = serializer.select(fields, extra=(order[0],) if order else ()).where(*parse_filters(Planets))
+    # Exportacion completa en streaming (?stream=ndjson|json)
+    stream_mode = get_stream_mode()
+    if stream_mode is not None:
+        return stream_rows(db.session, stmt.order_by(*sort_clause(Planets.id, order)), serializer, fields, stream_mode)
+    limit, after = get_page_args(ordered=order is not None)
     try:
-        all_planets =  db.session.execute(select(Planets)).scalars().all()
+        # 304 si el cliente ya tiene esta version de la tabla
+        not_modified, cache_headers = conditional_get(db.session, ["planet"])
+        if not_modified:
+            return "", 304, cache_headers
+        # Misma version y misma URL: se reutiliza el cuerpo ya comprimido
+        cached = response_compressor.cached_response(cache_headers["ETag"])
+        if cached is not None:
+            return cached
+        all_planets, next_cursor = paginate(db.session, stmt, Planets.id, limit, after, order)
         # Validacion
         if all_planets == None:
             return {"message" : "No planet can be found"}, 404
         # Respuesta
-        all_planets = list(map(lambda x: x.serialize(), all_planets))
-        return jsonify(all_planets), 200
+        return serializer.response(all_planets, fields, 200, {**page_headers(next_cursor, limit), **cache_headers})
     except:
         return {"message":"Error: planets cannot be found"}, 404
     
 
-@app.route('/planets/<int:planets_id>', methods = ['GET'])
+@api.route('/planets/<int:planets_id>', methods = ['GET'])
+@query_budget(1)
 def get_planets_by_id(planets_id):
     try:
+        # Primero buscamos en la cache
+        cached = entity_cache.get(Planets, planets_id)
+        if cached is not None:
+            return jsonify(cached), 200
         planet =  db.session.execute(select(Planets).where(Planets.id == planets_id)).scalar_one_or_none()
         # Validacion
         if planet == None:
             return {"message" : f"Planet ID {planets_id} cannot be found"}, 400
         # Respuesta
-        return jsonify(planet.serialize()), 200
+        planet = planet.serialize()
+        if replica_router.cacheable():
+            entity_cache.set(Planets, planets_id, planet)
+        return jsonify(planet), 200
     except:
         return {"message": f"Error when retrieving information of planet {planets_id}"}, 400
     
 
-# PUT de Planets
-@app.route('/planet/<int:planet_id>', methods = ['PUT'])
+# PUT y PATCH de Planets
+@api.route('/planet/<int:planet_id>', methods = ['PUT', 'PATCH'])
+@query_budget(6)
 def put_planet_by_id(planet_id):
-    try:
-        body= request.get_json(silent = True)
-        planet = db.session.execute(select(Planets).where(Planets.id == planet_id)).scalar_one_or_none()
-        # Validación de planet_id
-        if planet == None:
-            return {"message" : f"Planet ID {planet_id} cannot be found"}, 404  
-        # Validación del body
-        if "name" not in body.keys() or "size" not in body.keys() or "gravity" not in body.keys():
-            return {"message" : f"Wrong request"}, 400 
-        # Update de la tabla
-        update_planet = db.session.get(Planets, planet_id) 
-        update_planet.name = body["name"]
-        update_planet.size = body["size"]
-        update_planet.gravity = body["gravity"]
-        db.session.commit()
-        # Retornamos el planeta actualizado
-        planet = db.session.execute(select(Planets).where(Planets.id == planet_id)).scalar_one_or_none()
-        return planet.serialize(),200
+    return update_response(Planets, planet_id, "Planet")
 
-    except Exception as e:
-        print("Error:", e)
-        return {"message": "Error updating planet"}, 500
-    
-# DELETE de planets 
-@app.route('/planet/<int:planet_id>', methods = ['DELETE'])
+# DELETE de planets
+@api.route('/planet/<int:planet_id>', methods = ['DELETE'])
+@query_budget(5)
 def delete_planet_by_id(planet_id):
     try:
-        #people = db.session.execute(select(Characters).where(Characters.id == people_id)).scalar_one_or_none()
-        planet = db.session.get(Planets, planet_id)
-        # Validación de people_id
-        if planet == None:
-            return {"message" : f"Character ID {planet_id} cannot be found"}, 404   
-        db.session.delete(planet)
+        deleted = db.session.execute(delete(Planets).where(Planets.id == planet_id)).rowcount
+        # Validación de planet_id
+        if not deleted:
+            db.session.rollback()
+            return {"message" : f"Planet ID {planet_id} cannot be found"}, 404
         db.session.commit()
         return {"message": f"Planet {planet_id} deleted"}
 
     except Exception as e:
+        db.session.rollback()
         print("Error:", e)
         return {"message": "Error deleting planet"}, 500
 
@@ -211,27 +483,46 @@ def delete_planet_by_id(planet_id):
 
 
 
+# Ranking de los mas favoritos: recorre el indice (favorite_count, id), sin GROUP BY
+def leaderboard_response(model, label):
+    serializer = SERIALIZERS[model]
+    fields = serializer.parse_fields()
+    limit, after = get_page_args(ordered = True)
+    try:
+        stmt, names = leaderboard_statement(model, fields)
+        rows, next_cursor = paginate(db.session, stmt, model.id, limit, after, leaderboard_order(model))
+        return serializer.response(rows, names, 200, page_headers(next_cursor, limit))
+    except Exception as e:
+        print("Error:", e)
+        return {"message": f"Error: {label} leaderboard cannot be found"}, 500
+
+@api.route('/leaderboard/planets', methods = ['GET'])
+@query_budget(1)
+def get_planets_leaderboard():
+    return leaderboard_response(Planets, "planets")
+
+@api.route('/leaderboard/people', methods = ['GET'])
+@query_budget(1)
+def get_people_leaderboard():
+    return leaderboard_response(Characters, "characters")
+
+
 # GET de favourites
-@app.route('/users/<int:id_user>/favorites', methods = ['GET'])
+@api.route('/users/<int:id_user>/favorites', methods = ['GET'])
+@query_budget(2)
+@rate_limit(concurrency=8)
 def get_favorites_by_id(id_user):
     try:
-        # Validar la existencia de usuario
-        user =  db.session.execute(select(User).where(User.id == id_user)).scalar_one_or_none()
-        if user is None:
+        # Los favoritos dependen de la version del usuario y de planetas/personajes
+        not_modified, cache_headers = conditional_get(
+            db.session, [favorites_key(id_user), "favoritos", "planet", "character"])
+        if not_modified:
+            return "", 304, cache_headers
+        # Una sola consulta con columnas sueltas (ver favorites.user_favorites_statement)
+        rows = db.session.execute(user_favorites_statement(id_user)).all()
+        if not rows:
             return {"message":f"User {id_user} cannot be found"}, 404
-        favorite_planets = []
-        favorite_characters = []
-        # Buscar planetas favoritos del usuario y los añadimos al arreglo de planetas favoritos
-        for favorite_planet in user.favourites_planet:
-            if favorite_planet is not None: #TBC, mejor imprimir y ver qué devuelve
-                favorite_planets.append(favorite_planet.serialize())
-
-        # Buscar personajes favoritos del usuario y los añadimos al arreglo de personajes favoritos
-        for favorite_character in user.favourites_character:
-            if favorite_character is not None:
-                favorite_characters.append(favorite_character.serialize())
-
-        return {"User_id":id_user,"favourite_planets": favorite_planets, "favorite_people": favorite_characters }, 200
+        return user_favorites_payload(id_user, rows), 200, cache_headers
     except Exception as e:
         print("Error:", e)
         return {"message": "Error retrieving favorites"}, 500
@@ -239,65 +530,78 @@ def get_favorites_by_id(id_user):
 
 
 
+# PATCH de favorites: anade y borra muchos favoritos en una sola transaccion
+@api.route('/users/<int:id_user>/favorites', methods = ['PATCH'])
+@query_budget(16)
+@rate_limit(cost=5, concurrency=4)
+def patch_favorites_by_id(id_user):
+    try:
+        batch = parse_favorites_batch(request.get_json(silent = True))
+        if batch is None:
+            return {"message": "Wrong request"}, 400
+        if db.session.get(User, id_user) is None:
+            return {"message": f"User {id_user} cannot be found"}, 404
+        results = apply_favorites_batch(db.session, id_user, batch)
+        db.session.commit()
+        return {"User_id": id_user, "results": results}, 200
+    except Exception as e:
+        db.session.rollback()
+        print("Error:", e)
+        return {"message": "Error updating favorites"}, 500
+
+
 # POST de favorites
-@app.route('/favorite/planet/<int:planet_id>', methods= ['POST'])
+@api.route('/favorite/planet/<int:planet_id>', methods= ['POST'])
+@query_budget(6)
 def add_favorite_planet(planet_id):
     try:
         request_body = request.get_json(silent = True)
-        print(request_body["user_id"])
         # validacion de request
         if request_body is None:
             return {"message": "Wrong request"}, 400
-        if "user_id" not in request_body:
+        # type() y no isinstance(): bool es subclase de int y true/false no son ids
+        if type(request_body.get("user_id")) is not int:
             return {"message": "Wrong request"}, 400
-        # Validación de la existencia de User ID
-        user = db.session.execute(select(User).where(User.id == request_body["user_id"])).scalar_one_or_none()
-
-        if user is None:
-            return {"message": "User cannot be found"}, 404
-        # Validación de la existencia de Planeta
-        planet = db.session.execute(select(Planets).where(Planets.id == planet_id)).scalar_one_or_none()
-        if planet is None:
+        user_id = request_body["user_id"]
+        # Un solo INSERT idempotente; las foreign keys validan usuario y planeta
+        try:
+            added = add_favorite(db.session, user_id, planet_id=planet_id)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if db.session.get(User, user_id) is None:
+                return {"message": "User cannot be found"}, 404
             return {"message": "Planet cannot be found"}, 404
-        # Validación de no existencia del favorito (favoritos es tabla, no clase)
-        test_favorite_planet = db.session.execute(select(favoritos).where(and_(favoritos.c.user_id == request_body["user_id"], favoritos.c.planet_id == planet_id))).first()
-        if test_favorite_planet != None:
-            return {"message": f"Planet {planet_id} is already a favorite planet of user {request_body["user_id"]}"}, 400
-        # Agregamos favorito (favoritos es tabla, no clase)
-        #db.session.execute(favoritos.insert().values(user_id=request_body["user_id"], planet_id=planet_id, character_id=None))
-        stmt = favoritos.insert().values(user_id=request_body["user_id"],planet_id=planet_id,character_id=None)
-        db.session.execute(stmt)
-        db.session.commit()
+        if not added:
+            return {"message": f"Planet {planet_id} is already a favorite planet of user {user_id}"}, 200
         return {"message": f"Favourite planet {planet_id} added to favorites of user"}, 200
     except Exception as e:
         print("Error:", e)
         return {"message": f"Error: cannot add planet {planet_id} to user's favorites"}, 500
 
-@app.route('/favorite/people/<int:people_id>', methods= ['POST'])
+@api.route('/favorite/people/<int:people_id>', methods= ['POST'])
+@query_budget(6)
 def add_favorite_people(people_id):
     try:
         request_body = request.get_json(silent = True)
         # validacion de request
         if request_body is None:
             return {"message": "Wrong request"}, 400
-        if "user_id" not in request_body:
+        # type() y no isinstance(): bool es subclase de int y true/false no son ids
+        if type(request_body.get("user_id")) is not int:
             return {"message": "Wrong request"}, 400
-        # Validación de la existencia de User ID
-        user = db.session.execute(select(User).where(User.id == request_body["user_id"])).scalar_one_or_none()
-        if user is None:
-            return {"message": "User cannot be found"}, 404
-        # Validación de la existencia de Personaje
-        people = db.session.execute(select(Characters).where(Characters.id == people_id)).scalar_one_or_none()
-        if people is None:
+        user_id = request_body["user_id"]
+        # Un solo INSERT idempotente; las foreign keys validan usuario y personaje
+        try:
+            added = add_favorite(db.session, user_id, character_id=people_id)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if db.session.get(User, user_id) is None:
+                return {"message": "User cannot be found"}, 404
             return {"message": "Character cannot be found"}, 404
-        # Validación de no existencia del favorito (favoritos es tabla, no clase)
-        test_favorite_people = db.session.execute(select(favoritos).where(and_(favoritos.c.user_id == request_body["user_id"], favoritos.c.character_id == people_id))).first()
-        if test_favorite_people!= None:
-            return {"message": f"Character {people_id} is already a favorite character of user {request_body["user_id"]}"}, 400
-        # Agregamos favorito (favoritos es tabla, no clase)
-        stmt = favoritos.insert().values(user_id=request_body["user_id"],character_id=people_id,planet_id=None)
-        db.session.execute(stmt)
-        db.session.commit()
+        if not added:
+            return {"message": f"Character {people_id} is already a favorite character of user {user_id}"}, 200
         return {"message": f"Favourite character {people_id} added to favorites of user"}, 200
     except Exception as e:
         print("Error:", e)
@@ -305,22 +609,16 @@ def add_favorite_people(people_id):
 
 
 
-@app.route('/favorite/user/<int:user_id>/planet/<int:planet_id>', methods=['DELETE'])
+@api.route('/favorite/user/<int:user_id>/planet/<int:planet_id>', methods=['DELETE'])
+@query_budget(6)
 def delete_favorite_planet(user_id, planet_id):
     try:
-        # Buscar el registro favorito
-        result = db.session.execute(select(favoritos).where(and_(favoritos.c.user_id == user_id,favoritos.c.planet_id == planet_id))).first()
-
-        if result is None:
+        # Borrar el favorito con un solo DELETE; si no borra nada es que no existia
+        if not remove_favorite(db.session, user_id, planet_id=planet_id):
+            db.session.rollback()
             return {
                 "message": f"Planet {planet_id} is not a favorite planet of user {user_id}"
             }, 404
-
-        favorite_id = result.id
-
-        # Borrar el favorito
-        stmt = delete(favoritos).where(favoritos.c.id == favorite_id)
-        db.session.execute(stmt)
         db.session.commit()
 
         return {"message": f"Planet {planet_id} removed from favorites of user {user_id}"}, 200
@@ -329,22 +627,16 @@ def delete_favorite_planet(user_id, planet_id):
         print("Error:", e)
         return {"message": f"Error: cannot delete {planet_id} from user's favorites"}, 500
     
-@app.route('/favorite/user/<int:user_id>/people/<int:people_id>', methods= ['DELETE'])
+@api.route('/favorite/user/<int:user_id>/people/<int:people_id>', methods= ['DELETE'])
+@query_budget(6)
 def delete_favorite_people(user_id, people_id):
     try:
-        # Buscar el registro favorito
-        result = db.session.execute(select(favoritos).where(and_(favoritos.c.user_id == user_id,favoritos.c.character_id == people_id))).first()
-
-        if result is None:
+        # Borrar el favorito con un solo DELETE; si no borra nada es que no existia
+        if not remove_favorite(db.session, user_id, character_id=people_id):
+            db.session.rollback()
             return {
                 "message": f"Character {people_id} is not a favorite planet of user {user_id}"
             }, 404
-
-        favorite_id = result.id
-
-        # Borrar el favorito
-        stmt = delete(favoritos).where(favoritos.c.id == favorite_id)
-        db.session.execute(stmt)
         db.session.commit()
 
         return {"message": f"Character {people_id} removed from favorites of user {user_id}"}, 200
@@ -354,7 +646,17 @@ def delete_favorite_people(user_id, people_id):
         return {"message": f"Error: cannot delete {people_id} from user's favorites"}, 500
 
 
+# Reparacion periodica de los contadores de favoritos (cron): flask reconcile-favorites
+@api.cli.command('reconcile-favorites')
+@click.option('--batch-size', default = 10000, show_default = True, help = "Rows recounted per transaction.")
+def reconcile_favorites_command(batch_size):
+    """Recount favorite_count on planets and characters and repair drift."""
+    repaired = reconcile_favorite_counts(db.session, batch_size)
+    for table, count in repaired.items():
+        click.echo(f"{table}: {count} counters repaired")
+
+
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
-    app.run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+ASGI entry point, an alternative to wsgi.py:
+
+    gunicorn asgi:application -k uvicorn_worker.UvicornWorker --chdir ./src/
+
+The read endpoints that carry most of the traffic (GET /users, /people,
+/planets, their /<id> detail routes and /users/<id>/favorites) are served
+here with an AsyncSession on an async driver (aiosqlite for SQLite, asyncpg
+for PostgreSQL), so a worker keeps serving other requests while it waits on
+the database. Every other route - writes, /admin, /search, streaming
+exports - is handed to the Flask app through asgiref's WSGI adapter, which
+runs it in a thread. Both paths share the models, serializers, pagination,
+filters, ETags, entity cache and read-replica routing, so responses are the
+same as with wsgi.py.
+
+uvicorn-worker, asgiref, aiosqlite and asyncpg are in the Pipfile.
+"""
+import io
+import re
+import sys
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from wsgi import application as app
+from cache import entity_cache
+from compression import response_compressor
+from database import apply_sqlite_pragmas, engine_options
+from favorites import user_favorites_payload, user_favorites_statement
+from filtering import FILTERS, parse_filters, parse_order
+from models import User, Planets, Characters
+from replicas import current_replica, replica_router
+from pagination import get_page_args, page_headers, page_statement, split_page
+from serializers import SERIALIZERS, encode_json
+from streaming import get_stream_mode
+from utils import APIException
+from versioning import check_versions, favorites_key, versions_statement
+
+# Motor de la URL sincrona -> driver async equivalente
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_database_url(uri):
+    """Return (url, connect_args) for the async driver matching `uri`."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver configured for {backend} databases")
+    connect_args = {}
+    # asyncpg no entiende ?sslmode= (libpq); se pasa como argumento ssl
+    if backend == "postgresql" and "sslmode" in url.query:
+        connect_args["ssl"] = url.query["sslmode"]
+        url = url.difference_update_query(["sslmode"])
+    return url.set(drivername=ASYNC_DRIVERS[backend]), connect_args
+
+
+def _create_engine(uri):
+    url, connect_args = async_database_url(uri)
+    options = engine_options(uri, is_async=True)
+    options["connect_args"] = {**options.get("connect_args", {}), **connect_args}
+    engine = create_async_engine(url, **options)
+    if url.get_backend_name() == "sqlite":
+        # Mismos PRAGMA que las conexiones sqlite3 del motor sincrono
+        event.listen(engine.sync_engine, "connect", lambda dbapi_connection, record: apply_sqlite_pragmas(dbapi_connection))
+    return engine
+
+
+engine = _create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+AsyncSession = async_sessionmaker(engine, expire_on_commit=False)
+# Motores async de las replicas, creados con la primera lectura de cada una
+replica_engines = {}
+flask_application = WsgiToAsgi(app)
+
+
+def read_session():
+    """AsyncSession on the replica chosen for this request, or on the primary."""
+    replica = current_replica()
+    if replica is None:
+        return AsyncSession()
+    if replica.url not in replica_engines:
+        replica_engine = _create_engine(replica.url)
+        replica_router.track_errors(replica, replica_engine.sync_engine)
+        replica_engines.setdefault(replica.url, replica_engine)
+    return AsyncSession(bind=replica_engines[replica.url])
+
+
+class Fallback(Exception):
+    """Raised before a native handler runs to pass the request on to the Flask app."""
+
+
+def _json(status, payload, headers=None):
+    return status, {"Content-Type": "application/json", **(headers or {})}, encode_json(payload)
+
+
+async def list_rows(model, version_name, label):
+    serializer = SERIALIZERS[model]
+    fields = serializer.parse_fields()
+    order = None
+    stmt = serializer.select(fields)
+    if model in FILTERS:
+        order = parse_order(model)
+        stmt = serializer.select(fields, extra=(order[0],) if order else ()).where(*parse_filters(model))
+    limit, after = get_page_args(ordered=order is not None)
+    try:
+        async with read_session() as session:
+            versions = (await session.execute(versions_statement([version_name]))).all()
+            not_modified, cache_headers = check_versions(versions, [version_name])
+            if not_modified:
+                return 304, cache_headers, b""
+            cached = response_compressor.cached_response(cache_headers["ETag"])
+            if cached is not None:
+                return cached.status_code, cached.headers, cached.get_data()
+            rows = (await session.execute(page_statement(stmt, model.id, limit, after, order))).all()
+        rows, next_cursor = split_page(rows, limit, order)
+        return _json(200, serializer.to_dicts(rows, fields), {**page_headers(next_cursor, limit), **cache_headers})
+    except Exception as e:
+        print("Error:", e)
+        return _json(404, {"message": f"Error: {label}s cannot be found"})
+
+
+async def get_entity(model, label, pk):
+    try:
+        # Primero buscamos en la cache
+        payload = entity_cache.get(model, pk)
+        if payload is None:
+            async with read_session() as session:
+                obj = await session.get(model, pk)
+            if obj is None:
+                return _json(400, {"message": f"{label.capitalize()} ID {pk} cannot be found"})
+            payload = obj.serialize()
+            if replica_router.cacheable():
+                entity_cache.set(model, pk, payload)
+        # Mismo encoder que jsonify (fechas en formato HTTP)
+        return 200, {"Content-Type": "application/json"}, app.json.dumps(payload).encode()
+    except Exception as e:
+        print("Error:", e)
+        return _json(400, {"message": f"Error when retrieving information of {label} {pk}"})
+
+
+async def get_favorites(user_id):
+    names = [favorites_key(user_id), "favoritos", "planet", "character"]
+    try:
+        async with read_session() as session:
+            versions = (await session.execute(versions_statement(names))).all()
+            not_modified, cache_headers = check_versions(versions, names)
+            if not_modified:
+                return 304, cache_headers, b""
+            rows = (await session.execute(user_favorites_statement(user_id))).all()
+        if not rows:
+            return _json(404, {"message": f"User {user_id} cannot be found"})
+        return _json(200, user_favorites_payload(user_id, rows), cache_headers)
+    except Exception as e:
+        print("Error:", e)
+        return _json(500, {"message": "Error retrieving favorites"})
+
+
+# Rutas GET servidas con AsyncSession; el resto va a Flask.
+# Tercer campo: el listado tiene exportacion en streaming (?stream=), que sirve Flask
+ROUTES = [
+    (re.compile(r"/users/?"), lambda: list_rows(User, "user", "user"), True),
+    (re.compile(r"/people/?"), lambda: list_rows(Characters, "character", "character"), True),
+    (re.compile(r"/planets/?"), lambda: list_rows(Planets, "planet", "planet"), True),
+    (re.compile(r"/users/(\d+)/?"), lambda pk: get_entity(User, "user", int(pk)), False),
+    (re.compile(r"/people/(\d+)/?"), lambda pk: get_entity(Characters, "character", int(pk)), False),
+    (re.compile(r"/planets/(\d+)/?"), lambda pk: get_entity(Planets, "planet", int(pk)), False),
+    (re.compile(r"/users/(\d+)/favorites/?"), lambda pk: get_favorites(int(pk)), False),
+]
+
+
+def _match(path):
+    for pattern, handler, streams in ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            return handler, match.groups(), streams
+    return None, (), False
+
+
+def _environ(scope):
+    # Entorno WSGI minimo para usar request/current_app de Flask en los handlers
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "REMOTE_ADDR": client[0],
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+    }
+    for name, value in scope["headers"]:
+        key = "HTTP_" + name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        # Cabeceras repetidas se unen con comas, como en WSGI
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await engine.dispose()
+            for replica_engine in replica_engines.values():
+                await replica_engine.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _respond(handler, args):
+    # before/after_request de Flask (CORS, etc.) tambien se aplican a las rutas async
+    rv = app.preprocess_request()
+    if rv is not None:
+        return app.make_response(rv)
+    try:
+        status, headers, body = await handler(*args)
+    except APIException as error:
+        status, headers, body = _json(error.status_code, error.to_dict())
+    return app.process_response(app.response_class(body, status, headers))
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    handler, args, streams = _match(scope["path"]) if scope["type"] == "http" and scope["method"] == "GET" else (None, (), False)
+    if handler is None:
+        return await flask_application(scope, receive, send)
+    try:
+        with app.request_context(_environ(scope)):
+            # Antes de los before_request: Flask los volvera a ejecutar
+            if streams and get_stream_mode() is not None:
+                raise Fallback()
+            response = await _respond(handler, args)
+    except Fallback:
+        return await flask_application(scope, receive, send)
+    await send({
+        "type": "http.response.start",
+        "status": response.status_code,
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()],
+    })
+    await send({"type": "http.response.body", "body": response.get_data()})
@@ -0,0 +1,124 @@
+"""
+Bulk create/update/delete of catalog entities (Characters, Planets).
+
+Records without "id" are inserted and records with "id" update that row.
+Each batch is written with one executemany INSERT (`insert(Model)`) and one
+ORM bulk UPDATE by primary key (`update(Model)` with a list of parameters).
+Deletes are one DELETE ... WHERE id IN (...) per batch; the favoritos rows
+go with them through ON DELETE CASCADE.
+"""
+import time
+from sqlalchemy import delete, insert, select, update
+from models import Characters, Planets
+
+# Columnas que se pueden escribir por modelo y su tipo
+BULK_FIELDS = {
+    Characters: {"name": str, "age": int},
+    Planets: {"name": str, "size": int, "gravity": bool},
+}
+
+
+def valid_value(value, expected):
+    # bool es subclase de int: no aceptamos True/False como numero
+    if expected is int:
+        return type(value) is int
+    if expected is str:
+        return isinstance(value, str) and 0 < len(value) <= 60
+    return isinstance(value, expected)
+
+
+def validate_records(model, records):
+    """Return an error message for the first invalid record, or None."""
+    fields = BULK_FIELDS[model]
+    if not isinstance(records, list) or not records:
+        return "records must be a non empty list"
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            return f"Record {index} must be an object"
+        unknown = set(record) - set(fields) - {"id"}
+        if unknown:
+            return f"Record {index} has unknown fields: {', '.join(sorted(unknown))}"
+        if "id" in record:
+            if type(record["id"]) is not int:
+                return f"Record {index} has an invalid id"
+            if len(record) == 1:
+                return f"Record {index} has nothing to update"
+        elif set(fields) - set(record):
+            return f"Record {index} is missing fields: {', '.join(sorted(set(fields) - set(record)))}"
+        for name, expected in fields.items():
+            if name in record and not valid_value(record[name], expected):
+                return f"Record {index} has an invalid {name}"
+    return None
+
+
+def bulk_write(session, model, records, batch_size):
+    """
+    Write `records` in batches of `batch_size` inside the current transaction
+    and return a report with counts, throughput and per-batch timings.
+    Updates whose id does not exist are skipped and listed in "missing_ids".
+    """
+    report = {"inserted": 0, "updated": 0, "missing_ids": [], "batches": []}
+    start = time.perf_counter()
+    for offset in range(0, len(records), batch_size):
+        batch_start = time.perf_counter()
+        batch = records[offset:offset + batch_size]
+        to_insert = [record for record in batch if "id" not in record]
+        to_update = [record for record in batch if "id" in record]
+
+        if to_update:
+            ids = [record["id"] for record in to_update]
+            existing = dict(session.execute(select(model.id, model.version).where(model.id.in_(ids))).all())
+            report["missing_ids"] += [record_id for record_id in ids if record_id not in existing]
+            # Cada fila actualizada cambia de version, como en PUT/PATCH
+            to_update = [{**record, "version": existing[record["id"]] + 1} for record in to_update if record["id"] in existing]
+        if to_insert:
+            session.execute(insert(model), to_insert)
+        if to_update:
+            session.execute(update(model), to_update)
+
+        report["inserted"] += len(to_insert)
+        report["updated"] += len(to_update)
+        report["batches"].append({
+            "rows": len(batch),
+            "inserted": len(to_insert),
+            "updated": len(to_update),
+            "elapsed_ms": round((time.perf_counter() - batch_start) * 1000, 3),
+        })
+    elapsed = time.perf_counter() - start
+    report["elapsed_ms"] = round(elapsed * 1000, 3)
+    report["rows_per_second"] = round(len(records) / elapsed) if elapsed > 0 else None
+    return report
+
+
+def parse_ids(raw, max_ids):
+    """Parse "?ids=1,2,3" into a list of distinct ids; return (ids, error message)."""
+    if not raw:
+        return None, "ids is required, e.g. ?ids=1,2,3"
+    try:
+        ids = list(dict.fromkeys(int(value) for value in raw.split(",")))
+    except ValueError:
+        return None, "ids must be a comma separated list of integers"
+    if len(ids) > max_ids:
+        return None, f"At most {max_ids} ids can be deleted at once"
+    return ids, None
+
+
+def bulk_delete(session, model, ids, batch_size):
+    """
+    Delete the rows with the given ids inside the current transaction and
+    return {"deleted": n, "missing_ids": [...]}. Uses DELETE ... RETURNING
+    where the database supports it, otherwise one SELECT per batch.
+    """
+    report = {"deleted": 0, "missing_ids": []}
+    returning = session.get_bind().dialect.delete_returning
+    for offset in range(0, len(ids), batch_size):
+        batch = ids[offset:offset + batch_size]
+        stmt = delete(model).where(model.id.in_(batch))
+        if returning:
+            deleted = set(session.execute(stmt.returning(model.id)).scalars())
+        else:
+            deleted = set(session.execute(select(model.id).where(model.id.in_(batch))).scalars())
+            session.execute(stmt)
+        report["deleted"] += len(deleted)
+        report["missing_ids"] += [pk for pk in batch if pk not in deleted]
+    return report
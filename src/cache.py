@@ -0,0 +1,409 @@
+"""
+Read-through cache for the serialized entities returned by the detail GETs.
+
+Entries are keyed by table name and primary key ("planet:3") and hold the
+dict returned by `serialize()`. Invalidation is driven by SQLAlchemy session
+events, so any commit that touches a cached row - from the API handlers or
+from Flask-Admin - drops the affected entries once the transaction commits.
+
+The backend is chosen with CACHE_BACKEND:
+    memory  per-process LRU (default)
+    shared  SQLite file on /dev/shm shared by every gunicorn worker of the host
+    redis   any Redis-protocol server at CACHE_REDIS_URL (needs `pip install redis`)
+    null    caching disabled
+With `shared` and `redis` there is a single store for all workers, so an
+invalidation done by one worker is seen by the others immediately.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCache:
+    """Per-process LRU cache with a TTL per entry."""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class NullCache:
+    """Backend used when caching is disabled; every lookup is a miss."""
+
+    def __init__(self):
+        self.misses = 0
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, keys):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def stats(self):
+        return {"backend": "null", "hits": 0, "misses": self.misses}
+
+
+class SharedFileCache:
+    """
+    Cache shared by the processes of one host, stored in a SQLite file that by
+    default lives on tmpfs (/dev/shm) and is read through mmap. Entries closest
+    to expiry are evicted first when the cache grows over `max_entries`.
+    """
+
+    EVICT_EVERY = 100
+
+    def __init__(self, path, max_entries, ttl, dumps, loads):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.dumps = dumps
+        self.loads = loads
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires)")
+
+    def _connection(self):
+        # Una conexion por hilo y por proceso: tras el fork de gunicorn se abre otra
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("PRAGMA mmap_size=67108864")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error:
+            self.errors += 1
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.loads(row[0])
+
+    def set(self, key, value):
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, expires, value) VALUES (?, ?, ?)",
+                (key, time.time() + self.ttl, self.dumps(value)),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(connection)
+        except sqlite3.Error:
+            self.errors += 1
+
+    def _evict(self, connection):
+        connection.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        excess = connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires LIMIT ?)", (excess,)
+            )
+
+    # Se borra dentro de after_commit: un fallo no puede convertir en 500 una escritura ya confirmada
+    def delete(self, keys):
+        try:
+            self._connection().executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in keys])
+        except sqlite3.Error as e:
+            self.errors += 1
+            _log_stale(keys, self.ttl, e)
+
+    def delete_prefix(self, prefix):
+        try:
+            # Rango sobre la clave primaria: 'planet:' <= key < 'planet;'
+            self._connection().execute(
+                "DELETE FROM cache WHERE key >= ? AND key < ?", (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+            )
+        except sqlite3.Error as e:
+            self.errors += 1
+            _log_stale([prefix + "*"], self.ttl, e)
+
+    def stats(self):
+        return {
+            "backend": "shared",
+            "path": self.path,
+            "entries": self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0],
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            # Los contadores son de este worker
+            "pid": os.getpid(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+class RedisCache:
+    """
+    Cache stored in a Redis-protocol server. Size is bounded by the server's
+    `maxmemory` + `allkeys-lru` policy; entries expire after `ttl` seconds.
+    Any client with the redis-py interface can be passed (e.g. fakeredis).
+    """
+
+    def __init__(self, client, ttl, dumps, loads, namespace="starwars:"):
+        self.client = client
+        self.ttl = ttl
+        self.dumps = dumps
+        self.loads = loads
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key):
+        # Si Redis no responde se trata como un fallo de cache, no como un error 500
+        try:
+            raw = self.client.get(self.namespace + key)
+        except redis.RedisError:
+            self.errors += 1
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.namespace + key, self.dumps(value), ex=self.ttl)
+        except redis.RedisError:
+            self.errors += 1
+
+    def delete(self, keys):
+        try:
+            self.client.delete(*[self.namespace + key for key in keys])
+        except redis.RedisError as e:
+            self.errors += 1
+            _log_stale(keys, self.ttl, e)
+
+    def delete_prefix(self, prefix):
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for key in self.client.scan_iter(match=self.namespace + prefix + "*", count=500):
+                pipeline.delete(key)
+            pipeline.execute()
+        except redis.RedisError as e:
+            self.errors += 1
+            _log_stale([prefix + "*"], self.ttl, e)
+
+    def stats(self):
+        return {
+            "backend": "redis",
+            "ttl": self.ttl,
+            "pid": os.getpid(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+def _log_stale(keys, ttl, error):
+    # La escritura ya esta confirmada: como mucho se sirve la version anterior hasta que caduque
+    logger.warning("Cache invalidation failed (%s); %s may be stale for up to %ss",
+                   error, ", ".join(sorted(keys)[:10]), ttl)
+
+
+def _memory_backend(app):
+    return MemoryCache(max_entries=app.config['CACHE_MAX_ENTRIES'], ttl=app.config['CACHE_TTL'])
+
+
+def _shared_backend(app):
+    return SharedFileCache(app.config['CACHE_SHARED_PATH'], app.config['CACHE_MAX_ENTRIES'],
+                           app.config['CACHE_TTL'], app.json.dumps, app.json.loads)
+
+
+def _redis_backend(app):
+    if redis is None:
+        raise RuntimeError("CACHE_BACKEND=redis needs the redis package: pip install redis")
+    client = redis.Redis.from_url(app.config['CACHE_REDIS_URL'], socket_timeout=0.5)
+    return RedisCache(client, app.config['CACHE_TTL'], app.json.dumps, app.json.loads)
+
+
+def _null_backend(app):
+    return NullCache()
+
+
+CACHE_BACKENDS = {
+    "memory": _memory_backend,
+    "shared": _shared_backend,
+    "redis": _redis_backend,
+    "null": _null_backend,
+}
+
+
+class EntityCache:
+    """Caches serialized model instances and invalidates them on commit."""
+
+    def __init__(self):
+        self.backend = NullCache()
+        self.tables = set()
+
+    def init_app(self, app, models):
+        self.backend = CACHE_BACKENDS[app.config['CACHE_BACKEND']](app)
+        self.tables = {model.__tablename__ for model in models}
+        app.extensions['entity_cache'] = self
+
+    def get(self, model, pk):
+        return self.backend.get(f"{model.__tablename__}:{pk}")
+
+    def set(self, model, pk, value):
+        self.backend.set(f"{model.__tablename__}:{pk}", value)
+
+    def invalidate(self, keys=(), tables=()):
+        if keys:
+            self.backend.delete(list(keys))
+        for table in tables:
+            self.backend.delete_prefix(f"{table}:")
+
+    def stats(self):
+        return self.backend.stats()
+
+
+entity_cache = EntityCache()
+
+
+def _pending(session):
+    return session.info.setdefault('cache_invalidate', {"keys": set(), "tables": set()})
+
+
+# Las filas modificadas por el ORM (handlers y Flask-Admin) se apuntan en el flush...
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table in entity_cache.tables:
+            _pending(session)["keys"].add(f"{table}:{obj.id}")
+
+
+def _where_ids(statement):
+    # Ids de un WHERE id = :id / id IN (...) (solo o unido con AND), o None si no se sabe
+    whereclause = statement.whereclause
+    if whereclause is None:
+        return None
+    id_column = statement.table.c.id
+    terms = whereclause.clauses if isinstance(whereclause, BooleanClauseList) and whereclause.operator is operators.and_ else [whereclause]
+    for term in terms:
+        # compare() y no `is`: las sentencias del ORM llevan copias anotadas de la columna
+        if isinstance(term, BinaryExpression) and term.left.compare(id_column) and isinstance(term.right, BindParameter):
+            if term.operator is operators.eq:
+                return {term.right.value}
+            if term.operator is operators.in_op:
+                return set(term.right.value)
+    return None
+
+
+# ...y los UPDATE/DELETE masivos al ejecutarse
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_statements(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = orm_execute_state.statement.table.name
+    if table not in entity_cache.tables:
+        return
+    parameters = orm_execute_state.parameters
+    if isinstance(parameters, list) and all("id" in row for row in parameters):
+        # UPDATE masivo por clave primaria: solo esas filas
+        _pending(orm_execute_state.session)["keys"].update(f"{table}:{row['id']}" for row in parameters)
+    elif (ids := _where_ids(orm_execute_state.statement)) is not None:
+        # DELETE/UPDATE ... WHERE id = ? o id IN (...): solo esas filas
+        _pending(orm_execute_state.session)["keys"].update(f"{table}:{pk}" for pk in ids)
+    else:
+        _pending(orm_execute_state.session)["tables"].add(table)
+
+
+# Se invalida solo cuando el commit ha terminado
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    pending = session.info.pop('cache_invalidate', None)
+    if pending is not None:
+        entity_cache.invalidate(pending["keys"], pending["tables"])
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session, previous_transaction):
+    # Solo al deshacer la transaccion exterior, no un savepoint
+    if previous_transaction.parent is None:
+        session.info.pop('cache_invalidate', None)
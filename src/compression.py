@@ -0,0 +1,237 @@
+"""
+Negotiated compression of response bodies.
+
+An after_request stage compresses text-like responses (JSON, NDJSON, HTML,
+CSS, JS) with the best encoding the client accepts, in this order:
+    zstd  needs `pip install zstandard`
+    br    needs `pip install brotli`
+    gzip  always available
+Buffered bodies smaller than COMPRESSION_MIN_SIZE are sent as they are: the
+headers and the CPU would cost more than the bytes saved. Streaming exports
+are compressed chunk by chunk, flushing after each batch, so they keep
+streaming. The level of each encoding is configurable.
+
+List responses carry the ETag built by versioning.py, which changes with the
+table version and the query string. Their compressed bodies are kept in a
+per-process LRU keyed by (host, ETag, encoding), bounded by
+COMPRESSION_CACHE_BYTES. The list handlers look it up right after the
+version check, so polling a list that has not changed is one version lookup
+and a dict lookup: no page query, no serialization, no compression.
+
+Compressed responses get a weak ETag (W/"..."), as nginx does: the bytes
+differ per encoding, and If-None-Match already uses the weak comparison.
+"""
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+from flask import current_app, request
+from werkzeug.http import unquote_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/x-ndjson", "application/javascript",
+    "text/html", "text/css", "text/plain", "text/javascript",
+}
+
+# Cabeceras que no se guardan con el cuerpo comprimido: se recalculan en cada respuesta
+_SKIPPED_HEADERS = {"content-length", "content-encoding", "vary", "etag"}
+
+
+def _gzip(data, level):
+    # mtime=0: la misma entrada produce los mismos bytes
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _brotli_stream(chunks, level):
+    compressor = brotli.Compressor(quality=level)
+    for chunk in chunks:
+        yield compressor.process(chunk) + compressor.flush()
+    yield compressor.finish()
+
+
+def _zstd(data, level):
+    # ZstdCompressor no se puede compartir entre hilos: uno por llamada
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _zstd_stream(chunks, level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    yield compressor.flush()
+
+
+def available_encodings():
+    """Encodings this process can produce, in order of preference."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+CODECS = {
+    "gzip": (_gzip, _gzip_stream),
+    "br": (_brotli, _brotli_stream),
+    "zstd": (_zstd, _zstd_stream),
+}
+
+
+class ResponseCompressor:
+
+    def __init__(self):
+        self.min_size = 1024
+        self.levels = {"gzip": 6, "br": 5, "zstd": 3}
+        self.encodings = available_encodings()
+        self.max_bytes = 0
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def init_app(self, app):
+        """
+        Register the after_request stage. Call it after the other extensions
+        so it runs first and they see (and measure) the compressed body.
+        """
+        self.min_size = app.config['COMPRESSION_MIN_SIZE']
+        self.levels = {
+            "gzip": app.config['COMPRESSION_GZIP_LEVEL'],
+            "br": app.config['COMPRESSION_BROTLI_LEVEL'],
+            "zstd": app.config['COMPRESSION_ZSTD_LEVEL'],
+        }
+        self.max_bytes = app.config['COMPRESSION_CACHE_BYTES']
+        app.after_request(self.compress_response)
+        app.extensions['response_compressor'] = self
+
+    def negotiate(self):
+        """Best encoding accepted by the client, or None for identity."""
+        return request.accept_encodings.best_match(self.encodings)
+
+    def _cache_key(self, etag, encoding):
+        # El host va en la clave porque la cabecera Link lleva la URL absoluta
+        return request.host, etag, encoding
+
+    def cached_response(self, etag):
+        """
+        Compressed copy of the response whose ETag header is `etag`, in the
+        client's encoding, or None. Call it once the ETag is known, before
+        building the page.
+        """
+        encoding = self.negotiate()
+        if encoding is None or self.max_bytes <= 0:
+            return None
+        etag = unquote_etag(etag)[0]
+        key = self._cache_key(etag, encoding)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+        body, headers = entry
+        response = current_app.response_class(body, 200, headers)
+        response.vary.add("Accept-Encoding")
+        self._mark(response, encoding, etag)
+        return response
+
+    def _store(self, key, body, headers):
+        size = len(body)
+        # Una respuesta que no cabe no desaloja todo lo demas
+        if size > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cached_bytes -= len(previous[0])
+            self._cache[key] = (body, headers)
+            self._cached_bytes += size
+            while self._cached_bytes > self.max_bytes:
+                _, (evicted, _) = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def _mark(self, response, encoding, etag):
+        response.headers["Content-Encoding"] = encoding
+        if etag is not None:
+            response.headers["ETag"] = f'W/"{etag}"'
+
+    def compress_response(self, response):
+        """The after_request stage; also registered on the admin app."""
+        if (response.mimetype not in COMPRESSIBLE_TYPES or response.status_code in (204, 206, 304)
+                or response.status_code < 200 or "Content-Encoding" in response.headers
+                or response.direct_passthrough):
+            return response
+        if not response.is_streamed and (response.content_length or 0) < self.min_size:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+        compress, compress_stream = CODECS[encoding]
+        level = self.levels[encoding]
+        etag, weak = response.get_etag()
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, level)
+            self._mark(response, encoding, None if weak else etag)
+            return response
+
+        data = response.get_data()
+        body = compress(data, level)
+        if len(body) >= len(data):
+            return response
+        with self._lock:
+            self.bytes_in += len(data)
+            self.bytes_out += len(body)
+        # Solo las respuestas con ETag fuerte (las listas) se pueden reutilizar
+        if etag is not None and not weak and response.status_code == 200 and self.max_bytes > 0:
+            headers = [(name, value) for name, value in response.headers.items()
+                       if name.lower() not in _SKIPPED_HEADERS]
+            self._store(self._cache_key(etag, encoding), body, headers)
+        response.set_data(body)
+        self._mark(response, encoding, None if weak else etag)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                "encodings": self.encodings,
+                "min_size": self.min_size,
+                "entries": len(self._cache),
+                "bytes": self._cached_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+
+
+response_compressor = ResponseCompressor()
@@ -0,0 +1,138 @@
+"""
+Engine and connection-pool configuration.
+
+Pool settings come from the environment (DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING) and are passed to
+Flask-SQLAlchemy through SQLALCHEMY_ENGINE_OPTIONS. SQLite connections get
+WAL mode, synchronous=NORMAL and foreign keys; an in-memory SQLite database
+(used by tests) shares one connection through StaticPool.
+
+The pool records how long requests wait for a connection and how close it
+is to saturation; see `pool_stats()`.
+"""
+import os
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+
+class PoolMetrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.checkouts += not timed_out
+            self.timeouts += timed_out
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+pool_metrics = PoolMetrics()
+
+
+class _MeteredPool:
+    """Pool mixin that measures the time spent waiting for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeout:
+            pool_metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+class MeteredQueuePool(_MeteredPool, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_memory_sqlite(uri):
+    return uri in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in uri
+
+
+def engine_options(uri, is_async=False):
+    """Build SQLALCHEMY_ENGINE_OPTIONS (or create_async_engine kwargs) for `uri` from the environment."""
+    if _is_memory_sqlite(uri):
+        # Una sola conexion compartida: la base de datos en memoria vive en ella
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    return {
+        "poolclass": MeteredAsyncQueuePool if is_async else MeteredQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    # SQLite no comprueba las foreign keys salvo que se active en cada conexion
+    cursor.execute("PRAGMA foreign_keys=ON")
+    # WAL: los lectores no bloquean al escritor (no aplica a bases en memoria)
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+# Ajustes de cada conexion SQLite nueva (las de aiosqlite se configuran en asgi.py)
+@event.listens_for(Engine, "connect")
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
+
+
+def pool_stats(engine):
+    """Current pool usage plus the accumulated checkout wait metrics."""
+    pool = engine.pool
+    stats = {
+        "pool": type(pool).__name__,
+        "checkouts": pool_metrics.checkouts,
+        "timeouts": pool_metrics.timeouts,
+        "wait_seconds_total": round(pool_metrics.wait_seconds_total, 6),
+        "wait_seconds_max": round(pool_metrics.wait_seconds_max, 6),
+    }
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + pool._max_overflow
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": round(pool.checkedout() / capacity, 4) if capacity > 0 else None,
+        })
+    return stats
+
+
+def pool_gauges(engine):
+    """`pool_stats` as Prometheus metrics: name -> (help, value, type)."""
+    stats = pool_stats(engine)
+    gauges = {
+        "db_pool_checkouts_total": ("Connections handed out by the pool.", stats["checkouts"], "counter"),
+        "db_pool_timeouts_total": ("Checkouts that timed out waiting for a connection.", stats["timeouts"], "counter"),
+        "db_pool_wait_seconds_total": ("Time spent waiting for a pool connection.", stats["wait_seconds_total"], "counter"),
+        "db_pool_wait_seconds_max": ("Longest wait for a pool connection.", stats["wait_seconds_max"], "gauge"),
+    }
+    if "checked_out" in stats:
+        gauges["db_pool_checked_out"] = ("Connections currently in use.", stats["checked_out"], "gauge")
+        gauges["db_pool_size"] = ("Configured pool size plus max overflow.", stats["size"] + stats["max_overflow"], "gauge")
+        if stats["saturation"] is not None:
+            gauges["db_pool_saturation"] = ("Connections in use / pool capacity.", stats["saturation"], "gauge")
+    return gauges
@@ -0,0 +1,200 @@
+"""
+Read and write paths for the favoritos association table.
+
+Adding a favorite is a single INSERT that ignores duplicates through the
+unique (user_id, planet_id) / (user_id, character_id) indexes, and relies on
+the foreign keys to reject unknown users, planets or characters. Batches of
+adds/removes are applied with set-based statements in one transaction.
+
+Every path that adds or removes favorites also moves the favorite_count of
+the planet or character in the same transaction (see leaderboard.py).
+"""
+from sqlalchemy import and_, delete, exists, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import Characters, Planets, User, favoritos
+
+# Tipo de favorito en el body -> (modelo, columna de favoritos)
+FAVORITE_TARGETS = {
+    "planets": (Planets, "planet_id"),
+    "people": (Characters, "character_id"),
+}
+
+
+def user_favorites_statement(user_id):
+    """
+    One query for a user's favorites: user LEFT JOIN favoritos LEFT JOIN
+    planet/character, as plain columns. If the user exists there is always
+    at least one row (with NULL favorites); no rows means no such user.
+    """
+    return (
+        select(favoritos.c.planet_id, Planets.name, Planets.size, Planets.gravity, Planets.version,
+               favoritos.c.character_id, Characters.name, Characters.age, Characters.version)
+        .select_from(User)
+        .outerjoin(favoritos, favoritos.c.user_id == User.id)
+        .outerjoin(Planets, Planets.id == favoritos.c.planet_id)
+        .outerjoin(Characters, Characters.id == favoritos.c.character_id)
+        .where(User.id == user_id)
+        .order_by(favoritos.c.id)
+    )
+
+
+def user_favorites_payload(user_id, rows):
+    favorite_planets = []
+    favorite_characters = []
+    for (planet_id, planet_name, size, gravity, planet_version,
+         character_id, character_name, age, character_version) in rows:
+        # Mismos campos que Planets.serialize() y Characters.serialize()
+        if planet_name is not None:
+            favorite_planets.append({"id": planet_id, "name": planet_name, "size": size, "gravity": gravity,
+                                     "version": planet_version})
+        if character_name is not None:
+            favorite_characters.append({"id": character_id, "name": character_name, "age": age,
+                                        "version": character_version})
+    return {"User_id": user_id, "favourite_planets": favorite_planets, "favorite_people": favorite_characters}
+
+
+def _insert_ignore(dialect_name):
+    # INSERT que no falla si el favorito ya existe, segun el motor de base de datos
+    if dialect_name == 'sqlite':
+        return sqlite.insert(favoritos).on_conflict_do_nothing()
+    if dialect_name == 'postgresql':
+        return postgresql.insert(favoritos).on_conflict_do_nothing()
+    if dialect_name in ('mysql', 'mariadb'):
+        # INSERT IGNORE tambien silenciaria los errores de foreign key
+        stmt = mysql.insert(favoritos)
+        return stmt.on_duplicate_key_update(user_id=stmt.inserted.user_id)
+    return None
+
+
+def adjust_favorite_counts(session, model, ids, delta):
+    """Add `delta` to the favorite_count of the given planets or characters."""
+    if not ids:
+        return
+    table = model.__table__
+    # Por la conexion y no por la sesion: el contador no es una edicion del planeta o
+    # personaje, asi que no cambia su version ni invalida la cache ni los ETag
+    session.connection().execute(
+        update(table).where(table.c.id.in_(ids)).values(favorite_count=table.c.favorite_count + delta)
+    )
+
+
+def _target(planet_id, character_id):
+    if planet_id is not None:
+        return Planets, planet_id, favoritos.c.planet_id == planet_id
+    return Characters, character_id, favoritos.c.character_id == character_id
+
+
+def add_favorite(session, user_id, planet_id=None, character_id=None):
+    """
+    Insert one favorite and return False if it already existed.
+    Raises IntegrityError when a foreign key does not exist.
+    """
+    model, target_id, target = _target(planet_id, character_id)
+    row = {"user_id": user_id, "planet_id": planet_id, "character_id": character_id}
+    dialect_name = session.get_bind().dialect.name
+    # En MySQL ON DUPLICATE KEY UPDATE devuelve rowcount 1 tambien para un duplicado
+    # (CLIENT_FOUND_ROWS, activo por defecto): no sirve para saber si se inserto
+    stmt = _insert_ignore(dialect_name) if dialect_name not in ('mysql', 'mariadb') else None
+    if stmt is not None:
+        added = session.execute(stmt, row).rowcount > 0
+    else:
+        # Resto de motores: insert normal y, si falla, comprobamos si era un duplicado
+        try:
+            with session.begin_nested():
+                session.execute(favoritos.insert(), row)
+            added = True
+        except IntegrityError:
+            if session.execute(select(exists().where(and_(favoritos.c.user_id == user_id, target)))).scalar():
+                return False
+            raise
+    if added:
+        adjust_favorite_counts(session, model, [target_id], 1)
+    return added
+
+
+def remove_favorite(session, user_id, planet_id=None, character_id=None):
+    """Delete one favorite with a single DELETE; return False if it did not exist."""
+    model, target_id, target = _target(planet_id, character_id)
+    removed = session.execute(delete(favoritos).where(and_(favoritos.c.user_id == user_id, target))).rowcount > 0
+    if removed:
+        adjust_favorite_counts(session, model, [target_id], -1)
+    return removed
+
+
+def parse_favorites_batch(body):
+    """
+    Validate a batch body like
+        {"add": {"planets": [1, 2], "people": [3]}, "remove": {"planets": [4]}}
+    and return {"add": {kind: ids}, "remove": {kind: ids}}, or None if it is malformed.
+    """
+    if not isinstance(body, dict) or not set(body) <= {"add", "remove"}:
+        return None
+    batch = {}
+    for action in ("add", "remove"):
+        section = body.get(action, {})
+        if not isinstance(section, dict) or not set(section) <= set(FAVORITE_TARGETS):
+            return None
+        batch[action] = {}
+        for kind in FAVORITE_TARGETS:
+            ids = section.get(kind, [])
+            if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+                return None
+            batch[action][kind] = list(dict.fromkeys(ids))
+    # Un mismo id no puede anadirse y borrarse en la misma peticion
+    for kind in FAVORITE_TARGETS:
+        if set(batch["add"][kind]) & set(batch["remove"][kind]):
+            return None
+    return batch
+
+
+def apply_favorites_batch(session, user_id, batch):
+    """
+    Apply a parsed batch for `user_id` in the current transaction and return
+    the status of every item. One IN (...) query per entity type checks the
+    targets exist, one query reads the current favorites, then the inserts
+    go out as a single executemany and each delete as a single statement.
+    """
+    results = []
+    rows_to_insert = []
+    added = {}
+    for kind, (model, column_name) in FAVORITE_TARGETS.items():
+        column = favoritos.c[column_name]
+        to_add = batch["add"][kind]
+        to_remove = batch["remove"][kind]
+        requested = to_add + to_remove
+        if not requested:
+            continue
+        found = set(session.execute(select(model.id).where(model.id.in_(requested))).scalars())
+        current = set(session.execute(
+            select(column).where(and_(favoritos.c.user_id == user_id, column.in_(requested)))
+        ).scalars())
+
+        for target_id in to_add:
+            if target_id not in found:
+                status = "not_found"
+            elif target_id in current:
+                status = "already_favorite"
+            else:
+                status = "added"
+                row = {"user_id": user_id, "planet_id": None, "character_id": None}
+                row[column_name] = target_id
+                rows_to_insert.append(row)
+                added.setdefault(model, []).append(target_id)
+            results.append({"type": kind, "id": target_id, "action": "add", "status": status})
+
+        removable = [target_id for target_id in to_remove if target_id in current]
+        for target_id in to_remove:
+            status = "removed" if target_id in current else "not_favorite"
+            results.append({"type": kind, "id": target_id, "action": "remove", "status": status})
+        if removable:
+            session.execute(delete(favoritos).where(and_(favoritos.c.user_id == user_id, column.in_(removable))))
+            adjust_favorite_counts(session, model, removable, -1)
+
+    if rows_to_insert:
+        stmt = _insert_ignore(session.get_bind().dialect.name)
+        session.execute(stmt if stmt is not None else favoritos.insert(), rows_to_insert)
+        # Si otra peticion anadio el mismo favorito a la vez, la reconciliacion corrige la diferencia
+        for model, ids in added.items():
+            adjust_favorite_counts(session, model, ids, 1)
+    return results
@@ -0,0 +1,99 @@
+"""
+Query-string filtering and ordering for the Characters and Planets lists.
+
+    /planets?gravity=true&size__gte=100&order=-size
+    /people?name__prefix=Luke&age__lt=30
+
+Only the columns listed in FILTERS can be used; every filter compiles to a
+plain comparison on an indexed column (prefix searches become a range,
+name >= 'Luke' AND name < 'Lukf', so the B-tree index is used on every DB).
+A parameter that looks like a filter (a column of the model, or
+name__operator) but is not allowed is a 400; any other parameter, such as a
+cache buster (?_=123), is ignored.
+"""
+from sqlalchemy import and_
+from flask import request
+from utils import APIException
+from models import Planets, Characters
+
+# Parametros de la query string que no son filtros
+RESERVED_ARGS = {"limit", "after_id", "cursor", "order", "fields", "stream"}
+
+# Columna -> tipo de valor aceptado
+FILTERS = {
+    Planets: {"name": str, "size": int, "gravity": bool},
+    Characters: {"name": str, "age": int},
+}
+
+# Columnas por las que se puede ordenar (todas tienen indice)
+ORDERING = {
+    Planets: {"id", "name", "size"},
+    Characters: {"id", "name", "age"},
+}
+
+OPERATORS = {
+    str: {"eq", "prefix"},
+    int: {"eq", "gt", "gte", "lt", "lte"},
+    bool: {"eq"},
+}
+
+
+def _parse_value(name, kind, raw):
+    if kind is int:
+        try:
+            return int(raw)
+        except ValueError:
+            raise APIException(f"{name} must be an integer", 400)
+    if kind is bool:
+        if raw.lower() in ("true", "1"):
+            return True
+        if raw.lower() in ("false", "0"):
+            return False
+        raise APIException(f"{name} must be true or false", 400)
+    return raw
+
+
+def parse_filters(model):
+    """Return the SQL criteria for the filters in the query string."""
+    allowed = FILTERS[model]
+    criteria = []
+    for arg, raw in request.args.items():
+        if arg in RESERVED_ARGS:
+            continue
+        name, separator, operator = arg.partition("__")
+        operator = operator or "eq"
+        if name not in allowed or operator not in OPERATORS[allowed[name]]:
+            if name in model.__table__.columns or (name and separator):
+                raise APIException(f"Unknown filter: {arg}", 400)
+            continue
+        column = getattr(model, name)
+        value = _parse_value(arg, allowed[name], raw)
+        if operator == "eq":
+            criteria.append(column == value)
+        elif operator == "gt":
+            criteria.append(column > value)
+        elif operator == "gte":
+            criteria.append(column >= value)
+        elif operator == "lt":
+            criteria.append(column < value)
+        elif operator == "lte":
+            criteria.append(column <= value)
+        elif value:
+            # prefix -> rango sobre el indice
+            upper = value[:-1] + chr(ord(value[-1]) + 1)
+            criteria.append(and_(column >= value, column < upper))
+    return criteria
+
+
+def parse_order(model):
+    """Return (name, column, descending) for ?order=[-]column, or None for id order."""
+    value = request.args.get("order")
+    if not value:
+        return None
+    descending = value.startswith("-")
+    name = value.lstrip("-")
+    if name not in ORDERING[model]:
+        raise APIException(f"Cannot order by {name}", 400)
+    if name == "id" and not descending:
+        return None
+    return name, getattr(model, name), descending
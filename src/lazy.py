@@ -0,0 +1,70 @@
+"""
+Extensions loaded on first use instead of when the app is created.
+
+Flask-Admin (with WTForms) and Flask-Migrate (with Alembic) are most of the
+cost of importing the app, and most processes never touch them: a web
+worker only needs the admin once someone opens /admin, and `flask db ...`
+is the only CLI command that needs Alembic.
+
+    LazyMount       WSGI middleware that builds a sub-application (the
+                    admin) on the first request under its prefix
+    MigrateCommand  the `flask db` command group; registers Flask-Migrate
+                    on the app when the command runs
+"""
+import threading
+import click
+
+
+class LazyMount:
+    """Serve `prefix` from the WSGI app returned by `factory()`, built on first use."""
+
+    def __init__(self, wsgi_app, prefix, factory):
+        self.wsgi_app = wsgi_app
+        self.prefix = prefix.rstrip("/")
+        self.factory = factory
+        self._app = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._app is not None
+
+    def load(self):
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    self._app = self.factory()
+        return self._app
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path != self.prefix and not path.startswith(self.prefix + "/"):
+            return self.wsgi_app(environ, start_response)
+        # Igual que DispatcherMiddleware: el prefijo pasa de PATH_INFO a SCRIPT_NAME
+        environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + self.prefix
+        environ["PATH_INFO"] = path[len(self.prefix):]
+        return self.load()(environ, start_response)
+
+
+def init_migrate(app, db):
+    """Register Flask-Migrate on `app` (once) and return its `db` command group."""
+    from flask_migrate import Migrate
+    from flask_migrate.cli import db as db_cli_group
+    if 'migrate' not in app.extensions:
+        Migrate(app, db)
+    return db_cli_group
+
+
+class MigrateCommand(click.Group):
+    """`flask db`: Flask-Migrate is only imported when one of its commands runs."""
+
+    def __init__(self, app, db, name="db"):
+        super().__init__(name, help="Perform database migrations.")
+        self.app = app
+        self.db = db
+
+    def list_commands(self, ctx):
+        return init_migrate(self.app, self.db).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return init_migrate(self.app, self.db).get_command(ctx, name)
@@ -0,0 +1,65 @@
+"""
+Most favorited planets and characters.
+
+planet.favorite_count and character.favorite_count are denormalized counters
+of favoritos rows, moved by the favorite add/remove paths in favorites.py in
+the same transaction as the insert/delete. A leaderboard page is then a
+range scan on the (favorite_count, id) index instead of a GROUP BY over
+favoritos.
+
+Writes that bypass those paths (Flask-Admin edits of a user's favorites,
+deleting a user, concurrent duplicate adds) can leave a counter off;
+`reconcile_favorite_counts` recounts in id ranges and repairs only the rows
+that drifted. Run it periodically with `flask reconcile-favorites`.
+"""
+from sqlalchemy import func, select, update
+from serializers import SERIALIZERS
+from models import Planets, Characters, favoritos
+
+# Modelo -> columna de favoritos que lo referencia
+COUNTED = {
+    Planets: favoritos.c.planet_id,
+    Characters: favoritos.c.character_id,
+}
+
+
+def leaderboard_order(model):
+    """Order tuple for pagination.paginate: favorite_count DESC, id DESC."""
+    return "favorite_count", model.favorite_count, True
+
+
+def leaderboard_statement(model, fields):
+    """
+    Select the serializer `fields` plus favorite_count; return the statement
+    and the names of its columns, in order.
+    """
+    serializer = SERIALIZERS[model]
+    names = tuple(fields) + ("favorite_count",)
+    columns = [serializer.columns[name].label(name) for name in fields] + [model.favorite_count.label("favorite_count")]
+    # El cursor necesita el id aunque no se haya pedido
+    if "id" not in fields:
+        columns.append(model.id.label("id"))
+    return select(*columns), names
+
+
+def reconcile_favorite_counts(session, batch_size=10000):
+    """
+    Recompute favorite_count from favoritos for every planet and character,
+    one committed transaction per id range, and return the number of rows
+    repaired per table.
+    """
+    repaired = {}
+    for model, column in COUNTED.items():
+        table = model.__table__
+        actual = select(func.count()).where(column == table.c.id).scalar_subquery()
+        repaired[table.name] = 0
+        last_id = session.execute(select(func.max(table.c.id))).scalar() or 0
+        for start in range(1, last_id + 1, batch_size):
+            # Solo se escriben las filas cuyo contador no coincide
+            repaired[table.name] += session.connection().execute(
+                update(table)
+                .where(table.c.id.between(start, start + batch_size - 1), table.c.favorite_count != actual)
+                .values(favorite_count=actual)
+            ).rowcount
+            session.commit()
+    return repaired
@@ -0,0 +1,245 @@
+"""
+Per-route request instrumentation and a Prometheus /metrics endpoint.
+
+For every request we record wall time, time spent in SQL, number of
+statements, rows read or written and response bytes, aggregated into
+histograms labelled by route (the URL rule, e.g. /people/<int:people_id>)
+and method. SQL time comes from the before/after_cursor_execute events of
+every Engine, so queries from the async entry point are counted as well.
+
+Each response also gets a Server-Timing header, and statements slower than
+SLOW_QUERY_MS are logged. Metrics are per process: with several gunicorn
+workers every worker reports its own series. The SQL events are registered
+once per process, whatever the number of apps created.
+
+Notes:
+    - `rows` counts the rows fetched through the Session (SELECT and
+      RETURNING) plus the rowcount of statements that return no rows.
+      Rows read on a bare Connection or streamed with yield_per are not
+      counted.
+    - Streaming exports run their queries after the headers are sent, so
+      only the work done before the first byte is attributed to them.
+"""
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from flask import Response, current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Estadisticas de la peticion en curso (una por hilo / tarea async)
+_current = ContextVar("request_stats", default=None)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+ROWS_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class RequestStats:
+    __slots__ = ("metrics", "slow_query_seconds", "start", "sql_seconds", "queries", "rows")
+
+    def __init__(self, metrics, slow_query_seconds):
+        self.metrics = metrics
+        self.slow_query_seconds = slow_query_seconds
+        self.start = time.perf_counter()
+        self.sql_seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+
+
+class Histogram:
+    """
+    Cumulative histogram with one series per label tuple. Not thread-safe on
+    its own: RequestMetrics updates all its metrics under one lock.
+    """
+
+    def __init__(self, name, help, buckets, labels=("route", "method")):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            # Los contadores se guardan por cubo y se acumulan al exportar
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    """Counter with one value per label tuple; locking as in Histogram."""
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _gauge(name, help, value, type="gauge"):
+    return [f"# HELP {name} {help}", f"# TYPE {name} {type}", f"{name} {value}"]
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter("http_requests_total", "Requests served.", ("route", "method", "status"))
+        self.duration = Histogram("http_request_duration_seconds", "Wall time of the request handler.", SECONDS_BUCKETS)
+        self.sql = Histogram("http_request_sql_seconds", "Time spent executing SQL per request.", SECONDS_BUCKETS)
+        self.queries = Histogram("http_request_queries", "SQL statements executed per request.", COUNT_BUCKETS)
+        self.rows = Histogram("http_request_rows", "Rows read or written per request.", ROWS_BUCKETS)
+        self.bytes = Histogram("http_response_bytes", "Response body size.", BYTES_BUCKETS)
+        self.slow_queries = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS.", ("route",))
+
+    def init_app(self, app, engine_stats=None):
+        """
+        Register the request hooks, the SQL timing events and GET /metrics.
+        `engine_stats` is an optional callable returning extra gauges (the
+        connection pool usage) as a dict of name -> (help, value, type).
+        """
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', functools.partial(self.metrics_view, engine_stats), methods=['GET'])
+        app.extensions['request_metrics'] = self
+
+    def _before_request(self):
+        _current.set(RequestStats(self, current_app.config['SLOW_QUERY_MS'] / 1000))
+
+    def _after_request(self, response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        _current.set(None)
+        elapsed = time.perf_counter() - stats.start
+        rule = request.url_rule
+        labels = (rule.rule if rule is not None else "<unmatched>", request.method)
+        # Las respuestas en streaming no tienen tamano conocido
+        size = None if response.is_streamed else response.content_length or 0
+        with self._lock:
+            self.requests.inc(labels + (str(response.status_code),))
+            self.duration.observe(labels, elapsed)
+            self.sql.observe(labels, stats.sql_seconds)
+            self.queries.observe(labels, stats.queries)
+            self.rows.observe(labels, stats.rows)
+            if size is not None:
+                self.bytes.observe(labels, size)
+        response.headers["Server-Timing"] = (
+            f'sql;dur={stats.sql_seconds * 1000:.2f};desc="{stats.queries} queries", '
+            f'total;dur={elapsed * 1000:.2f}'
+        )
+        return response
+
+    def record_query(self, route, elapsed, slow_query_seconds, statement):
+        """Count and log `statement` if it took longer than `slow_query_seconds`."""
+        if elapsed < slow_query_seconds:
+            return
+        with self._lock:
+            self.slow_queries.inc((route,))
+        # Sin parametros: pueden llevar datos personales
+        logger.warning("Slow query (%.1f ms) on %s: %s", elapsed * 1000, route, " ".join(statement.split())[:500])
+
+    def expose(self, engine_stats=None):
+        lines = []
+        with self._lock:
+            for metric in (self.requests, self.duration, self.sql, self.queries, self.rows, self.bytes, self.slow_queries):
+                lines.extend(metric.expose())
+        if engine_stats is not None:
+            for name, (help, value, type) in engine_stats().items():
+                lines.extend(_gauge(name, help, value, type))
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self, engine_stats=None):
+        return Response(self.expose(engine_stats), mimetype="text/plain; version=0.0.4")
+
+
+# Una sola vez por proceso: create_app puede llamarse varias veces (tests, asgi)
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_start", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_seconds += elapsed
+        stats.queries += 1
+        # Las filas leidas se cuentan al traerlas (_count_fetched_rows): el rowcount de
+        # un SELECT es -1 en SQLite y en psycopg2 contaria dos veces
+        if cursor.description is None and cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+        stats.metrics.record_query(route_label(), elapsed, stats.slow_query_seconds, statement)
+    # Fuera de una peticion (p. ej. comandos de flask): solo el aviso de consulta lenta
+    elif has_app_context() and 'request_metrics' in current_app.extensions:
+        current_app.extensions['request_metrics'].record_query(
+            "-", elapsed, current_app.config['SLOW_QUERY_MS'] / 1000, statement)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _count_fetched_rows(orm_execute_state):
+    stats = _current.get()
+    if stats is None:
+        return None
+    # Los resultados con yield_per se leen por lotes: cargarlos enteros anularia el streaming
+    options = orm_execute_state.execution_options
+    if options.get("yield_per") or options.get("stream_results"):
+        return None
+    result = orm_execute_state.invoke_statement()
+    # SELECT y DML con RETURNING; el resto ya cuenta por su rowcount
+    if not getattr(result, "returns_rows", True):
+        return result
+    frozen = result.freeze()
+    stats.rows += len(frozen.data)
+    return frozen()
+
+
+def route_label():
+    return request.url_rule.rule if has_request_context() and request.url_rule is not None else "-"
+
+
+request_metrics = RequestMetrics()
@@ -1,10 +1,12 @@
 import datetime
 from typing import List
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Integer, String, Boolean, DateTime, Table, ForeignKey, Column
+from sqlalchemy import Integer, String, Boolean, DateTime, Table, ForeignKey, Column, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession: las lecturas de las peticiones GET van a una replica (DATABASE_REPLICA_URLS)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class User(db.Model):
     __tablename__ = "user"
@@ -15,8 +17,8 @@ class User(db.Model):
     created_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable = False) # type: ignore
     email: Mapped[str] = mapped_column(String(120), unique=True, nullable=False)
     password: Mapped[str] = mapped_column(nullable=False)
-    favourites_planet: Mapped[List["Planets"]] = relationship(secondary="favoritos", back_populates="users")
-    favourites_character: Mapped[List["Characters"]] = relationship(secondary="favoritos", back_populates="users")
+    favourites_planet: Mapped[List["Planets"]] = relationship(secondary="favoritos", back_populates="users", passive_deletes=True)
+    favourites_character: Mapped[List["Characters"]] = relationship(secondary="favoritos", back_populates="users", passive_deletes=True)
 
     def serialize(self):
         return {
@@ -32,31 +34,44 @@ class Planets(db.Model):
     __tablename__= "planet"
 
     id: Mapped[int]  = mapped_column(primary_key = True)
-    name: Mapped[str] = mapped_column(String(60), nullable = False)
-    size: Mapped[int] = mapped_column(nullable = False)
+    name: Mapped[str] = mapped_column(String(60), nullable = False, index = True)
+    size: Mapped[int] = mapped_column(nullable = False, index = True)
     gravity: Mapped[bool] = mapped_column(Boolean())
-    users: Mapped[List["User"]] = relationship(secondary="favoritos", back_populates="favourites_planet")
+    # Version de la fila: cambia en cada escritura (concurrencia optimista en PUT/PATCH)
+    version: Mapped[int] = mapped_column(nullable = False, server_default = "1")
+    # Numero de usuarios que lo tienen como favorito (lo mantienen los handlers de favoritos)
+    favorite_count: Mapped[int] = mapped_column(nullable = False, server_default = "0")
+    users: Mapped[List["User"]] = relationship(secondary="favoritos", back_populates="favourites_planet", passive_deletes=True)
+
+    # Ranking de /leaderboard/planets: favorite_count DESC, id DESC
+    __table_args__ = (Index("ix_planet_favorite_count", "favorite_count", "id"),)
 
     def serialize(self):
         return{
             "id" : self.id,
             "name" : self.name,
             "size": self.size,
-            "gravity": self.gravity
+            "gravity": self.gravity,
+            "version": self.version
         }
 
 class Characters(db.Model):
     __tablename__ = "character"
     id: Mapped[int] = mapped_column(primary_key = True)
-    name: Mapped[str] = mapped_column(String(60), nullable = False)
-    age: Mapped[int] = mapped_column(nullable = False)
-    users: Mapped[List["User"]] = relationship(secondary="favoritos", back_populates="favourites_character")
+    name: Mapped[str] = mapped_column(String(60), nullable = False, index = True)
+    age: Mapped[int] = mapped_column(nullable = False, index = True)
+    version: Mapped[int] = mapped_column(nullable = False, server_default = "1")
+    favorite_count: Mapped[int] = mapped_column(nullable = False, server_default = "0")
+    users: Mapped[List["User"]] = relationship(secondary="favoritos", back_populates="favourites_character", passive_deletes=True)
+
+    __table_args__ = (Index("ix_character_favorite_count", "favorite_count", "id"),)
 
     def serialize(self):
         return{
             "id" : self.id,
             "name": self.name,
-            "age": self.age
+            "age": self.age,
+            "version": self.version
         }
 
 
@@ -65,7 +80,33 @@ favoritos = Table(
     "favoritos",
     db.metadata,
     Column("id", Integer, primary_key = True, autoincrement=True),
-    Column("user_id", ForeignKey("user.id"),  nullable = False),
-    Column("planet_id", ForeignKey("planet.id"),  nullable = True),
-    Column("character_id", ForeignKey("character.id"),  nullable = True)
-    )
\ No newline at end of file
+    # La base de datos borra los favoritos al borrar el usuario, planeta o personaje
+    # (passive_deletes en las relaciones: el ORM no carga las filas para borrarlas)
+    Column("user_id", ForeignKey("user.id", name = "fk_favoritos_user_id_user", ondelete = "CASCADE"),  nullable = False),
+    Column("planet_id", ForeignKey("planet.id", name = "fk_favoritos_planet_id_planet", ondelete = "CASCADE"),  nullable = True),
+    Column("character_id", ForeignKey("character.id", name = "fk_favoritos_character_id_character", ondelete = "CASCADE"),  nullable = True),
+    # Un usuario no puede repetir favorito; tambien sirven para listar por user_id
+    Index("ix_favoritos_user_planet", "user_id", "planet_id", unique = True),
+    Index("ix_favoritos_user_character", "user_id", "character_id", unique = True),
+    # Para contar los favoritos de un planeta/personaje y para el ON DELETE CASCADE
+    Index("ix_favoritos_planet_id", "planet_id"),
+    Index("ix_favoritos_character_id", "character_id")
+    )
+
+
+# Clase mapeada sobre la misma tabla para administrar los favoritos en Flask-Admin
+class Favorite(db.Model):
+    __table__ = favoritos
+    # Mismo nombre que la tabla: versioning y cache identifican las filas por __tablename__
+    __tablename__ = "favoritos"
+
+
+# Version por tabla (y por usuario para sus favoritos) para los ETag de los GET
+table_versions = Table(
+    "table_versions",
+    db.metadata,
+    Column("name", String(80), primary_key = True),
+    Column("version", Integer, nullable = False, default = 0),
+    Column("updated_at", DateTime, nullable = False)
+    )
+
@@ -0,0 +1,120 @@
+"""
+Keyset (cursor) pagination for the list endpoints.
+
+Each page is a bounded range scan on the primary key:
+    SELECT ... WHERE id > :after_id ORDER BY id LIMIT :limit + 1
+so the cost of a page does not depend on how deep the client has paged.
+When the client sorts by another column (?order=size) the cursor is an
+opaque `?cursor=` token holding the last (value, id) pair, and the page is
+a range scan on that column's index with the id as tie-breaker.
+"""
+import base64
+import json
+from urllib.parse import urlencode
+from flask import current_app, request
+from sqlalchemy import tuple_
+from utils import APIException
+
+
+def _int_arg(name, default, minimum):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise APIException(f"{name} must be an integer", 400)
+    if value < minimum:
+        raise APIException(f"{name} must be >= {minimum}", 400)
+    return value
+
+
+def encode_cursor(value, last_id):
+    return base64.urlsafe_b64encode(json.dumps([value, last_id]).encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise APIException("cursor is not valid", 400)
+    if type(last_id) is not int:
+        raise APIException("cursor is not valid", 400)
+    return value, last_id
+
+
+def get_page_args(ordered=False):
+    # Lee y valida ?limit= y ?after_id= (o ?cursor= si hay ?order=) de la query string
+    limit = min(_int_arg('limit', current_app.config['DEFAULT_PAGE_SIZE'], 1), current_app.config['MAX_PAGE_SIZE'])
+    if not ordered:
+        return limit, _int_arg('after_id', 0, 0)
+    token = request.args.get('cursor')
+    return limit, decode_cursor(token) if token else None
+
+
+def sort_clause(id_column, order=None):
+    """
+    ORDER BY columns for `order`. The id is the tie-breaker and goes in the
+    same direction so the whole ORDER BY can walk one index.
+    """
+    if order is None:
+        return [id_column]
+    name, column, descending = order
+    if descending:
+        return [column.desc(), id_column.desc()]
+    return [column, id_column]
+
+
+def page_statement(stmt, id_column, limit, after, order=None):
+    """Add the keyset WHERE, ORDER BY and LIMIT (one extra row) to `stmt`."""
+    if order is None:
+        stmt = stmt.where(id_column > after)
+    elif after is not None:
+        name, column, descending = order
+        value, last_id = after
+        # Comparacion de tuplas (value, id); la condicion extra sobre la columna sola
+        # permite al planificador empezar la busqueda en el indice desde `value`
+        if descending:
+            stmt = stmt.where(column <= value, tuple_(column, id_column) < tuple_(value, last_id))
+        else:
+            stmt = stmt.where(column >= value, tuple_(column, id_column) > tuple_(value, last_id))
+    return stmt.order_by(*sort_clause(id_column, order)).limit(limit + 1)
+
+
+def paginate(session, stmt, id_column, limit, after, order=None):
+    """
+    Run `stmt` as one keyset page and return (rows, next_cursor).
+    `stmt` must select an `id` column; rows are returned as Row tuples.
+    `order` is None (sort by id, `after` is an id) or (name, column, descending),
+    in which case `after` is a decoded (value, id) cursor and `stmt` must also
+    select `column` labelled as `name`.
+    """
+    rows = session.execute(page_statement(stmt, id_column, limit, after, order)).all()
+    return split_page(rows, limit, order)
+
+
+def split_page(rows, limit, order=None):
+    """Drop the extra row fetched by `page_statement` and return (rows, next_cursor)."""
+    # Pedimos una fila extra para saber si hay una pagina siguiente
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    if order is None:
+        return rows, rows[-1].id
+    return rows, encode_cursor(rows[-1]._mapping[order[0]], rows[-1].id)
+
+
+def page_headers(next_cursor, limit):
+    """Expose the next cursor as `X-Next-Cursor` and an RFC 8288 `Link` header."""
+    if next_cursor is None:
+        return {}
+    args = request.args.to_dict()
+    # Cursor numerico -> ?after_id=, token opaco (orden por otra columna) -> ?cursor=
+    args.pop('after_id', None)
+    args.pop('cursor', None)
+    args['after_id' if isinstance(next_cursor, int) else 'cursor'] = next_cursor
+    args['limit'] = limit
+    return {
+        "X-Next-Cursor": str(next_cursor),
+        "Link": f'<{request.base_url}?{urlencode(args)}>; rel="next"',
+    }
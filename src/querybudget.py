@@ -0,0 +1,125 @@
+"""
+Per-request query tracking: N+1 detection and query budgets.
+
+Every statement executed while a request is being served is recorded. At
+the end of the request the tracker reports:
+    - statements repeated N_PLUS_ONE_THRESHOLD or more times with different
+      parameters (the usual shape of an N+1 loop),
+    - lazy relationship loads (e.g. touching User.favourites_planet while
+      serializing),
+    - routes that ran more statements than declared with @query_budget(n).
+
+QUERY_TRACKING decides what happens with a report: "warn" logs it (the
+default, for production), "raise" raises QueryBudgetExceeded so a test
+fails, "off" disables tracking. Budgets are attached to the view function,
+so the async entry point enforces the same budgets for the routes it serves.
+The SQL events are registered once per process; the mode and threshold are
+read from the config of the app serving the request.
+"""
+import logging
+from contextvars import ContextVar
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("query_tracker", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """Declare the maximum number of SQL statements a view may execute."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class RequestQueries:
+    __slots__ = ("count", "statements", "lazy_loads")
+
+    def __init__(self):
+        self.count = 0
+        # sentencia -> [veces, primeros parametros, parametros distintos?]
+        self.statements = {}
+        # atributo -> veces que se cargo de forma perezosa
+        self.lazy_loads = {}
+
+    def record(self, statement, parameters):
+        self.count += 1
+        seen = self.statements.get(statement)
+        if seen is None:
+            self.statements[statement] = [1, parameters, False]
+        else:
+            seen[0] += 1
+            if not seen[2] and parameters != seen[1]:
+                seen[2] = True
+
+    def repeated(self, threshold):
+        return [(statement, count) for statement, (count, _, differs) in self.statements.items()
+                if differs and count >= threshold]
+
+
+class QueryTracker:
+
+    def init_app(self, app):
+        if app.config['QUERY_TRACKING'] == "off":
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['query_tracker'] = self
+
+    def _before_request(self):
+        _current.set(RequestQueries())
+
+    def _after_request(self, response):
+        queries = _current.get()
+        if queries is None:
+            return response
+        _current.set(None)
+        problems = self.check(queries, request.endpoint)
+        if problems:
+            message = f"{request.method} {request.path}: " + "; ".join(problems)
+            if current_app.config['QUERY_TRACKING'] == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def check(self, queries, endpoint):
+        """Return the problems found in the statements of one request."""
+        problems = []
+        view = current_app.view_functions.get(endpoint)
+        budget = getattr(view, "query_budget", None)
+        if budget is not None and queries.count > budget:
+            problems.append(f"{queries.count} queries, budget is {budget}")
+        for statement, count in queries.repeated(current_app.config['N_PLUS_ONE_THRESHOLD']):
+            problems.append(f"possible N+1, {count}x: {' '.join(statement.split())[:200]}")
+        for attribute, count in queries.lazy_loads.items():
+            problems.append(f"lazy load of {attribute} ({count}x)")
+        return problems
+
+
+# Una sola vez por proceso: create_app puede llamarse varias veces (tests, asgi)
+@event.listens_for(Engine, "before_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    if queries is not None:
+        queries.record(statement, parameters)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_lazy_load(orm_execute_state):
+    queries = _current.get()
+    if queries is not None and orm_execute_state.is_relationship_load and orm_execute_state.lazy_loaded_from is not None:
+        # Ruta del loader, p. ej. User -> favourites_planet
+        path = orm_execute_state.loader_strategy_path
+        attribute = f"{path[-2].class_.__name__}.{path[-1].key}" if len(path) >= 2 else "relationship"
+        queries.lazy_loads[attribute] = queries.lazy_loads.get(attribute, 0) + 1
+
+
+query_tracker = QueryTracker()
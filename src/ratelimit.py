@@ -0,0 +1,311 @@
+"""
+Rate limiting and load shedding in front of the API routes.
+
+Three checks run before the view, cheapest first:
+    1. load shedding: when the proxy reports how long the request waited in
+       its queue (X-Request-Start), a request that already spent more than
+       RATELIMIT_MAX_QUEUE_MS there gets 503 - the client has most likely
+       given up, and serving it only delays the requests behind it,
+    2. a token bucket per client: RATELIMIT_RATE tokens per second up to
+       RATELIMIT_BURST. Clients are told apart by IP address: the API does
+       not authenticate anyone, and keying on a header the client chooses
+       would give it a new bucket with every new value. An empty
+       bucket answers 429 with Retry-After set to when the request's cost will
+       be available again,
+    3. a concurrency cap per route: requests over the cap get 503 at once
+       instead of waiting for a thread or a pool connection behind the
+       requests of that route.
+Routes declare their cost in tokens and their cap with @rate_limit(...);
+undeclared routes cost 1 token and use RATELIMIT_CONCURRENCY (0: no cap).
+
+Buckets live in the worker's memory by default, so with several gunicorn
+workers a client gets up to one bucket per worker. RATELIMIT_BACKEND=shared
+keeps them in a SQLite file on /dev/shm shared by every worker of the host,
+updated with one atomic UPSERT per request. Concurrency caps are always per
+worker: they protect that worker's threads and connection pool.
+
+Behind a proxy set RATELIMIT_TRUSTED_PROXIES to the number of proxies that
+append to X-Forwarded-For, or every client will share the proxy's bucket.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from flask import current_app, jsonify, request
+
+# Ruta cuyo hueco de concurrencia ocupa la peticion en curso
+_current = ContextVar("ratelimit_slot", default=None)
+
+REASONS = ("rate", "concurrency", "shed")
+
+
+def rate_limit(cost=None, concurrency=None, exempt=False):
+    """Declare the token cost, the concurrency cap or the exemption of a view."""
+    def decorator(view):
+        view.rate_limit = {"cost": cost, "concurrency": concurrency, "exempt": exempt}
+        return view
+    return decorator
+
+
+class MemoryBuckets:
+    """Token buckets of this process."""
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key, cost):
+        """Take `cost` tokens; return 0 or the seconds until they will be available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            if tokens < cost:
+                return (cost - tokens) / self.rate
+            self._buckets[key] = (tokens - cost, now)
+            self._takes += 1
+            if self._takes % self.SWEEP_EVERY == 0:
+                self._sweep(now)
+            return 0.0
+
+    def _sweep(self, now):
+        # Un cubo que ya se ha rellenado del todo es igual que uno que no existe
+        for key in [key for key, (tokens, updated) in self._buckets.items()
+                    if tokens + (now - updated) * self.rate >= self.burst]:
+            del self._buckets[key]
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "buckets": len(self._buckets)}
+
+
+class SharedBuckets:
+    """
+    Token buckets shared by the processes of one host, in a SQLite file that
+    by default lives on tmpfs (/dev/shm). If the file cannot be used the
+    request is let through: the limiter never turns into an outage.
+    """
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self._local = threading.local()
+        self._takes = 0
+        self.errors = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        # Una conexion por hilo y por proceso: tras el fork de gunicorn se abre otra
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def take(self, key, cost):
+        """Take `cost` tokens; return 0 or the seconds until they will be available."""
+        now = time.time()
+        params = {"key": key, "cost": cost, "now": now, "rate": self.rate, "burst": self.burst}
+        try:
+            connection = self._connection()
+            # Rellenar, comprobar y descontar en una sola sentencia: atomica entre procesos.
+            # Si no hay tokens el UPDATE no se aplica y RETURNING no devuelve fila
+            row = connection.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (:key, :burst - :cost, :now) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "tokens = MIN(:burst, tokens + (:now - updated) * :rate) - :cost, updated = :now "
+                "WHERE MIN(:burst, tokens + (:now - updated) * :rate) >= :cost "
+                "RETURNING tokens",
+                params,
+            ).fetchone()
+            if row is not None:
+                self._takes += 1
+                if self._takes % self.SWEEP_EVERY == 0:
+                    connection.execute(
+                        "DELETE FROM buckets WHERE tokens + (:now - updated) * :rate >= :burst", params
+                    )
+                return 0.0
+            tokens = connection.execute(
+                "SELECT MIN(:burst, tokens + (:now - updated) * :rate) FROM buckets WHERE key = :key", params
+            ).fetchone()[0]
+            return (cost - tokens) / self.rate
+        except sqlite3.Error:
+            self.errors += 1
+            return 0.0
+
+    def stats(self):
+        return {
+            "backend": "shared",
+            "path": self.path,
+            "buckets": self._connection().execute("SELECT COUNT(*) FROM buckets").fetchone()[0],
+            "errors": self.errors,
+        }
+
+
+def _memory_backend(app):
+    return MemoryBuckets(app.config['RATELIMIT_RATE'], app.config['RATELIMIT_BURST'])
+
+
+def _shared_backend(app):
+    return SharedBuckets(app.config['RATELIMIT_SHARED_PATH'], app.config['RATELIMIT_RATE'],
+                         app.config['RATELIMIT_BURST'])
+
+
+RATELIMIT_BACKENDS = {
+    "memory": _memory_backend,
+    "shared": _shared_backend,
+}
+
+
+def queue_seconds(header, now=None):
+    """
+    Time since the proxy received the request, from X-Request-Start
+    ("t=1700000000.123", "t=1700000000123456" or "1700000000123"), or None.
+    """
+    if not header:
+        return None
+    try:
+        started = float(header.strip().removeprefix("t="))
+    except ValueError:
+        return None
+    # Segundos, milisegundos o microsegundos segun el proxy
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    elapsed = (time.time() if now is None else now) - started
+    # Relojes desajustados entre el proxy y el worker: no se descarta nada
+    return elapsed if elapsed >= 0 else None
+
+
+def request_client_key(trusted_proxies):
+    """Key of the client of the current request: its IP (see RATELIMIT_TRUSTED_PROXIES)."""
+    address = request.remote_addr
+    if trusted_proxies:
+        # Cada proxy de confianza anade una direccion al final: el cliente es la anterior
+        forwarded = [part.strip() for part in request.headers.get("X-Forwarded-For", "").split(",") if part.strip()]
+        if len(forwarded) >= trusted_proxies:
+            address = forwarded[-trusted_proxies]
+    return f"ip:{address}"
+
+
+class RateLimiter:
+
+    def __init__(self):
+        self.buckets = None
+        self.trusted_proxies = 0
+        self.default_concurrency = 0
+        self.max_queue_seconds = 0
+        self.exempt = set()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.rejected = {}
+
+    def init_app(self, app):
+        """
+        Register the checks. Call it after the other extensions: its
+        before_request runs last, so the metrics also see rejected requests.
+        """
+        self.buckets = RATELIMIT_BACKENDS[app.config['RATELIMIT_BACKEND']](app)
+        self.trusted_proxies = app.config['RATELIMIT_TRUSTED_PROXIES']
+        self.default_concurrency = app.config['RATELIMIT_CONCURRENCY']
+        self.max_queue_seconds = app.config['RATELIMIT_MAX_QUEUE_MS'] / 1000
+        # /metrics se consulta cada pocos segundos desde la misma IP
+        self.exempt = {"metrics", "static"}
+        app.before_request(self._before_request)
+        app.teardown_request(self._release)
+        app.extensions['rate_limiter'] = self
+
+    def client_key(self):
+        return request_client_key(self.trusted_proxies)
+
+    def _reject(self, reason, route, status, retry_after, message):
+        with self._lock:
+            self.rejected[(reason, route)] = self.rejected.get((reason, route), 0) + 1
+        response = jsonify({"message": message})
+        response.status_code = status
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def _before_request(self):
+        _current.set(None)
+        endpoint = request.endpoint
+        if endpoint is None or endpoint in self.exempt or request.method == "OPTIONS":
+            return None
+        limits = getattr(current_app.view_functions.get(endpoint), "rate_limit", None) or {}
+        if limits.get("exempt"):
+            return None
+        route = request.url_rule.rule
+
+        waited = queue_seconds(request.headers.get("X-Request-Start"))
+        if self.max_queue_seconds and waited is not None and waited > self.max_queue_seconds:
+            return self._reject("shed", route, 503, 1, "Server overloaded, try again later")
+
+        cost = min(limits.get("cost") or 1, self.buckets.burst)
+        retry_after = self.buckets.take(self.client_key(), cost)
+        if retry_after > 0:
+            return self._reject("rate", route, 429, retry_after, "Too many requests")
+
+        cap = limits.get("concurrency") or self.default_concurrency
+        if cap:
+            with self._lock:
+                busy = self._inflight.get(route, 0) >= cap
+                if not busy:
+                    self._inflight[route] = self._inflight.get(route, 0) + 1
+            if busy:
+                return self._reject("concurrency", route, 503, 1, "Too many concurrent requests, try again later")
+            _current.set(route)
+        return None
+
+    def _release(self, exception=None):
+        route = _current.get()
+        if route is None:
+            return
+        _current.set(None)
+        with self._lock:
+            self._inflight[route] -= 1
+
+    def stats(self):
+        with self._lock:
+            rejected = {}
+            for (reason, route), count in sorted(self.rejected.items()):
+                rejected.setdefault(reason, {})[route] = count
+            inflight = {route: count for route, count in self._inflight.items() if count}
+        return {
+            **self.buckets.stats(),
+            "rate": self.buckets.rate,
+            "burst": self.buckets.burst,
+            # Los contadores son de este worker
+            "pid": os.getpid(),
+            "inflight": inflight,
+            "rejected": rejected,
+        }
+
+    def gauges(self):
+        """Rejection counters as Prometheus metrics: name -> (help, value, type)."""
+        with self._lock:
+            totals = {reason: 0 for reason in REASONS}
+            for (reason, _), count in self.rejected.items():
+                totals[reason] += count
+        return {
+            f"ratelimit_rejected_{reason}_total": (f"Requests rejected by the {reason} check.", count, "counter")
+            for reason, count in totals.items()
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,360 @@
+"""
+Read replicas: GET requests read from a replica, everything else uses the primary.
+
+Enabled by DATABASE_REPLICA_URLS (comma-separated database URLs). Routing is
+done by `RoutingSession.get_bind`, the session class of `db`:
+    - a GET or HEAD request picks one healthy replica (round-robin) before the
+      view runs, and every SELECT of the request goes to it,
+    - flushes and INSERT/UPDATE/DELETE statements go to the primary, and so
+      does every statement after the session's first write,
+    - any other method uses the primary only, as does Flask-Admin (its session
+      is bound to the primary engine).
+
+Read-your-writes: after a request that wrote, the client reads from the
+primary for REPLICA_STICKY_SECONDS. The client is remembered by a cookie,
+which every worker sees, and by its IP in this worker (the same key as the
+rate limiter), for clients that ignore cookies. Keep it above the usual
+replication lag. For the same window nothing read from a replica goes into
+the entity cache; the time of the last write is kept next to the cache
+(CACHE_BACKEND), in a store of its own that never evicts it.
+
+Health: a thread per worker checks every replica each REPLICA_HEALTH_INTERVAL
+seconds (SELECT 1; on PostgreSQL also the replay lag, which must stay under
+REPLICA_MAX_LAG_SECONDS). A replica whose connection fails during a request
+leaves the rotation until a check passes again. Without healthy replicas,
+reads go to the primary.
+"""
+import itertools
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.dml import UpdateBase
+from database import engine_options
+from ratelimit import request_client_key
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Replica de la que lee la peticion en curso (None: el primario)
+_read_replica = ContextVar("read_replica", default=None)
+
+STICKY_COOKIE = "read_primary_until"
+LAST_WRITE_KEY = "starwars:replicas:last_write"
+STORE_ERRORS = (sqlite3.Error, redis.RedisError) if redis is not None else (sqlite3.Error,)
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Segundos de retraso de una replica de PostgreSQL; 0 si ya ha aplicado todo lo recibido
+POSTGRES_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def current_replica():
+    """The replica the current request reads from, or None for the primary."""
+    return _read_replica.get()
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of a read-only request to its replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = _read_replica.get()
+        if replica is not None and bind is None and not self.info.get('replica_wrote'):
+            if not isinstance(clause, UpdateBase):
+                return replica.engine
+            # Desde la primera escritura todo va al primario, tambien lo que se lea despues
+            self.info['replica_wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _flush_to_primary(session, flush_context, instances):
+    # Solo se llama si hay cambios que escribir: el flush y lo que venga despues, al primario
+    session.info['replica_wrote'] = True
+
+
+class LocalLastWrite:
+    """Time of the last write in this process (CACHE_BACKEND memory or null)."""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = max(self.value, value)
+
+
+class SharedLastWrite:
+    """Time of the last write by any worker of the host, in its own table of the shared cache file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS replica_last_write (id INTEGER PRIMARY KEY CHECK (id = 1), at REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self):
+        row = self._connection().execute("SELECT at FROM replica_last_write WHERE id = 1").fetchone()
+        return 0.0 if row is None else row[0]
+
+    def set(self, value):
+        self._connection().execute(
+            "INSERT INTO replica_last_write (id, at) VALUES (1, ?) "
+            "ON CONFLICT (id) DO UPDATE SET at = max(at, excluded.at)", (value,)
+        )
+
+
+class RedisLastWrite:
+    """Time of the last write by any worker, in a Redis key without expiry."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self):
+        return float(self.client.get(LAST_WRITE_KEY) or 0)
+
+    def set(self, value):
+        self.client.set(LAST_WRITE_KEY, value)
+
+
+def _last_write_store(app):
+    # Junto a la cache de entidades: la ven los mismos workers que comparten sus entradas
+    backend = app.config['CACHE_BACKEND']
+    if backend == "shared":
+        return SharedLastWrite(app.config['CACHE_SHARED_PATH'])
+    if backend == "redis" and redis is not None:
+        return RedisLastWrite(redis.Redis.from_url(app.config['CACHE_REDIS_URL'], socket_timeout=0.5))
+    return LocalLastWrite()
+
+
+class Replica:
+
+    def __init__(self, url, engine):
+        self.url = url
+        self.engine = engine
+        # Fuera de la rotacion hasta la primera comprobacion
+        self.healthy = False
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+        self.reads = 0
+
+    def stats(self):
+        return {
+            "url": make_url(self.url).render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "error": self.error,
+            "checked_seconds_ago": None if self.checked_at is None else round(time.time() - self.checked_at, 3),
+            "reads": self.reads,
+        }
+
+
+class ReplicaRouter:
+
+    def __init__(self):
+        self.replicas = []
+        self.health_interval = 5
+        self.max_lag = 5
+        self.sticky_seconds = 5
+        self.trusted_proxies = 0
+        self.reads = {"replica": 0, "sticky": 0, "fallback": 0}
+        self.last_write = LocalLastWrite()
+        self.last_write_errors = 0
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._pins = {}
+        self._checker_pid = None
+
+    def init_app(self, app):
+        self.health_interval = app.config['REPLICA_HEALTH_INTERVAL']
+        self.max_lag = app.config['REPLICA_MAX_LAG_SECONDS']
+        self.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+        self.trusted_proxies = app.config['RATELIMIT_TRUSTED_PROXIES']
+        self._pins = {}
+        self.last_write = _last_write_store(app)
+        self.replicas = []
+        for url in app.config['DATABASE_REPLICA_URLS']:
+            # Los motores no abren conexiones hasta la primera consulta
+            replica = Replica(url, create_engine(url, **engine_options(url)))
+            self.track_errors(replica, replica.engine)
+            self.replicas.append(replica)
+        app.before_request(self._before_request)
+        app.after_request(self.pin_after_write)
+        app.teardown_request(lambda exception=None: _read_replica.set(None))
+        app.extensions['replica_router'] = self
+
+    def track_errors(self, replica, engine):
+        """Take `replica` out of the rotation when a connection of `engine` fails."""
+        def handle_error(context):
+            if context.is_disconnect or context.connection is None:
+                replica.healthy = False
+                replica.error = str(context.original_exception)
+        event.listen(engine, "handle_error", handle_error)
+
+    def check(self, replica):
+        try:
+            with replica.engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    lag = connection.execute(POSTGRES_LAG).scalar()
+                    replica.lag = None if lag is None else float(lag)
+                else:
+                    connection.execute(text("SELECT 1"))
+                    replica.lag = 0.0
+            replica.error = None if replica.lag is not None else "replication lag unknown"
+            replica.healthy = replica.lag is not None and replica.lag <= self.max_lag
+        except SQLAlchemyError as e:
+            replica.healthy = False
+            replica.error = str(e)
+        replica.checked_at = time.time()
+
+    def _check_loop(self):
+        while True:
+            for replica in self.replicas:
+                self.check(replica)
+            time.sleep(self.health_interval)
+
+    def _ensure_checker(self):
+        # Los hilos no sobreviven al fork de gunicorn: cada worker arranca el suyo
+        if self._checker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._checker_pid != os.getpid():
+                self._checker_pid = os.getpid()
+                threading.Thread(target=self._check_loop, name="replica-health", daemon=True).start()
+
+    def choose(self):
+        """Next healthy replica in round-robin order, or None."""
+        self._ensure_checker()
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    def client_key(self):
+        return request_client_key(self.trusted_proxies)
+
+    def pinned(self):
+        """True if the client of this request wrote less than REPLICA_STICKY_SECONDS ago."""
+        now = time.time()
+        try:
+            if float(request.cookies.get(STICKY_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        return self._pins.get(self.client_key(), 0) > now
+
+    def _before_request(self):
+        _read_replica.set(None)
+        if request.method not in ("GET", "HEAD"):
+            return None
+        if self.pinned():
+            reason, replica = "sticky", None
+        else:
+            replica = self.choose()
+            reason = "fallback" if replica is None else "replica"
+        with self._lock:
+            self.reads[reason] += 1
+            if replica is not None:
+                replica.reads += 1
+        _read_replica.set(replica)
+        return None
+
+    def pin_after_write(self, response):
+        """after_request: send the client's reads to the primary for a while after a write."""
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        now = time.time()
+        until = now + self.sticky_seconds
+        self._store_last_write(now)
+        with self._lock:
+            self._pins[self.client_key()] = until
+            if len(self._pins) > 10000:
+                self._pins = {key: expires for key, expires in self._pins.items() if expires > now}
+        response.set_cookie(STICKY_COOKIE, f"{until:.3f}", max_age=math.ceil(self.sticky_seconds),
+                            httponly=True, samesite="Lax")
+        return response
+
+    def _store_last_write(self, now):
+        try:
+            self.last_write.set(now)
+        except STORE_ERRORS as e:
+            self.last_write_errors += 1
+            logger.warning("Could not store the last write time: %s", e)
+
+    def cacheable(self):
+        """
+        Whether what this request read may go into the entity cache: not when
+        it came from a replica less than REPLICA_STICKY_SECONDS after a write
+        by any worker sharing the cache, as it may be the version that write
+        has just invalidated.
+        """
+        if _read_replica.get() is None:
+            return True
+        try:
+            last_write = self.last_write.get()
+        except STORE_ERRORS as e:
+            # Sin saber cuando se escribio, no se guarda
+            self.last_write_errors += 1
+            logger.warning("Could not read the last write time: %s", e)
+            return False
+        return time.time() - last_write > self.sticky_seconds
+
+    def dispose(self):
+        for replica in self.replicas:
+            replica.engine.dispose(close=False)
+
+    def stats(self):
+        with self._lock:
+            reads = dict(self.reads)
+            pins = sum(1 for expires in self._pins.values() if expires > time.time())
+        return {
+            # Los contadores son de este worker
+            "pid": os.getpid(),
+            "sticky_seconds": self.sticky_seconds,
+            "max_lag_seconds": self.max_lag,
+            "pinned_clients": pins,
+            "last_write_errors": self.last_write_errors,
+            "reads": reads,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+    def gauges(self):
+        """Routing counters as Prometheus metrics: name -> (help, value, type)."""
+        with self._lock:
+            reads = dict(self.reads)
+        return {
+            "db_replicas_healthy": ("Read replicas in the rotation.", sum(replica.healthy for replica in self.replicas), "gauge"),
+            "db_reads_replica_total": ("Read-only requests served by a replica.", reads["replica"], "counter"),
+            "db_reads_sticky_total": ("Read-only requests sent to the primary after a write by the client.", reads["sticky"], "counter"),
+            "db_reads_fallback_total": ("Read-only requests sent to the primary for lack of a healthy replica.", reads["fallback"], "counter"),
+        }
+
+
+replica_router = ReplicaRouter()
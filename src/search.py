@@ -0,0 +1,262 @@
+"""
+Full-text search over Characters.name and Planets.name.
+
+The backend is picked from the database the app is connected to:
+    sqlite      FTS5 table `search_index` with prefix indexes, kept in sync by
+                triggers on planet/character (see migration 7968d180e3af)
+    postgresql  GIN expression indexes on to_tsvector('simple', name)
+    otherwise   in-memory trigram index (also used when the FTS5 table has not
+                been created, e.g. a database made with db.create_all())
+Because the SQLite and PostgreSQL indexes live in the database they are
+updated by every write, including Flask-Admin edits and bulk statements.
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import event, func, literal, literal_column, select, text, union_all
+from sqlalchemy.orm import Session
+from models import Planets, Characters
+
+# rowid del indice FTS5 = id * 2 + tipo, para borrar/actualizar por clave
+KINDS = {0: "planet", 1: "character"}
+MODELS = {"planet": Planets, "character": Characters}
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(q):
+    return TOKEN_RE.findall(q.lower())
+
+
+def _rank(q, name):
+    # Nombre que empieza por la consulta > palabras que empiezan por ella; los nombres
+    # cortos van antes porque la consulta cubre mas parte del nombre
+    lowered = name.lower()
+    score = len(q) / len(lowered) if lowered else 0
+    if lowered.startswith(q):
+        score += 1
+    return score
+
+
+class SqliteFtsSearch:
+    """
+    FTS5 prefix search. Matches are read best first by bm25 (the `rank`
+    column, which also favours short names) and only the first `candidates`
+    are ranked again in Python, so the cap never drops the best match.
+    """
+    name = "sqlite-fts5"
+
+    def __init__(self, candidates=200):
+        self.candidates = candidates
+
+    def search(self, session, q, limit):
+        tokens = _tokens(q)
+        if not tokens:
+            return []
+        # Cada palabra como prefijo: "luk"* "sky"*
+        match = " ".join('"' + token.replace('"', '""') + '"*' for token in tokens)
+        rows = session.execute(
+            text("SELECT rowid, name FROM search_index WHERE search_index MATCH :match "
+                 "ORDER BY rank LIMIT :candidates"),
+            {"match": match, "candidates": max(self.candidates, limit)},
+        ).all()
+        query = " ".join(tokens)
+        results = [
+            {"type": KINDS[rowid % 2], "id": rowid // 2, "name": name, "score": round(_rank(query, name), 4)}
+            for rowid, name in rows
+        ]
+        results.sort(key=lambda item: (-item["score"], item["name"]))
+        return results[:limit]
+
+
+class PostgresSearch:
+    name = "postgresql-tsvector"
+
+    def search(self, session, q, limit):
+        tokens = _tokens(q)
+        if not tokens:
+            return []
+        query = func.to_tsquery("simple", " & ".join(f"{token}:*" for token in tokens))
+        selects = []
+        for kind, model in MODELS.items():
+            # Misma expresion que el indice GIN para que el planificador lo use
+            vector = func.to_tsvector(literal_column("'simple'"), model.name)
+            selects.append(
+                select(literal(kind).label("type"), model.id.label("id"), model.name.label("name"),
+                       func.ts_rank(vector, query).label("score"))
+                .where(vector.op("@@")(query))
+            )
+        stmt = union_all(*selects).order_by(text("score DESC")).limit(limit)
+        return [
+            {"type": kind, "id": id, "name": name, "score": round(float(score), 4)}
+            for kind, id, name, score in session.execute(stmt).all()
+        ]
+
+
+class TrigramSearch:
+    """
+    Per-process trigram index with the same matching as FTS5: every word of
+    the query is a prefix of some word of the name. Changes committed by this
+    process are applied incrementally; the whole index is rebuilt every
+    `refresh_seconds` to pick up writes made by other workers.
+    """
+    name = "memory-trigram"
+
+    def __init__(self, refresh_seconds=60, candidates=200):
+        self.refresh_seconds = refresh_seconds
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._names = {}
+        self._postings = defaultdict(set)
+
+    @staticmethod
+    def _trigrams(value):
+        # Por palabra, con dos espacios delante y ninguno detras: cada palabra de la
+        # consulta es un prefijo de una palabra del nombre
+        trigrams = set()
+        for token in _tokens(value):
+            token = f"  {token}"
+            trigrams.update(token[i:i + 3] for i in range(len(token) - 2))
+        return trigrams
+
+    @staticmethod
+    def _matches(tokens, name):
+        # Los trigramas solo filtran: "skyw" y "wsky" tienen trigramas en comun
+        words = _tokens(name)
+        return all(any(word.startswith(token) for word in words) for token in tokens)
+
+    def _add(self, key, name):
+        self._names[key] = name
+        for trigram in self._trigrams(name):
+            self._postings[trigram].add(key)
+
+    def _remove(self, key):
+        name = self._names.pop(key, None)
+        if name is not None:
+            for trigram in self._trigrams(name):
+                self._postings[trigram].discard(key)
+
+    def rebuild(self, session):
+        with self._lock:
+            self._names = {}
+            self._postings = defaultdict(set)
+            for kind, model in MODELS.items():
+                for id, name in session.execute(select(model.id, model.name)):
+                    self._add((kind, id), name)
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def apply(self, upserts, deletes):
+        with self._lock:
+            if self._built_at is None:
+                return
+            for key in deletes:
+                self._remove(key)
+            for key, name in upserts.items():
+                self._remove(key)
+                self._add(key, name)
+
+    def search(self, session, q, limit):
+        if self._built_at is None or time.monotonic() - self._built_at > self.refresh_seconds:
+            self.rebuild(session)
+        tokens = _tokens(q)
+        if not tokens:
+            return []
+        query = " ".join(tokens)
+        with self._lock:
+            # Se recorre la lista del trigrama mas raro y se exige que esten todos,
+            # parando al llegar a `candidates` coincidencias
+            postings = sorted((self._postings.get(trigram, set()) for trigram in self._trigrams(query)), key=len)
+            rarest, others = postings[0], postings[1:]
+            matches = []
+            for key in rarest:
+                if all(key in posting for posting in others) and self._matches(tokens, self._names[key]):
+                    matches.append((key, self._names[key]))
+                    if len(matches) >= max(self.candidates, limit):
+                        break
+        results = [
+            {"type": kind, "id": id, "name": name, "score": round(_rank(query, name), 4)}
+            for (kind, id), name in matches
+        ]
+        results.sort(key=lambda item: (-item["score"], item["name"]))
+        return results[:limit]
+
+
+class SearchIndex:
+
+    def __init__(self):
+        self.backend = None
+        self.candidates = 200
+        self.fallback = TrigramSearch()
+
+    def init_app(self, app):
+        self.candidates = app.config['SEARCH_CANDIDATES']
+        self.fallback.candidates = self.candidates
+        self.fallback.refresh_seconds = app.config['SEARCH_FALLBACK_REFRESH']
+        app.extensions['search_index'] = self
+
+    def _backend(self, session):
+        # Se decide una vez por proceso segun el motor y si existe la tabla FTS5
+        if self.backend is None:
+            dialect = session.get_bind().dialect.name
+            if dialect == "postgresql":
+                self.backend = PostgresSearch()
+            elif dialect == "sqlite" and session.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first():
+                self.backend = SqliteFtsSearch(self.candidates)
+            else:
+                self.backend = self.fallback
+        return self.backend
+
+    def search(self, session, q, limit):
+        backend = self._backend(session)
+        return backend.name, backend.search(session, q, limit)
+
+
+search_index = SearchIndex()
+
+
+# El indice en memoria se actualiza con los cambios que confirma este proceso
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session, flush_context):
+    if search_index.backend is not search_index.fallback:
+        return
+    pending = session.info.setdefault('search_pending', {"upserts": {}, "deletes": set()})
+    for obj in list(session.new) + list(session.dirty):
+        kind = getattr(obj, '__tablename__', None)
+        if kind in MODELS:
+            pending["upserts"][(kind, obj.id)] = obj.name
+    for obj in session.deleted:
+        kind = getattr(obj, '__tablename__', None)
+        if kind in MODELS:
+            pending["deletes"].add((kind, obj.id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_statements(orm_execute_state):
+    # Los INSERT/UPDATE/DELETE masivos obligan a reconstruir el indice en memoria
+    if search_index.backend is not search_index.fallback:
+        return
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if orm_execute_state.statement.table.name in MODELS:
+            orm_execute_state.session.info['search_rebuild'] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_on_commit(session):
+    pending = session.info.pop('search_pending', None)
+    if session.info.pop('search_rebuild', False):
+        search_index.fallback.invalidate()
+    elif pending is not None:
+        search_index.fallback.apply(pending["upserts"], pending["deletes"])
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('search_pending', None)
+        session.info.pop('search_rebuild', None)
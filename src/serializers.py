@@ -0,0 +1,76 @@
+"""
+Column-based serialization for the list endpoints.
+
+Each serializer is built once per model: it knows the columns that make up
+the public representation (the same keys as `Model.serialize()`), selects
+them as plain tuples instead of ORM entities, and encodes the resulting
+dicts with orjson when it is installed (stdlib json otherwise).
+Supports sparse fieldsets through `?fields=id,name`.
+"""
+import json
+from flask import Response, request
+from sqlalchemy import select
+from werkzeug.http import http_date
+from utils import APIException
+from models import User, Planets, Characters
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_json(payload):
+    """Encode `payload` to UTF-8 JSON bytes with the fastest available backend."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+class ModelSerializer:
+
+    def __init__(self, model, fields, converters=None):
+        self.model = model
+        self.fields = tuple(fields)
+        self.columns = {name: getattr(model, name) for name in fields}
+        # Conversiones por columna (p. ej. datetime -> fecha HTTP) para no pasar por el default del encoder
+        self.converters = converters or {}
+
+    def parse_fields(self, value=None):
+        """Return the requested fields (?fields=) in declaration order."""
+        value = request.args.get('fields') if value is None else value
+        if not value:
+            return self.fields
+        requested = {name.strip() for name in value.split(",") if name.strip()}
+        unknown = requested - set(self.fields)
+        if unknown:
+            raise APIException(f"Unknown fields: {', '.join(sorted(unknown))}", 400)
+        return tuple(name for name in self.fields if name in requested)
+
+    def select(self, fields, extra=()):
+        # El id (y la columna de orden) van siempre en la consulta, al final si no se
+        # pidieron, porque los usa el cursor de paginacion
+        names = tuple(fields) + tuple(name for name in dict.fromkeys(("id",) + tuple(extra)) if name not in fields)
+        return select(*[self.columns[name].label(name) for name in names])
+
+    def to_dicts(self, rows, fields):
+        # Las columnas llegan en el orden de `fields`; zip ignora el id extra del final
+        converters = [(name, self.converters[name]) for name in fields if name in self.converters]
+        items = [dict(zip(fields, row)) for row in rows]
+        if converters:
+            for item in items:
+                for name, convert in converters:
+                    if item[name] is not None:
+                        item[name] = convert(item[name])
+        return items
+
+    def response(self, rows, fields, status=200, headers=None):
+        return Response(encode_json(self.to_dicts(rows, fields)), status, headers, mimetype="application/json")
+
+
+SERIALIZERS = {
+    User: ModelSerializer(User, ["id", "firstname", "lastname", "created_date", "email"],
+                          converters={"created_date": http_date}),
+    Planets: ModelSerializer(Planets, ["id", "name", "size", "gravity", "version"]),
+    Characters: ModelSerializer(Characters, ["id", "name", "age", "version"]),
+}
@@ -0,0 +1,49 @@
+"""
+Streaming export mode for the list endpoints.
+
+`?stream=ndjson` (or `Accept: application/x-ndjson`) writes one JSON object per
+line, `?stream=json` writes a regular JSON array in chunks. Rows are fetched
+with `yield_per` as plain column tuples, so only one batch is alive at a time
+and peak memory stays flat regardless of the table size.
+"""
+from flask import Response, current_app, request, stream_with_context
+from serializers import encode_json
+
+NDJSON = 'application/x-ndjson'
+
+
+def get_stream_mode():
+    # Devuelve 'ndjson', 'json' o None si el cliente no pidio streaming
+    mode = request.args.get('stream')
+    if mode in ('ndjson', 'json'):
+        return mode
+    if request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON:
+        return 'ndjson'
+    return None
+
+
+def _iter_batches(session, stmt, serializer, fields):
+    # Cada particion es un lote de STREAM_BATCH_SIZE filas ya codificadas
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+    result = session.execute(stmt.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield [encode_json(item) for item in serializer.to_dicts(partition, fields)]
+
+
+def stream_rows(session, stmt, serializer, fields, mode):
+    """Return a generator response that writes every row of `stmt`."""
+    def generate_ndjson():
+        for batch in _iter_batches(session, stmt, serializer, fields):
+            yield b"".join(item + b"\n" for item in batch)
+
+    def generate_json():
+        yield b"["
+        separator = b""
+        for batch in _iter_batches(session, stmt, serializer, fields):
+            yield separator + b",".join(batch)
+            separator = b","
+        yield b"]"
+
+    if mode == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype=NDJSON)
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
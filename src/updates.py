@@ -0,0 +1,89 @@
+"""
+Single-row updates for the PUT and PATCH handlers of Characters and Planets.
+
+One UPDATE sets the new values, bumps the row's `version` and returns the
+public columns in the same round trip (UPDATE ... RETURNING on SQLite >= 3.35,
+PostgreSQL and MariaDB); other databases get one SELECT afterwards.
+
+Optimistic concurrency is opt-in: when the body carries the "version" the
+client read, the UPDATE only matches that version, and a write based on a
+stale copy gets 409 with the current version instead of silently
+overwriting the other client's change. Edits made through the ORM
+(Flask-Admin) and bulk updates bump the version as well.
+"""
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import object_session
+from bulk import BULK_FIELDS, valid_value
+from serializers import SERIALIZERS
+from models import Planets, Characters
+
+
+class UpdateConflict(Exception):
+
+    def __init__(self, current_version):
+        Exception.__init__(self)
+        self.current_version = current_version
+
+
+def parse_changes(model, body, partial):
+    """
+    Validate a PUT (every field required) or PATCH (`partial`, any subset)
+    body. Return (changes, expected version or None, error message or None).
+    """
+    fields = BULK_FIELDS[model]
+    if not isinstance(body, dict):
+        return None, None, "Wrong request"
+    # El id se acepta (el cliente puede reenviar lo que leyo) pero no se cambia
+    unknown = set(body) - set(fields) - {"id", "version"}
+    if unknown:
+        return None, None, f"Unknown fields: {', '.join(sorted(unknown))}"
+    if not partial and set(fields) - set(body):
+        return None, None, f"Missing fields: {', '.join(sorted(set(fields) - set(body)))}"
+    changes = {name: body[name] for name in fields if name in body}
+    if not changes:
+        return None, None, "Nothing to update"
+    for name, value in changes.items():
+        if not valid_value(value, fields[name]):
+            return None, None, f"Invalid {name}"
+    version = body.get("version")
+    if version is not None and type(version) is not int:
+        return None, None, "Invalid version"
+    return changes, version, None
+
+
+def update_entity(session, model, pk, changes, version=None):
+    """
+    Apply `changes` to row `pk` and return its new representation, or None
+    if it does not exist. Raises UpdateConflict when `version` is given and
+    the row has moved on.
+    """
+    serializer = SERIALIZERS[model]
+    # Nada que sincronizar: el handler no ha cargado la fila en la sesion
+    stmt = (
+        update(model).where(model.id == pk)
+        .values(**changes, version=model.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if version is not None:
+        stmt = stmt.where(model.version == version)
+    if session.get_bind().dialect.update_returning:
+        row = session.execute(stmt.returning(*serializer.columns.values())).first()
+    else:
+        row = None
+        if session.execute(stmt).rowcount:
+            row = session.execute(serializer.select(serializer.fields).where(model.id == pk)).first()
+    if row is not None:
+        return serializer.to_dicts([row], serializer.fields)[0]
+    # No ha cambiado ninguna fila: o no existe o la version no coincide
+    current = session.execute(select(model.version).where(model.id == pk)).scalar()
+    if current is None:
+        return None
+    raise UpdateConflict(current)
+
+
+@event.listens_for(Planets, "before_update")
+@event.listens_for(Characters, "before_update")
+def _bump_version(mapper, connection, target):
+    # Ediciones por el ORM (Flask-Admin): solo si cambia alguna columna, no las relaciones
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = mapper.class_.version + 1
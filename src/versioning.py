@@ -0,0 +1,152 @@
+"""
+Per-table version counters used to answer conditional GETs.
+
+Every commit that touches user, planet, character or favoritos bumps the
+matching row of `table_versions` inside the same transaction. Favorites are
+also versioned per user ("favoritos:user:<id>"). A GET can then build a
+strong ETag and a Last-Modified date from one primary-key lookup and reply
+304 Not Modified without reading or serializing any row.
+"""
+import datetime
+import hashlib
+from flask import request
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+from models import favoritos, table_versions
+
+VERSIONED_TABLES = {"user", "planet", "character", "favoritos"}
+
+
+def favorites_key(user_id):
+    return f"favoritos:user:{user_id}"
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _pending(session):
+    return session.info.setdefault('versions_pending', set())
+
+
+def _favoritos_user_ids(orm_execute_state):
+    # Usuarios afectados por un INSERT/DELETE sobre favoritos, o None si no se sabe
+    if orm_execute_state.is_insert:
+        parameters = orm_execute_state.parameters
+        rows = parameters if isinstance(parameters, list) else [parameters or {}]
+        user_ids = {row.get("user_id") for row in rows}
+        return None if None in user_ids else user_ids
+    user_ids = set()
+    whereclause = orm_execute_state.statement.whereclause
+    if whereclause is not None:
+        for element in visitors.iterate(whereclause):
+            if (isinstance(element, BinaryExpression) and element.operator is operators.eq
+                    and element.left is favoritos.c.user_id and isinstance(element.right, BindParameter)):
+                user_ids.add(element.right.value)
+    return user_ids or None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table in VERSIONED_TABLES:
+            _pending(session).add(table)
+            # Flask-Admin puede cambiar los favoritos a traves de las relaciones de User
+            if table == "user" and obj.id is not None:
+                _pending(session).add(favorites_key(obj.id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statements(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = orm_execute_state.statement.table.name
+    if table not in VERSIONED_TABLES:
+        return
+    if table != "favoritos":
+        _pending(orm_execute_state.session).add(table)
+        return
+    user_ids = _favoritos_user_ids(orm_execute_state)
+    if user_ids is None:
+        # No sabemos que usuarios han cambiado: se invalidan los favoritos de todos
+        _pending(orm_execute_state.session).add("favoritos")
+    else:
+        _pending(orm_execute_state.session).update(favorites_key(user_id) for user_id in user_ids)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session):
+    # Los savepoints no cuentan: se versiona al confirmar la transaccion exterior
+    if session.in_nested_transaction():
+        return
+    session.flush()
+    names = session.info.pop('versions_pending', None)
+    if names:
+        bump_versions(session, sorted(names))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('versions_pending', None)
+
+
+def bump_versions(session, names):
+    now = _utcnow()
+    for name in names:
+        updated = session.execute(
+            update(table_versions).where(table_versions.c.name == name)
+            .values(version=table_versions.c.version + 1, updated_at=now)
+        ).rowcount
+        if updated:
+            continue
+        # Primera vez que se versiona este nombre (p. ej. favoritos de un usuario nuevo)
+        try:
+            with session.begin_nested():
+                session.execute(table_versions.insert().values(name=name, version=1, updated_at=now))
+        except IntegrityError:
+            session.execute(
+                update(table_versions).where(table_versions.c.name == name)
+                .values(version=table_versions.c.version + 1, updated_at=now)
+            )
+
+
+def conditional_get(session, names):
+    """
+    Return (not_modified, headers) for a GET whose payload depends on the
+    given version names. The ETag also covers the query string, so every
+    page / filter combination gets its own validator.
+    """
+    return check_versions(session.execute(versions_statement(names)).all(), names)
+
+
+def versions_statement(names):
+    return (
+        select(table_versions.c.name, table_versions.c.version, table_versions.c.updated_at)
+        .where(table_versions.c.name.in_(names))
+    )
+
+
+def check_versions(rows, names):
+    """Build the validators from the `versions_statement` rows; see `conditional_get`."""
+    versions = {name: (version, updated_at) for name, version, updated_at in rows}
+    signature = ";".join(f"{name}={versions.get(name, (0, None))[0]}" for name in names)
+    digest = hashlib.sha1(f"{signature}|{request.full_path}".encode()).hexdigest()[:20]
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    updated = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+    last_modified = max(updated).replace(microsecond=0, tzinfo=datetime.timezone.utc) if updated else None
+    if last_modified is not None:
+        headers["Last-Modified"] = last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+    # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(digest), headers
+    if request.if_modified_since is not None and last_modified is not None:
+        return last_modified <= request.if_modified_since, headers
+    return False, headers
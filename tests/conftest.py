@@ -0,0 +1,64 @@
+"""
+Fixtures for the API tests: every test gets its own app from create_app()
+on an in-memory SQLite database, with the schema created from the models.
+Rate limiting, compression, the admin and the migrations command are off
+unless a test turns them on.
+"""
+import datetime
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from app import create_app
+from models import db, User, Planets, Characters
+
+TEST_CONFIG = {
+    "TESTING": True,
+    "SQLALCHEMY_DATABASE_URI": "sqlite://",
+    "CACHE_BACKEND": "memory",
+    "QUERY_TRACKING": "raise",
+    "ADMIN_ENABLED": False,
+    "MIGRATIONS_ENABLED": False,
+    "COMPRESSION_ENABLED": False,
+    "RATELIMIT_ENABLED": False,
+}
+
+
+@pytest.fixture
+def make_app():
+    """create_app() with TEST_CONFIG plus the given overrides, schema included."""
+    apps = []
+
+    def factory(**config):
+        app = create_app({**TEST_CONFIG, **config})
+        with app.app_context():
+            db.create_all()
+        apps.append(app)
+        return app
+
+    yield factory
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def seed(app, planets=5, characters=5, users=1):
+    """Insert numbered planets, characters and users; ids start at 1."""
+    with app.app_context():
+        db.session.add_all([Planets(name=f"Planet {i}", size=i * 10, gravity=i % 2 == 0) for i in range(1, planets + 1)])
+        db.session.add_all([Characters(name=f"Character {i}", age=20 + i) for i in range(1, characters + 1)])
+        db.session.add_all([User(firstname=f"First {i}", lastname=f"Last {i}", email=f"user{i}@rebels.org",
+                                 password="x", created_date=datetime.datetime(2024, 1, i)) for i in range(1, users + 1)])
+        db.session.commit()
@@ -0,0 +1,27 @@
+import pytest
+from conftest import seed
+from admin import PlanetView, create_admin_app
+
+
+@pytest.fixture
+def planet_view(app):
+    seed(app, planets=12)
+    admin_app = create_admin_app(app)
+    view = next(view for view in admin_app.extensions['admin'][0]._views if isinstance(view, PlanetView))
+    with admin_app.app_context():
+        yield view
+
+
+def names(view, search):
+    count, rows = view.get_list(0, None, False, search, None)
+    return sorted(row.name for row in rows)
+
+
+def test_search_is_one_prefix(planet_view):
+    # "Planet 1" no son dos prefijos ("Planet" y "1") que ningun nombre cumple a la vez
+    assert names(planet_view, "Planet 1") == ["Planet 1", "Planet 10", "Planet 11", "Planet 12"]
+    assert names(planet_view, "  Planet 2 ") == ["Planet 2"]
+
+
+def test_blank_search_lists_everything(planet_view):
+    assert len(names(planet_view, "   ")) == 12
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import pytest
+from conftest import seed
+
+
+@pytest.fixture(scope="module")
+def asgi(tmp_path_factory):
+    """asgi.py on a SQLite file, with a before_request hook that counts its calls."""
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv("DATABASE_URL", f"sqlite:///{tmp_path_factory.mktemp('asgi') / 'asgi.db'}")
+        for name in ("ADMIN_ENABLED", "MIGRATIONS_ENABLED", "COMPRESSION_ENABLED", "RATELIMIT_ENABLED"):
+            env.setenv(name, "false")
+        env.setenv("CACHE_BACKEND", "null")
+        import asgi
+    from models import db
+    app = asgi.app
+    app.hook_calls = 0
+
+    def count_hook():
+        app.hook_calls += 1
+    app.before_request(count_hook)
+    with app.app_context():
+        db.create_all()
+    seed(app)
+    return asgi
+
+
+def get(asgi, path, query=b""):
+    """Run one GET through the ASGI app; returns (status, headers, body)."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": query, "root_path": "",
+             "headers": [(b"host", b"localhost")], "http_version": "1.1", "scheme": "http", "server": ("localhost", 80)}
+    asyncio.run(asgi.application(scope, receive, send))
+    headers = {name.decode(): value.decode() for name, value in sent[0]["headers"]}
+    return sent[0]["status"], headers, b"".join(message.get("body", b"") for message in sent[1:])
+
+
+@pytest.mark.parametrize("query", [b"", b"stream=ndjson"])
+def test_before_request_hooks_run_once(asgi, query):
+    asgi.app.hook_calls = 0
+    status, headers, body = get(asgi, "/planets", query)
+    assert status == 200
+    assert asgi.app.hook_calls == 1
+
+
+def test_stream_exports_are_served_by_flask(asgi):
+    status, headers, body = get(asgi, "/planets", b"stream=ndjson")
+    assert headers["content-type"].startswith("application/x-ndjson")
+    assert len(body.splitlines()) == 5
+
+
+@pytest.mark.parametrize("path, query", [
+    ("/people", b"limit=2"), ("/planets", b"order=-size&limit=3"), ("/users/1", b""),
+    ("/planets/99", b""), ("/users/1/favorites", b""), ("/people", b"age__lt=x"),
+])
+def test_native_routes_answer_like_flask(asgi, path, query):
+    status, headers, body = get(asgi, path, query)
+    expected = asgi.app.test_client().get(path, query_string=query.decode())
+    assert status == expected.status_code
+    assert json.loads(body) == expected.json
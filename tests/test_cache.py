@@ -0,0 +1,62 @@
+import json
+import sqlite3
+import pytest
+from conftest import seed
+from cache import RedisCache, entity_cache
+from models import Planets
+
+
+def test_detail_get_fills_the_cache(app, client):
+    seed(app)
+    assert client.get("/planets/1").status_code == 200
+    assert entity_cache.get(Planets, 1)["name"] == "Planet 1"
+    # Segunda lectura desde la cache: ninguna consulta
+    assert 'desc="0 queries"' in client.get("/planets/1").headers["Server-Timing"]
+
+
+def test_update_invalidates_the_entry(app, client):
+    seed(app)
+    client.get("/planets/1")
+    assert client.patch("/planet/1", json={"name": "Hoth"}).status_code == 200
+    assert entity_cache.get(Planets, 1) is None
+    assert client.get("/planets/1").json["name"] == "Hoth"
+
+
+def test_rollback_keeps_the_entry(app, client):
+    seed(app)
+    client.get("/planets/1")
+    # Version antigua: 409 y rollback, la entrada sigue siendo valida
+    assert client.patch("/planet/1", json={"name": "Hoth", "version": 99}).status_code == 409
+    assert entity_cache.get(Planets, 1)["name"] == "Planet 1"
+
+
+def test_failed_shared_invalidation_does_not_fail_the_write(make_app, tmp_path, monkeypatch):
+    app = make_app(CACHE_BACKEND="shared", CACHE_SHARED_PATH=str(tmp_path / "cache.sqlite"))
+    seed(app)
+    client = app.test_client()
+    client.get("/planets/1")
+
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(entity_cache.backend, "_connection", locked)
+    assert client.patch("/planet/1", json={"name": "Hoth"}).status_code == 200
+    assert client.delete("/planets?ids=2,3").status_code == 200
+    assert entity_cache.backend.errors >= 2
+
+
+def test_failed_redis_invalidation_is_counted():
+    redis = pytest.importorskip("redis")
+
+    class BrokenRedis:
+        """redis-py client whose every call times out."""
+
+        def __getattr__(self, name):
+            def fail(*args, **kwargs):
+                raise redis.RedisError("Timeout reading from socket")
+            return fail
+
+    backend = RedisCache(BrokenRedis(), 60, json.dumps, json.loads)
+    backend.delete(["planet:1"])
+    backend.delete_prefix("planet:")
+    assert backend.errors == 2
@@ -0,0 +1,24 @@
+from conftest import seed
+
+
+def test_matching_etag_returns_304(app, client):
+    seed(app)
+    etag = client.get("/planets").headers["ETag"]
+    response = client.get("/planets", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_write_changes_the_etag(app, client):
+    seed(app)
+    etag = client.get("/planets").headers["ETag"]
+    assert client.patch("/planet/1", json={"name": "Tatooine"}).status_code == 200
+    response = client.get("/planets", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json[0]["name"] == "Tatooine"
+
+
+def test_etag_depends_on_the_query_string(app, client):
+    seed(app)
+    assert client.get("/planets?limit=1").headers["ETag"] != client.get("/planets?limit=2").headers["ETag"]
@@ -0,0 +1,31 @@
+from conftest import seed
+from cache import entity_cache
+from models import Planets
+
+
+def test_delete_by_id_invalidates_only_that_row(app, client):
+    seed(app)
+    client.get("/planets/1")
+    client.get("/planets/2")
+    assert client.delete("/planet/2").status_code == 200
+    assert entity_cache.get(Planets, 2) is None
+    assert entity_cache.get(Planets, 1) is not None
+
+
+def test_bulk_delete_invalidates_only_the_listed_rows(app, client):
+    seed(app)
+    for pk in (1, 2, 3):
+        client.get(f"/planets/{pk}")
+    assert client.delete("/planets?ids=1,3").status_code == 200
+    assert entity_cache.get(Planets, 1) is None
+    assert entity_cache.get(Planets, 3) is None
+    assert entity_cache.get(Planets, 2) is not None
+
+
+def test_update_statement_invalidates_only_that_row(app, client):
+    seed(app)
+    client.get("/planets/1")
+    client.get("/planets/2")
+    assert client.patch("/planet/1", json={"size": 99}).status_code == 200
+    assert entity_cache.get(Planets, 1) is None
+    assert entity_cache.get(Planets, 2) is not None
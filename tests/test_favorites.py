@@ -0,0 +1,64 @@
+import pytest
+from conftest import seed
+from models import db, Planets
+import favorites
+
+
+def favorite_count(app, planet_id):
+    with app.app_context():
+        return db.session.get(Planets, planet_id).favorite_count
+
+
+def test_adding_twice_counts_once(app, client):
+    seed(app)
+    assert client.post("/favorite/planet/1", json={"user_id": 1}).status_code == 200
+    response = client.post("/favorite/planet/1", json={"user_id": 1})
+    assert "already a favorite" in response.json["message"]
+    assert favorite_count(app, 1) == 1
+
+
+def test_adding_twice_counts_once_without_insert_ignore(app, client, monkeypatch):
+    # Camino de los motores sin INSERT ... ON CONFLICT fiable (MySQL): savepoint + IntegrityError
+    monkeypatch.setattr(favorites, "_insert_ignore", lambda dialect_name: None)
+    seed(app)
+    client.post("/favorite/planet/1", json={"user_id": 1})
+    response = client.post("/favorite/planet/1", json={"user_id": 1})
+    assert "already a favorite" in response.json["message"]
+    assert favorite_count(app, 1) == 1
+
+
+@pytest.mark.parametrize("path", ["/favorite/planet/99", "/favorite/people/99"])
+def test_missing_target_is_404(app, client, path):
+    seed(app)
+    assert client.post(path, json={"user_id": 1}).status_code == 404
+
+
+def test_favorites_list_the_same_fields_as_the_entities(app, client):
+    seed(app)
+    client.post("/favorite/planet/2", json={"user_id": 1})
+    client.post("/favorite/people/3", json={"user_id": 1})
+    client.patch("/planet/2", json={"name": "Edited"})
+    favorites = client.get("/users/1/favorites").json
+    assert favorites["favourite_planets"] == [client.get("/planets/2").json]
+    assert favorites["favorite_people"] == [client.get("/people/3").json]
+    assert favorites["favourite_planets"][0]["version"] == 2
+
+
+def test_reconcile_command_repairs_drift(app, client):
+    seed(app)
+    client.post("/favorite/planet/1", json={"user_id": 1})
+    with app.app_context():
+        db.session.get(Planets, 1).favorite_count = 5
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=["reconcile-favorites"])
+    assert result.exit_code == 0
+    assert "planet: 1 counters repaired" in result.output
+    assert favorite_count(app, 1) == 1
+
+
+@pytest.mark.parametrize("path", ["/favorite/planet/1", "/favorite/people/1"])
+@pytest.mark.parametrize("user_id", [True, False, "1", 1.0])
+def test_user_id_must_be_an_integer(app, client, path, user_id):
+    seed(app)
+    assert client.post(path, json={"user_id": user_id}).status_code == 400
+    assert favorite_count(app, 1) == 0
@@ -0,0 +1,24 @@
+import pytest
+from conftest import seed
+
+
+def test_filters_and_order(app, client):
+    seed(app, planets=6)
+    response = client.get("/planets?gravity=true&size__gte=30&order=-size")
+    assert [planet["size"] for planet in response.json] == [60, 40]
+
+
+@pytest.mark.parametrize("query", ["size__between=1", "favorite_count=3", "version=2", "name__gt=A", "color__eq=red"])
+def test_filter_like_parameters_are_rejected(app, client, query):
+    seed(app)
+    response = client.get(f"/planets?{query}")
+    assert response.status_code == 400
+    assert "Unknown filter" in response.json["message"]
+
+
+@pytest.mark.parametrize("query", ["_=123", "utm_source=mail", "__debug=1", "callback=cb"])
+def test_other_parameters_are_ignored(app, client, query):
+    seed(app, planets=3)
+    response = client.get(f"/planets?{query}")
+    assert response.status_code == 200
+    assert len(response.json) == 3
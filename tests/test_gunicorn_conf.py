@@ -0,0 +1,34 @@
+import os
+import runpy
+import pytest
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+@pytest.fixture
+def env(monkeypatch):
+    # setenv antes de delenv: monkeypatch restaura tambien lo que el fichero anada
+    for name in ("WEB_CONCURRENCY", "CACHE_BACKEND", "RATELIMIT_BACKEND"):
+        monkeypatch.setenv(name, "")
+        monkeypatch.delenv(name)
+    return monkeypatch
+
+
+def test_one_worker_keeps_the_memory_backends(env):
+    assert runpy.run_path(CONFIG)["workers"] == 1
+    assert "CACHE_BACKEND" not in os.environ
+    assert "RATELIMIT_BACKEND" not in os.environ
+
+
+def test_several_workers_share_the_cache_and_the_rate_limits(env):
+    env.setenv("WEB_CONCURRENCY", "3")
+    assert runpy.run_path(CONFIG)["workers"] == 3
+    assert os.environ["CACHE_BACKEND"] == "shared"
+    assert os.environ["RATELIMIT_BACKEND"] == "shared"
+
+
+def test_explicit_backends_are_kept(env):
+    env.setenv("WEB_CONCURRENCY", "3")
+    env.setenv("CACHE_BACKEND", "redis")
+    runpy.run_path(CONFIG)
+    assert os.environ["CACHE_BACKEND"] == "redis"
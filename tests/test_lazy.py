@@ -0,0 +1,35 @@
+"""
+Flask-Admin and Flask-Migrate (and what they pull in) must not be imported
+by create_app(). Checked in a fresh interpreter: this one has already
+imported the admin for test_admin.py.
+"""
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+LAZY_MODULES = ("flask_admin", "wtforms", "flask_migrate", "alembic", "flask_swagger")
+
+
+def loaded_after(tmp_path, code):
+    """Run `code` after `import wsgi` in a new process; the lazy modules it ended up importing."""
+    script = (f"import json, sys, wsgi\n{code}\n"
+              f"print(json.dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))")
+    env = {**os.environ, "PYTHONPATH": SRC_DIR, "DATABASE_URL": f"sqlite:///{tmp_path / 'lazy.db'}",
+           "ADMIN_ENABLED": "true", "MIGRATIONS_ENABLED": "true"}
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_create_app_does_not_import_the_admin_or_migrations(tmp_path):
+    assert loaded_after(tmp_path, "") == []
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("wsgi.application.test_client().get('/admin/')", ["flask_admin", "wtforms"]),
+    ("wsgi.application.test_cli_runner().invoke(args=['db', '--help'])", ["flask_migrate", "alembic"]),
+])
+def test_first_use_loads_them(tmp_path, code, expected):
+    assert set(expected) <= set(loaded_after(tmp_path, code))
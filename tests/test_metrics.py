@@ -0,0 +1,23 @@
+import re
+from conftest import seed
+
+
+def rows_sum(client, route, method="GET"):
+    text = client.get("/metrics").get_data(as_text=True)
+    match = re.search(rf'http_request_rows_sum\{{route="{re.escape(route)}",method="{method}"\}} (\S+)', text)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_rows_counts_the_rows_read(app, client):
+    seed(app, planets=7)
+    before = rows_sum(client, "/planets")
+    client.get("/planets?limit=3")
+    # limit + 1 filas para saber si hay pagina siguiente, y la version de la tabla (ETag)
+    assert rows_sum(client, "/planets") - before == 5
+
+
+def test_rows_counts_the_rows_written(app, client):
+    seed(app, planets=5)
+    before = rows_sum(client, "/planets", "DELETE")
+    assert client.delete("/planets?ids=1,2,3").status_code == 200
+    assert rows_sum(client, "/planets", "DELETE") - before >= 3
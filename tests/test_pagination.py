@@ -0,0 +1,35 @@
+from conftest import seed
+
+
+def test_keyset_pages_follow_the_next_cursor(app, client):
+    seed(app, planets=5)
+    first = client.get("/planets?limit=2")
+    assert [row["id"] for row in first.json] == [1, 2]
+    assert first.headers["X-Next-Cursor"] == "2"
+
+    second = client.get("/planets?limit=2&after_id=2")
+    assert [row["id"] for row in second.json] == [3, 4]
+    last = client.get("/planets?limit=2&after_id=4")
+    assert [row["id"] for row in last.json] == [5]
+    assert "X-Next-Cursor" not in last.headers
+
+
+def test_link_header_points_to_the_next_page(app, client):
+    seed(app, planets=3)
+    response = client.get("/planets?limit=2")
+    assert response.headers["Link"] == '<http://localhost/planets?limit=2&after_id=2>; rel="next"'
+
+
+def test_ordered_pages_use_an_opaque_cursor(app, client):
+    seed(app, characters=5)
+    first = client.get("/people?order=-age&limit=3")
+    assert [row["id"] for row in first.json] == [5, 4, 3]
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get(f"/people?order=-age&limit=3&cursor={cursor}")
+    assert [row["id"] for row in second.json] == [2, 1]
+
+
+def test_invalid_page_arguments(app, client):
+    assert client.get("/planets?limit=0").status_code == 400
+    assert client.get("/planets?after_id=x").status_code == 400
+    assert client.get("/people?order=age&cursor=nope").status_code == 400
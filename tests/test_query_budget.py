@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import select
+from conftest import seed
+from models import db, Planets
+from querybudget import QueryBudgetExceeded, query_budget
+
+
+def test_detail_route_stays_within_its_budget(app, client):
+    seed(app)
+    response = client.get("/planets/1")
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith('sql;dur=')
+    assert 'desc="1 queries"' in response.headers["Server-Timing"]
+
+
+def test_over_budget_raises(app, client):
+    @query_budget(1)
+    def two_queries():
+        db.session.execute(select(Planets.id)).all()
+        db.session.execute(select(Planets.name)).all()
+        return {}
+
+    app.add_url_rule("/two-queries", view_func=two_queries)
+    with pytest.raises(QueryBudgetExceeded, match="2 queries, budget is 1"):
+        client.get("/two-queries")
+
+
+def test_repeated_statement_is_reported_as_n_plus_one(app, client):
+    seed(app)
+
+    def loop():
+        for pk in (1, 2, 3):
+            db.session.execute(select(Planets.name).where(Planets.id == pk)).all()
+        return {}
+
+    app.add_url_rule("/loop", view_func=loop)
+    with pytest.raises(QueryBudgetExceeded, match="possible N\\+1, 3x"):
+        client.get("/loop")
+
+
+def test_each_app_counts_its_queries_once(make_app):
+    # create_app() varias veces no debe duplicar los listeners de SQL
+    apps = [make_app(CACHE_BACKEND="null"), make_app(CACHE_BACKEND="null", QUERY_TRACKING="warn")]
+    for app in apps:
+        seed(app)
+    for app in apps:
+        response = app.test_client().get("/planets/1")
+        assert response.status_code == 200
+        assert 'desc="1 queries"' in response.headers["Server-Timing"]
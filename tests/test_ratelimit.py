@@ -0,0 +1,60 @@
+from conftest import seed
+
+
+def test_empty_bucket_returns_429_with_retry_after(make_app):
+    app = make_app(RATELIMIT_ENABLED=True, RATELIMIT_RATE=1.0, RATELIMIT_BURST=3)
+    seed(app)
+    client = app.test_client()
+    statuses = [client.get("/planets/1", environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    response = client.get("/planets/1", environ_base={"REMOTE_ADDR": "10.0.0.1"})
+    assert response.headers["Retry-After"] == "1"
+    # Otro cliente tiene su propio cubo
+    assert client.get("/planets/1", environ_base={"REMOTE_ADDR": "10.0.0.2"}).status_code == 200
+
+
+def test_route_cost_is_charged(make_app):
+    app = make_app(RATELIMIT_ENABLED=True, RATELIMIT_RATE=1.0, RATELIMIT_BURST=4)
+    seed(app)
+    client = app.test_client()
+    # /planets cuesta 2 tokens
+    statuses = [client.get("/planets", environ_base={"REMOTE_ADDR": "10.0.1.1"}).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_queued_too_long_is_shed(make_app):
+    app = make_app(RATELIMIT_ENABLED=True, RATELIMIT_MAX_QUEUE_MS=1000)
+    seed(app)
+    response = app.test_client().get("/planets/1", headers={"X-Request-Start": "t=1000000000.000"},
+                                     environ_base={"REMOTE_ADDR": "10.0.2.1"})
+    assert response.status_code == 503
+
+
+def test_stats_routes_are_exempt(make_app):
+    app = make_app(RATELIMIT_ENABLED=True, RATELIMIT_RATE=1.0, RATELIMIT_BURST=1)
+    client = app.test_client()
+    statuses = {client.get("/ratelimit/stats", environ_base={"REMOTE_ADDR": "10.0.3.1"}).status_code for _ in range(3)}
+    assert statuses == {200}
+
+
+def test_changing_the_authorization_header_does_not_reset_the_bucket(make_app):
+    # La cabecera no se verifica: el cliente se identifica por su IP
+    app = make_app(RATELIMIT_ENABLED=True, RATELIMIT_RATE=1.0, RATELIMIT_BURST=5)
+    seed(app)
+    client = app.test_client()
+    statuses = [client.get("/planets/1", headers={"Authorization": f"Bearer {i}"},
+                           environ_base={"REMOTE_ADDR": "10.0.4.1"}).status_code for i in range(8)]
+    assert statuses.count(200) == 5
+    assert statuses[5:] == [429, 429, 429]
+
+
+def test_client_behind_trusted_proxy_is_keyed_on_forwarded_address(make_app):
+    app = make_app(RATELIMIT_ENABLED=True, RATELIMIT_RATE=1.0, RATELIMIT_BURST=1, RATELIMIT_TRUSTED_PROXIES=1)
+    seed(app)
+    client = app.test_client()
+
+    def get(forwarded):
+        return client.get("/planets/1", headers={"X-Forwarded-For": forwarded},
+                          environ_base={"REMOTE_ADDR": "10.0.5.1"}).status_code
+
+    assert [get("203.0.113.1"), get("203.0.113.1"), get("203.0.113.2")] == [200, 429, 200]
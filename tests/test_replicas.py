@@ -0,0 +1,104 @@
+import pytest
+from models import db, Planets
+from sqlalchemy import select
+from replicas import SharedLastWrite, current_replica, replica_router
+
+
+@pytest.fixture
+def replicated_app(make_app, tmp_path):
+    """Primary and replica on two SQLite files; the replica has other names in its rows."""
+    app = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+                   DATABASE_REPLICA_URLS=[f"sqlite:///{tmp_path / 'replica.db'}"],
+                   REPLICA_STICKY_SECONDS=60.0, CACHE_BACKEND="null")
+    with app.app_context():
+        db.session.add(Planets(name="Primary", size=1, gravity=True))
+        db.session.commit()
+    replica = replica_router.replicas[0]
+    db.metadata.create_all(replica.engine)
+    with replica.engine.begin() as connection:
+        connection.execute(Planets.__table__.insert(), [{"name": "Replica", "size": 1, "gravity": True}])
+    replica_router.check(replica)
+    yield app
+    replica.engine.dispose()
+
+
+def read(app, address):
+    return app.test_client().get("/planets/1", environ_base={"REMOTE_ADDR": address}).json["name"]
+
+
+def test_reads_go_to_the_replica(replicated_app):
+    assert read(replicated_app, "10.1.0.1") == "Replica"
+    assert replica_router.replicas[0].reads == 1
+
+
+def test_writes_go_to_the_primary_and_pin_the_writer(replicated_app):
+    writer = replicated_app.test_client()
+    response = writer.patch("/planet/1", json={"name": "Edited"}, environ_base={"REMOTE_ADDR": "10.1.0.2"})
+    assert response.status_code == 200
+    assert "read_primary_until=" in response.headers["Set-Cookie"]
+    # Con la cookie y sin ella (misma IP) el que escribio lee del primario
+    assert writer.get("/planets/1", environ_base={"REMOTE_ADDR": "10.1.0.2"}).json["name"] == "Edited"
+    assert read(replicated_app, "10.1.0.2") == "Edited"
+    # Los demas siguen leyendo de la replica
+    assert read(replicated_app, "10.1.0.3") == "Replica"
+
+
+def test_unhealthy_replica_falls_back_to_the_primary(replicated_app):
+    replica_router.replicas[0].healthy = False
+    assert read(replicated_app, "10.1.0.4") == "Primary"
+
+
+def test_replica_reads_do_not_fill_the_cache_after_a_write_elsewhere(make_app, tmp_path):
+    from cache import entity_cache
+    import time
+    app = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+                   DATABASE_REPLICA_URLS=[f"sqlite:///{tmp_path / 'replica.db'}"],
+                   CACHE_BACKEND="shared", CACHE_SHARED_PATH=str(tmp_path / "cache.sqlite"))
+    replica = replica_router.replicas[0]
+    db.metadata.create_all(replica.engine)
+    with replica.engine.begin() as connection:
+        connection.execute(Planets.__table__.insert(), [{"name": "Replica", "size": 1, "gravity": True}])
+    replica_router.check(replica)
+    # Otro worker acaba de escribir: solo lo sabe el fichero compartido
+    SharedLastWrite(str(tmp_path / "cache.sqlite")).set(time.time())
+    assert read(app, "10.1.0.5") == "Replica"
+    assert entity_cache.get(Planets, 1) is None
+    # Ni vaciar la cache ni las lecturas de la hora de escritura cuentan en sus estadisticas
+    misses = entity_cache.stats()["misses"]
+    entity_cache.backend._connection().execute("DELETE FROM cache")
+    read(app, "10.1.0.5")
+    assert entity_cache.get(Planets, 1) is None
+    assert entity_cache.stats()["misses"] == misses + 2
+    replica.engine.dispose()
+
+
+def test_replica_reads_are_cached_after_the_window(make_app, tmp_path):
+    from cache import entity_cache
+    import time
+    app = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+                   DATABASE_REPLICA_URLS=[f"sqlite:///{tmp_path / 'replica.db'}"], CACHE_BACKEND="memory")
+    replica = replica_router.replicas[0]
+    db.metadata.create_all(replica.engine)
+    with replica.engine.begin() as connection:
+        connection.execute(Planets.__table__.insert(), [{"name": "Replica", "size": 1, "gravity": True}])
+    replica_router.check(replica)
+    replica_router.last_write.set(time.time())
+    read(app, "10.1.0.6")
+    assert entity_cache.get(Planets, 1) is None
+    replica_router.last_write.value = time.time() - 60
+    read(app, "10.1.0.6")
+    assert entity_cache.get(Planets, 1)["name"] == "Replica"
+    replica.engine.dispose()
+
+
+def test_flushes_go_to_the_primary(replicated_app):
+    with replicated_app.test_request_context("/planets/1", environ_base={"REMOTE_ADDR": "10.1.0.7"}):
+        replicated_app.preprocess_request()
+        assert current_replica() is not None
+        planet = db.session.get(Planets, 1)
+        assert planet.name == "Replica"
+        db.session.add(Planets(name="Flushed", size=2, gravity=False))
+        db.session.flush()
+        # Tras el flush, tambien lo que se lee sale del primario
+        assert db.session.scalars(select(Planets.name).order_by(Planets.id)).all() == ["Primary", "Flushed"]
+        db.session.rollback()
@@ -0,0 +1,59 @@
+import importlib.util
+import os
+import pytest
+from sqlalchemy import text
+from models import db, Planets, Characters
+from search import SqliteFtsSearch, TrigramSearch
+
+MIGRATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "migrations", "versions", "7968d180e3af_.py")
+NAMES = {
+    Characters: ["Luke Skywalker", "Anakin Skywalker", "Leia Organa", "Han Solo", "Lando Calrissian"],
+    Planets: ["Tatooine", "Skyhook Station", "Hoth", "Naboo", "Alderaan"],
+}
+QUERIES = ["sky", "skywalker", "walker", "luke sky", "sky luke", "l", "la", "ta", "organa leia", "xyz"]
+
+
+@pytest.fixture
+def fts_app(app):
+    """App whose database also has the FTS5 table and triggers of the migration."""
+    spec = importlib.util.spec_from_file_location("search_migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with app.app_context():
+        for statement in migration.SQLITE_UPGRADE:
+            db.session.execute(text(statement))
+        for model, names in NAMES.items():
+            db.session.add_all([model(name=name, **({"age": 30} if model is Characters else {"size": 1, "gravity": True}))
+                                for name in names])
+        db.session.commit()
+    return app
+
+
+def keys(results):
+    return [(item["type"], item["id"]) for item in results]
+
+
+@pytest.mark.parametrize("q", QUERIES)
+def test_trigram_fallback_agrees_with_fts5(fts_app, q):
+    with fts_app.app_context():
+        fts = SqliteFtsSearch().search(db.session, q, 10)
+        trigram = TrigramSearch().search(db.session, q, 10)
+    assert keys(trigram) == keys(fts)
+
+
+def test_words_match_anywhere_in_the_name(fts_app):
+    with fts_app.app_context():
+        results = TrigramSearch().search(db.session, "sky", 10)
+    assert [item["name"] for item in results] == ["Skyhook Station", "Luke Skywalker", "Anakin Skywalker"]
+
+
+def test_fts5_keeps_the_best_match_past_the_candidate_cap(app):
+    with app.app_context():
+        db.session.execute(text("CREATE VIRTUAL TABLE search_index USING fts5(name, prefix='2 3')"))
+        # Muchos nombres largos por delante en orden de rowid y el mejor al final
+        rows = [{"rowid": i * 2, "name": "Sky " + "filler " * 20 + str(i)} for i in range(1, 301)]
+        rows.append({"rowid": 302 * 2, "name": "Sky"})
+        db.session.execute(text("INSERT INTO search_index(rowid, name) VALUES (:rowid, :name)"), rows)
+        results = SqliteFtsSearch(candidates=20).search(db.session, "sky", 1)
+    assert results[0]["name"] == "Sky"